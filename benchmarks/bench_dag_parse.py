@@ -0,0 +1,84 @@
+"""
+Measures what parsing the DAG file costs the Airflow scheduler, and fails on regressions.
+
+Each repetition runs a fresh interpreter, as a scheduler parsing process would, and times:
+  - airflow:  importing Airflow and the operators the DAG uses, which every DAG file pays.
+  - dag:      importing dags/weather_etl_pipeline.py on top of that, i.e. its own parse cost.
+  - dagbag:   loading the dags/ folder into a DagBag, as the scheduler and `airflow dags list` do.
+  - tasks:    importing utils.etl_tasks, the task code the DAG file no longer imports; each task
+              pays it once when it runs.
+It reports the median of each and the task modules (psycopg2, pandas, ...) the DAG import pulled
+in. It exits with an error when the DAG import imports any of them or takes longer than
+`--budget` seconds on top of Airflow, so new stages cannot bring parse-time costs back.
+
+Run from the repository root:
+    python -m benchmarks.bench_dag_parse --repeat 5 --budget 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Modules only the tasks need
+TASK_MODULES = ('requests', 'psycopg2', 'pandas', 'pyarrow', 'numpy', 'orjson', 'utils.etl_tasks', 'utils.shared')
+
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import airflow
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+airflow_seconds = time.perf_counter() - started
+before = set(sys.modules)
+started = time.perf_counter()
+import dags.weather_etl_pipeline
+dag_seconds = time.perf_counter() - started
+imported = sorted(set(sys.modules) - before)
+from airflow.models import DagBag
+started = time.perf_counter()
+dagbag = DagBag(dag_folder='dags', include_examples=False)
+dagbag_seconds = time.perf_counter() - started
+started = time.perf_counter()
+import utils.etl_tasks
+tasks_seconds = time.perf_counter() - started
+print(json.dumps({'airflow': airflow_seconds, 'dag': dag_seconds, 'dagbag': dagbag_seconds, 'tasks': tasks_seconds,
+                  'imported': imported, 'tasks_count': sum(len(dag.tasks) for dag in dagbag.dags.values()),
+                  'import_errors': {path: str(error) for path, error in dagbag.import_errors.items()}}))
+"""
+
+
+def measure(root):
+    env = dict(os.environ, AIRFLOW__LOGGING__LOGGING_LEVEL='ERROR', AIRFLOW__CORE__LOAD_EXAMPLES='False')
+    output = subprocess.run([sys.executable, '-c', _CHILD], cwd=root, env=env, capture_output=True, text=True,
+                            check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=0.2,
+                        help="Maximum seconds the DAG import may take on top of Airflow.")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [measure(root) for _ in range(args.repeat)]
+    if runs[0]['import_errors']:
+        sys.exit(f"DAG import errors: {runs[0]['import_errors']}")
+    medians = {stage: statistics.median(run[stage] for run in runs) for stage in ('airflow', 'dag', 'dagbag', 'tasks')}
+    leaked = [module for module in TASK_MODULES if module in runs[0]['imported']]
+
+    print(f"{'stage':>8} {'median ms':>10}")
+    for stage, seconds in medians.items():
+        print(f"{stage:>8} {seconds * 1000:>10.1f}")
+    print(f"{runs[0]['tasks_count']} tasks, {len(runs[0]['imported'])} modules imported by the DAG file")
+    if leaked:
+        sys.exit(f"The DAG file imports task modules: {', '.join(leaked)}")
+    if medians['dag'] > args.budget:
+        sys.exit(f"The DAG import takes {medians['dag']:.3f}s, over the {args.budget:.3f}s budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measures decoding and projection of weather.gov observation pages.
+
+Pages are built from the observation features in tests/fixtures/weather_gov_observations.json,
+which follow the full weather.gov schema. For each JSON decoder the benchmark reports the parse
+time per page and the bytes held per observation when the whole GeoJSON feature is kept versus
+when it is projected onto an ObservationRecord right after parsing.
+
+Run from the repository root:
+    python -m benchmarks.bench_decode --page-size 500 --pages 200
+"""
+import argparse
+import copy
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from utils import records
+from utils.records import project_observation
+
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'weather_gov_observations.json')
+
+
+def synthetic_page(page_size):
+    """
+    Returns a page of `page_size` fixture features with distinct timestamps, encoded as bytes.
+    """
+    with open(FIXTURE) as fixture:
+        document = json.load(fixture)
+    templates = document['features']
+    start = datetime(2024, 1, 1)
+    features = []
+    for index in range(page_size):
+        feature = copy.deepcopy(templates[index % len(templates)])
+        timestamp = (start + timedelta(hours=index)).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        feature['id'] = feature['properties']['@id'] = feature['id'].rsplit('/', 1)[0] + '/' + timestamp
+        feature['properties']['timestamp'] = timestamp
+        features.append(feature)
+    document['features'] = features
+    return json.dumps(document).encode()
+
+
+def held_bytes(page, project):
+    """
+    Returns the bytes still allocated after decoding `page` and keeping its features,
+    projected with `project` when given.
+    """
+    tracemalloc.start()
+    features = records.loads(page)['features']
+    if project is not None:
+        features = [project(feature) for feature in features]
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del features
+    return held
+
+
+def parse_seconds(page, pages, project):
+    started = time.perf_counter()
+    for _ in range(pages):
+        features = records.loads(page)['features']
+        if project is not None:
+            features = [project(feature) for feature in features]
+    return (time.perf_counter() - started) / pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--pages', type=int, default=200)
+    args = parser.parse_args()
+
+    page = synthetic_page(args.page_size)
+    decoders = {'json': None}
+    if records.orjson is not None:
+        decoders['orjson'] = records.orjson
+    print(f"Page of {args.page_size} observations, {len(page) / args.page_size:.0f} bytes of JSON per observation")
+    print(f"{'decoder':>8} {'features':>10} {'ms/page':>10} {'bytes/observation':>18}")
+    original = records.orjson
+    try:
+        for name, decoder in decoders.items():
+            records.orjson = decoder
+            for label, project in (('full', None), ('records', project_observation)):
+                seconds = parse_seconds(page, args.pages, project)
+                held = held_bytes(page, project)
+                print(f"{name:>8} {label:>10} {seconds * 1000:>10.2f} {held / args.page_size:>18.0f}")
+    finally:
+        records.orjson = original
+
+
+if __name__ == '__main__':
+    main()
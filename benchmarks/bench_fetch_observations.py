@@ -0,0 +1,55 @@
+"""
+Measures fetch_observations wall time for several concurrency caps against a local stub API.
+
+With --server-rate-limit the stub answers requests beyond that many per second with 429 and
+Retry-After, which shows how close the client's adaptive rate limiter gets to the allowed rate.
+
+Run from the repository root:
+    python -m benchmarks.bench_fetch_observations --stations 200 --latency 0.05
+    python -m benchmarks.bench_fetch_observations --stations 200 --server-rate-limit 50 --rate-limit 200
+"""
+import argparse
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+from utils.etl_tasks import fetch_observations
+from tests.fake_weather_api import FakeWeatherAPI
+from utils.intermediate_store import LocalFileStore
+
+
+def run(api, store, concurrency, rate_limit):
+    with patch('utils.etl_tasks.STATIONS_ENDPOINT', api.stations_endpoint), \
+            patch('utils.etl_tasks.get_intermediate_store', return_value=store):
+        started = time.perf_counter()
+        fetch_observations(api.station_ids(), ti=MagicMock(), run_id='benchmark', max_concurrency=concurrency,
+                           rate_limit=rate_limit)
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05, help='Artificial latency per request in seconds.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--rate-limit', type=float, default=10000, help='Client requests per second.')
+    parser.add_argument('--server-rate-limit', type=float, default=None,
+                        help='Requests per second the stub serves before answering 429.')
+    args = parser.parse_args()
+
+    with FakeWeatherAPI(number_of_stations=args.stations, latency=args.latency,
+                        rate_limit=args.server_rate_limit) as api, \
+            tempfile.TemporaryDirectory() as store_dir:
+        store = LocalFileStore(store_dir)
+        baseline = None
+        print(f"{'concurrency':>12} {'seconds':>10} {'stations/s':>12} {'speedup':>8} {'429s':>6}")
+        for concurrency in args.concurrency:
+            throttled = api.status_counts[429]
+            elapsed = run(api, store, concurrency, args.rate_limit)
+            baseline = baseline or elapsed
+            print(f"{concurrency:>12} {elapsed:>10.3f} {args.stations / elapsed:>12.1f} {baseline / elapsed:>7.1f}x "
+                  f"{api.status_counts[429] - throttled:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compares rows/sec of the observation load strategies against a local Postgres.
+
+Connects with the DATABASE_* environment variables used by the pipeline. Every strategy
+runs in its own transaction which is rolled back afterwards, so the table is left untouched.
+
+Run from the repository root:
+    DATABASE_HOST=localhost DATABASE_NAME=postgres DATABASE_USER=postgres DATABASE_PASSWORD=postgres \
+        python -m benchmarks.bench_load_strategies --rows 100000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from utils.loaders import LOAD_STRATEGIES, load_observations
+from utils.partitions import ensure_partitions
+from utils.shared import get_db_connection
+from utils.records import project_station
+from utils.station_registry import StationRegistry
+
+
+def synthetic_stations(stations=100):
+    return [
+        {
+            'properties': {'stationIdentifier': f'BENCH{station:03d}', 'name': f'Benchmark Station {station}', 'timeZone': 'UTC'},
+            'geometry': {'coordinates': [-100.0 - station / 100, 30.0 + station / 100]},
+        }
+        for station in range(stations)
+    ]
+
+
+START = datetime(2000, 1, 1)
+
+
+def synthetic_rows(count, station_keys):
+    stations = len(station_keys)
+    for index in range(count):
+        station = index % stations
+        yield (
+            station_keys[station],
+            (START + timedelta(minutes=index // stations)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            round(15 + index % 20 * 0.37, 2),
+            'wmoUnit:degC',
+            round(index % 40 * 0.53, 2),
+            'wmoUnit:km_h-1',
+            round(index % 100 * 0.91, 2),
+        )
+
+
+def run(strategy, rows, batch_size):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            registry = StationRegistry()
+            stations = [project_station(station) for station in synthetic_stations()]
+            registry.upsert(cursor, stations)
+            station_keys = list(registry.resolve(cursor, [station.station_id for station in stations]).values())
+            ensure_partitions(cursor, START, START + timedelta(minutes=rows // len(station_keys)))
+            started = time.perf_counter()
+            count = load_observations(cursor, synthetic_rows(rows, station_keys), strategy=strategy, batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+        return count, elapsed
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--strategies', nargs='+', default=list(LOAD_STRATEGIES), choices=LOAD_STRATEGIES)
+    args = parser.parse_args()
+
+    print(f"{'strategy':>15} {'rows':>10} {'seconds':>10} {'rows/s':>12}")
+    for strategy in args.strategies:
+        count, elapsed = run(strategy, args.rows, args.batch_size)
+        print(f"{strategy:>15} {count:>10} {elapsed:>10.3f} {count / elapsed:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Compares the all-stations overview query with running the per-station queries for every station.
+
+For each station count, a throwaway schema of the Postgres configured through the DATABASE_*
+variables is filled with `--days` days of synthetic hourly and daily rollups per station, up to
+now. The benchmark then times three ways of getting the average temperature and max wind speed
+change of every station:
+  - per-station: average_temperature_query and max_wind_speed_change_query for each station,
+    i.e. the 2 x N round-trips an overview built from the single-station view would need.
+  - overview:    stations_overview_query returning every station in one round-trip.
+  - first page:  stations_overview_query returning one page of `--page-size` stations.
+It checks that the per-station and overview results agree. Everything runs in one transaction
+which is rolled back afterwards.
+
+Run from the repository root:
+    DATABASE_HOST=localhost DATABASE_NAME=postgres DATABASE_USER=postgres DATABASE_PASSWORD=postgres \\
+        python -m benchmarks.bench_overview --stations 100 1000 5000
+"""
+import argparse
+import math
+import time
+
+from utils.config import OVERVIEW_PAGE_SIZE
+from utils.shared import get_db_connection
+from utils.sql_queries_app import (average_temperature_query, get_station_names_query, max_wind_speed_change_query,
+                                   stations_overview_query)
+from tests.database import create_test_schema
+
+
+FILL_STATIONS_QUERY = """
+INSERT INTO stations (station_id, station_name)
+SELECT 'B' || lpad(n::text, 6, '0'), 'Benchmark Station ' || n
+FROM generate_series(1, %s) AS n;
+"""
+
+# Deterministic but varied values per station and bucket
+_FILL_ROLLUP_QUERY = """
+INSERT INTO {table}
+SELECT s.station_key, b.bucket_start, 4,
+       NULL, NULL, 10 + (s.station_key * 7 + extract(epoch FROM b.bucket_start)::bigint / 3600) %% 20, 4,
+       NULL, NULL, 15, 4, NULL, NULL, 60, 4,
+       (s.station_key * 13 + extract(epoch FROM b.bucket_start)::bigint / 3600) %% 40
+FROM stations s
+CROSS JOIN generate_series(date_trunc('{unit}', NOW()) - %s * INTERVAL '1 day', NOW(), INTERVAL '1 {unit}')
+    AS b (bucket_start);
+"""
+
+
+def fill(cursor, stations, days):
+    cursor.execute(FILL_STATIONS_QUERY, (stations,))
+    for table, unit in (('weather_observations_hourly', 'hour'), ('weather_observations_daily', 'day')):
+        cursor.execute(_FILL_ROLLUP_QUERY.format(table=table, unit=unit), (days,))
+    cursor.execute("ANALYZE stations; ANALYZE weather_observations_hourly; ANALYZE weather_observations_daily;")
+
+
+def per_station(cursor):
+    cursor.execute(get_station_names_query())
+    results = {}
+    for (station_name,) in cursor.fetchall():
+        cursor.execute(average_temperature_query(), (station_name,))
+        average_temperature = cursor.fetchone()[0]
+        cursor.execute(max_wind_speed_change_query(), (station_name,))
+        results[station_name] = (average_temperature, cursor.fetchone()[0])
+    return results
+
+
+def overview(cursor, page_size):
+    cursor.execute(stations_overview_query(), ('%', page_size, 0))
+    return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+
+def timed(run):
+    started = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - started
+
+
+def run(stations, days, page_size):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            create_test_schema(cursor, 'bench_overview')
+            fill(cursor, stations, days)
+            expected, loop_seconds = timed(lambda: per_station(cursor))
+            # Warm both rollups up once so neither side pays for the first reads
+            overview(cursor, stations)
+            results, overview_seconds = timed(lambda: overview(cursor, stations))
+            page, page_seconds = timed(lambda: overview(cursor, page_size))
+        for name, (average_temperature, max_change) in expected.items():
+            got = results[name]
+            if not (math.isclose(got[0], average_temperature) and got[1] == max_change):
+                raise AssertionError(f"Overview disagrees for {name}: {got} != {(average_temperature, max_change)}")
+        return [
+            ('per-station', len(expected), 1 + 2 * len(expected), loop_seconds),
+            ('overview', len(results), 1, overview_seconds),
+            ('first page', len(page), 1, page_seconds),
+        ]
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, nargs='+', default=[100, 1000])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--page-size', type=int, default=OVERVIEW_PAGE_SIZE)
+    args = parser.parse_args()
+
+    print(f"{'stations':>9} {'method':>12} {'rows':>8} {'queries':>8} {'seconds':>10} {'speedup':>8}")
+    for stations in args.stations:
+        rows = run(stations, args.days, args.page_size)
+        loop_seconds = rows[0][3]
+        for method, count, queries, seconds in rows:
+            print(f"{stations:>9} {method:>12} {count:>8} {queries:>8} {seconds:>10.3f} {loop_seconds / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
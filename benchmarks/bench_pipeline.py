@@ -0,0 +1,369 @@
+"""
+End-to-end benchmark of the pipeline tasks against a local fake weather.gov server and Postgres.
+
+A FakeWeatherAPI, running in a child process, serves `--stations` stations with `--observations`
+observations each, with the given latency and page size. The pipeline tasks then run against it and a Postgres configured
+through the DATABASE_* variables. They run in a throwaway schema, which is created for the run
+and dropped afterwards. Two modes are available:
+  - sequential: fetch_stations, then fetch_observations, then insert_data, then update_rollups.
+  - pipelined:  fetch_stations, then stream_observations, then update_rollups.
+
+For each stage it reports wall time, rows/s, peak RSS and database round-trips. A round-trip is
+a statement execution, one per parameter set for executemany, or a commit/rollback. The results
+can be written as JSON with --output, and compared with an earlier result with --compare.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --stations 50 --observations 500 --latency 0.02 --output bench.json
+    python -m benchmarks.bench_pipeline --stations 50 --observations 500 --latency 0.02 --compare bench.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+import psycopg2.extensions
+
+import utils.etl_tasks as pipeline
+from tests.fake_weather_api import FakeWeatherAPI
+from utils import shared
+from utils.http_cache import HTTPCache
+from utils.intermediate_store import LocalFileStore
+from utils.station_registry import get_station_registry
+
+
+INIT_SQL = os.path.join(os.path.dirname(__file__), '..', 'init_db', 'init.sql')
+SCHEMA = f'bench_pipeline_{os.getpid()}'
+TABLES = ('weather_observations', 'weather_observations_hourly', 'weather_observations_daily', 'stations',
+          'data_versions')
+
+
+class RoundTrips:
+    count = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def add(cls, count=1):
+        with cls.lock:
+            cls.count += count
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        RoundTrips.add()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        RoundTrips.add(len(vars_list))
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        RoundTrips.add()
+        return super().copy_expert(sql, file, size)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    def commit(self):
+        RoundTrips.add()
+        return super().commit()
+
+    def rollback(self):
+        RoundTrips.add()
+        return super().rollback()
+
+
+def counting_connection():
+    """
+    Opens a connection to the benchmark schema whose statements and commits are counted.
+    """
+    return psycopg2.connect(
+        host=os.getenv('DATABASE_HOST'),
+        database=os.getenv('DATABASE_NAME'),
+        user=os.getenv('DATABASE_USER'),
+        password=os.getenv('DATABASE_PASSWORD'),
+        options=f'-c search_path={SCHEMA}',
+        connection_factory=CountingConnection,
+        cursor_factory=CountingCursor,
+    )
+
+
+def current_rss():
+    """
+    Returns the resident set size of the process in bytes.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # ru_maxrss is the lifetime peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+class RssSampler:
+    """
+    Samples the RSS of the process in a background thread and keeps the peak.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def measure(stages, name, run):
+    """
+    Runs a stage and records its wall time, row count, peak RSS and database round-trips.
+
+    `run` returns the number of rows the stage produced.
+    """
+    round_trips = RoundTrips.count
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        rows = run()
+        elapsed = time.perf_counter() - started
+    stages[name] = {
+        'seconds': round(elapsed, 3),
+        'rows': rows,
+        'rows_per_second': round(rows / elapsed, 1) if elapsed else None,
+        'peak_rss_mib': round(rss.peak / 2 ** 20, 1),
+        'db_round_trips': RoundTrips.count - round_trips,
+    }
+    return stages[name]
+
+
+def create_schema():
+    conn = counting_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+        cursor.execute(f'SET search_path TO {SCHEMA}')
+        with open(INIT_SQL) as init_sql:
+            cursor.execute(init_sql.read())
+    conn.commit()
+    conn.close()
+
+
+def drop_schema():
+    conn = counting_connection()
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    conn.commit()
+    conn.close()
+
+
+def reset_tables():
+    with shared.db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+        conn.commit()
+    get_station_registry().clear()
+
+
+def _serve(api_kwargs, connection):
+    with FakeWeatherAPI(**api_kwargs) as api:
+        connection.send(api.base_url)
+        # Serve until the parent closes its end of the pipe
+        try:
+            connection.recv()
+        except EOFError:
+            pass
+
+
+class RemoteFakeWeatherAPI:
+    """
+    Runs a FakeWeatherAPI in a child process, so serving pages does not compete with the
+    pipeline for the GIL of the benchmark process, as with the real, remote API.
+    """
+
+    def __init__(self, **api_kwargs):
+        self.api = FakeWeatherAPI(**api_kwargs)
+        self._connection, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(api_kwargs, child), daemon=True)
+
+    def __enter__(self):
+        self._process.start()
+        self.base_url = self._connection.recv()
+        self.stations_endpoint = f'{self.base_url}/stations'
+        return self
+
+    def __exit__(self, *exc_info):
+        self._connection.close()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def station_ids(self):
+        return self.api.station_ids()
+
+
+def run_mode(mode, api, args, store_dir):
+    """
+    Runs the pipeline tasks in `mode` against the fake API and returns the stage measurements.
+    """
+    reset_tables()
+    end = datetime(2024, 1, 1) + timedelta(hours=args.observations + 1)
+    dag_run = MagicMock(conf={'mode': 'backfill', 'start': '2024-01-01T00:00:00Z',
+                              'end': end.strftime('%Y-%m-%dT%H:%M:%SZ')})
+    kwargs = {
+        'run_id': f'benchmark_{mode}',
+        'dag_run': dag_run,
+        'max_concurrency': args.concurrency,
+        'rate_limit': args.rate_limit,
+        'load_strategy': args.load_strategy,
+        'batch_size': args.batch_size,
+        'transform_batch_size': args.transform_batch_size,
+    }
+    ti = MagicMock()
+    stages = {}
+    pipeline.manage_partitions(ti=ti, dag_run=dag_run, premake_months=0)
+
+    def fetch_stations():
+        pipeline.fetch_stations(ti=ti, **kwargs)
+        return ti.xcom_push.call_args.kwargs['value']['count']
+
+    measure(stages, 'fetch_stations', fetch_stations)
+    station_ids = api.station_ids()
+    touched = {}
+
+    if mode == 'sequential':
+        manifest = {}
+
+        def fetch_observations():
+            manifest['observations'], _ = pipeline.fetch_observations(station_ids, **kwargs)
+            return manifest['observations']['count']
+
+        def insert_data():
+            loaded, touched['ranges'] = pipeline.insert_data(manifest['observations'], **kwargs)
+            return loaded
+
+        measure(stages, 'fetch_observations', fetch_observations)
+        measure(stages, 'insert_data', insert_data)
+    else:
+        def stream_observations():
+            _, loaded, _, touched['ranges'], touched['stats'] = pipeline.stream_observations(
+                station_ids, page_queue_size=args.page_queue_size, batch_queue_size=args.batch_queue_size, **kwargs)
+            return loaded
+
+        measure(stages, 'stream_observations', stream_observations)
+
+    def update_rollups():
+        ti.xcom_pull.return_value = [{'touched_ranges': touched['ranges']}]
+        pipeline.update_rollups(ti=ti)
+        return len(touched['ranges'])
+
+    measure(stages, 'update_rollups', update_rollups)
+    result = {
+        'stages': stages,
+        'total_seconds': round(sum(stage['seconds'] for stage in stages.values()), 3),
+        'db_round_trips': sum(stage['db_round_trips'] for stage in stages.values()),
+    }
+    if 'stats' in touched:
+        result['pipeline'] = touched['stats']
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results, baseline=None):
+    header = f"{'mode':>11} {'stage':>20} {'seconds':>9} {'rows':>9} {'rows/s':>10} {'peak MiB':>9} {'db trips':>9}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    for mode, run in results['runs'].items():
+        for name, stage in run['stages'].items():
+            line = (f"{mode:>11} {name:>20} {stage['seconds']:>9.3f} {stage['rows']:>9} "
+                    f"{stage['rows_per_second'] or 0:>10.0f} {stage['peak_rss_mib']:>9.1f} {stage['db_round_trips']:>9}")
+            base = (baseline or {}).get('runs', {}).get(mode, {}).get('stages', {}).get(name)
+            if base and base['seconds']:
+                line += f" {stage['seconds'] / base['seconds']:>7.2f}x"
+            print(line)
+        print(f"{mode:>11} {'total':>20} {run['total_seconds']:>9.3f} {'':>9} {'':>10} {'':>9} {run['db_round_trips']:>9}")
+        if 'pipeline' in run:
+            print(f"{'':>11} stages: {json.dumps(run['pipeline']['stages'])}")
+            print(f"{'':>11} queues: {json.dumps(run['pipeline']['queues'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=50)
+    parser.add_argument('--observations', type=int, default=500, help='Observations per station.')
+    parser.add_argument('--latency', type=float, default=0.02, help='Artificial latency per request in seconds.')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate-limit', type=float, default=10000, help='Client requests per second.')
+    parser.add_argument('--load-strategy', default='copy')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--transform-batch-size', type=int, default=10000)
+    parser.add_argument('--page-queue-size', type=int, default=16)
+    parser.add_argument('--batch-queue-size', type=int, default=2)
+    parser.add_argument('--modes', nargs='+', default=['sequential', 'pipelined'], choices=['sequential', 'pipelined'])
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare stage times with.')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'created_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'parameters': vars(args),
+        'runs': {},
+    }
+    create_schema()
+    try:
+        with RemoteFakeWeatherAPI(number_of_stations=args.stations, observations_per_station=args.observations,
+                            latency=args.latency, page_size=args.page_size) as api, \
+                tempfile.TemporaryDirectory() as store_dir, \
+                patch.object(shared, 'get_db_connection', counting_connection), \
+                patch.object(pipeline, 'STATIONS_ENDPOINT', api.stations_endpoint), \
+                patch.object(pipeline, 'get_intermediate_store', return_value=LocalFileStore(store_dir)), \
+                patch.object(pipeline, 'get_http_cache', return_value=HTTPCache(os.path.join(store_dir, 'http'))):
+            try:
+                for mode in args.modes:
+                    results['runs'][mode] = run_mode(mode, api, args, store_dir)
+            finally:
+                shared.get_connection_pool().close()
+    finally:
+        drop_schema()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(f"Compared with {args.compare} (commit {baseline.get('commit')})")
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Compares nearest-station and bounding-box lookups through the station spatial index with scans.
+
+For each station count, synthetic stations are spread over the areas covered by weather.gov
+(the contiguous US, Alaska including the Aleutians across the antimeridian, Hawaii and Puerto
+Rico), most of them in the contiguous US. The benchmark reports the time to build the index
+and the mean latency of `--queries` random lookups of the `--k` nearest stations and of
+1 x 1 degree bounding boxes, for:
+  - index: StationIndex.nearest and StationIndex.within.
+  - scan:  NumPy distances to, or bounds checks of, every station.
+  - sql:   with `--sql`, the same lookups as queries scanning the stations table of a
+           throwaway schema of the Postgres configured through the DATABASE_* variables,
+           rolled back afterwards.
+It checks that every method returns the same stations.
+
+Run from the repository root:
+    python -m benchmarks.bench_spatial --stations 3000 50000
+    DATABASE_HOST=localhost DATABASE_NAME=postgres DATABASE_USER=postgres DATABASE_PASSWORD=postgres \\
+        python -m benchmarks.bench_spatial --stations 3000 50000 --sql
+"""
+import argparse
+import time
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from utils.config import STATION_INDEX_CELL_DEGREES
+from utils.spatial import StationIndex, haversine_km
+from utils.shared import get_db_connection
+from tests.database import create_test_schema
+
+
+# (share of the stations, south, west, north, east)
+AREAS = [
+    (0.85, 24.5, -125.0, 49.5, -66.9),
+    (0.08, 51.0, 172.0, 71.5, -130.0),
+    (0.04, 18.9, -160.3, 22.3, -154.8),
+    (0.03, 17.9, -67.3, 18.5, -65.2),
+]
+
+NEAREST_QUERY = """
+SELECT station_id FROM stations
+ORDER BY 2 * 6371.0088 * asin(sqrt(least(1.0,
+    sin(radians(latitude::float8 - %(latitude)s) / 2) ^ 2
+    + cos(radians(%(latitude)s)) * cos(radians(latitude::float8)) * sin(radians(longitude::float8 - %(longitude)s) / 2) ^ 2)))
+LIMIT %(k)s;
+"""
+
+WITHIN_QUERY = """
+SELECT station_id FROM stations
+WHERE latitude BETWEEN %(south)s AND %(north)s AND longitude BETWEEN %(west)s AND %(east)s;
+"""
+
+
+def synthetic_stations(count, rng):
+    latitudes, longitudes = [], []
+    for share, south, west, north, east in AREAS:
+        size = round(count * share)
+        width = east - west if east >= west else east - west + 360
+        latitudes.append(rng.uniform(south, north, size))
+        longitudes.append((rng.uniform(west, west + width, size) + 180) % 360 - 180)
+    latitudes, longitudes = np.round(np.concatenate(latitudes), 6), np.round(np.concatenate(longitudes), 6)
+    ids = [f'B{number:06d}' for number in range(len(latitudes))]
+    return ids, latitudes, longitudes
+
+
+def mean_microseconds(run, queries):
+    started = time.perf_counter()
+    results = [run(*query) for query in queries]
+    return results, (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def run(count, queries, k, cell_degrees, sql, rng):
+    ids, latitudes, longitudes = synthetic_stations(count, rng)
+    started = time.perf_counter()
+    index = StationIndex(ids, ids, latitudes, longitudes, cell_degrees)
+    build_ms = (time.perf_counter() - started) * 1000
+    ids = np.asarray(ids, dtype=object)
+    points = list(zip(rng.uniform(25, 49, queries).tolist(), rng.uniform(-124, -67, queries).tolist()))
+    boxes = [(latitude - 0.5, longitude - 0.5, latitude + 0.5, longitude + 0.5) for latitude, longitude in points]
+
+    rows = []
+    index_nearest, seconds = mean_microseconds(lambda latitude, longitude: set(
+        index.station_ids[index.nearest(latitude, longitude, k)[0]]), points)
+    rows.append(('nearest', 'index', seconds))
+    scan_nearest, seconds = mean_microseconds(lambda latitude, longitude: set(
+        ids[np.argpartition(haversine_km(latitude, longitude, latitudes, longitudes), k - 1)[:k]]), points)
+    rows.append(('nearest', 'scan', seconds))
+    index_within, seconds = mean_microseconds(lambda *box: set(index.station_ids[index.within(*box)]), boxes)
+    rows.append(('within', 'index', seconds))
+    scan_within, seconds = mean_microseconds(lambda south, west, north, east: set(ids[
+        (latitudes >= south) & (latitudes <= north) & (longitudes >= west) & (longitudes <= east)]), boxes)
+    rows.append(('within', 'scan', seconds))
+    results = [('nearest', index_nearest, scan_nearest), ('within', index_within, scan_within)]
+
+    if sql:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                create_test_schema(cursor, 'bench_spatial')
+                execute_values(cursor, "INSERT INTO stations (station_id, latitude, longitude) VALUES %s",
+                               list(zip(ids, latitudes.tolist(), longitudes.tolist())), page_size=5000)
+                cursor.execute("ANALYZE stations;")
+
+                def query(statement, params):
+                    cursor.execute(statement, params)
+                    return {row[0] for row in cursor.fetchall()}
+
+                sql_nearest, seconds = mean_microseconds(lambda latitude, longitude: query(
+                    NEAREST_QUERY, {'latitude': latitude, 'longitude': longitude, 'k': k}), points)
+                rows.append(('nearest', 'sql', seconds))
+                sql_within, seconds = mean_microseconds(lambda south, west, north, east: query(
+                    WITHIN_QUERY, {'south': south, 'west': west, 'north': north, 'east': east}), boxes)
+                rows.append(('within', 'sql', seconds))
+                results += [('nearest', index_nearest, sql_nearest), ('within', index_within, sql_within)]
+        finally:
+            conn.rollback()
+            conn.close()
+
+    for lookup, expected, got in results:
+        mismatches = sum(a != b for a, b in zip(expected, got))
+        if mismatches:
+            raise AssertionError(f"{mismatches} {lookup} lookups disagree with the index.")
+    return build_ms, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, nargs='+', default=[3000, 50000])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--cell-degrees', type=float, default=STATION_INDEX_CELL_DEGREES)
+    parser.add_argument('--sql', action='store_true', help="Also time the lookups as queries on the stations table.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'stations':>9} {'build ms':>9} {'lookup':>8} {'method':>6} {'us/lookup':>10} {'vs index':>9}")
+    for count in args.stations:
+        build_ms, rows = run(count, args.queries, args.k, args.cell_degrees, args.sql, rng)
+        index_seconds = {lookup: seconds for lookup, method, seconds in rows if method == 'index'}
+        for lookup, method, seconds in rows:
+            print(f"{count:>9} {build_ms:>9.1f} {lookup:>8} {method:>6} {seconds:>10.1f} "
+                  f"{seconds / index_seconds[lookup]:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
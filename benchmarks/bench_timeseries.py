@@ -0,0 +1,128 @@
+"""
+Compares pulling raw observations for a chart with the bucketed and LTTB-downsampled time series.
+
+A throwaway schema of the Postgres configured through the DATABASE_* variables is filled with
+one observation every `--interval` minutes over `--days` days for one station, up to now, and
+its hourly and daily rollups. For each window length ending now, the benchmark times:
+  - raw:         every observation of the window read into a DataFrame, as a chart without
+                 downsampling would need.
+  - downsampled: get_station_timeseries' path: timeseries_query aggregating the window into
+                 buckets chosen by plan_resolution, then LTTB to `--points` points per series.
+It reports the latency, the rows returned by the database, the points left per series and
+the JSON payload the chart receives. Everything runs in one transaction which is rolled back
+afterwards.
+
+Run from the repository root:
+    DATABASE_HOST=localhost DATABASE_NAME=postgres DATABASE_USER=postgres DATABASE_PASSWORD=postgres \\
+        python -m benchmarks.bench_timeseries --days 365 --windows 1 7 30 90 365
+"""
+import argparse
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from utils.config import TIMESERIES_POINTS
+from utils.downsampling import downsample_series, plan_resolution
+from utils.partitions import ensure_partitions
+from utils.rollups import refresh_rollups
+from utils.shared import get_db_connection
+from utils.sql_queries_app import timeseries_query
+from tests.database import create_test_schema
+
+
+COLUMNS = ('temperature', 'wind_speed', 'humidity')
+
+# Deterministic daily cycles with some noise, and a gap in humidity every 50th observation
+_FILL_OBSERVATIONS_QUERY = """
+INSERT INTO weather_observations (station_key, observation_timestamp, temperature, temperature_unit_code, wind_speed,
+                                  wind_speed_unit_code, humidity)
+SELECT %(station_key)s, t,
+       10 + 8 * sin(extract(epoch FROM t) / 13751) + (extract(epoch FROM t)::bigint / 600 %% 7) / 3.0, 'wmoUnit:degC',
+       abs(20 * sin(extract(epoch FROM t) / 40000)), 'wmoUnit:km_h-1',
+       CASE WHEN extract(epoch FROM t)::bigint / 600 %% 50 = 0 THEN NULL ELSE 60 + 20 * cos(extract(epoch FROM t) / 13751) END
+FROM generate_series(%(start)s::timestamp, %(end)s::timestamp, %(interval)s * INTERVAL '1 minute') AS t;
+"""
+
+RAW_QUERY = """
+SELECT r.observation_timestamp, r.temperature::float8, r.wind_speed::float8, r.humidity::float8
+FROM weather_observations r
+JOIN stations s ON s.station_key = r.station_key
+WHERE s.station_name = %(station)s AND r.observation_timestamp >= %(start)s AND r.observation_timestamp < %(end)s
+ORDER BY r.observation_timestamp;
+"""
+
+
+def fill(cursor, start, end, interval):
+    cursor.execute("INSERT INTO stations (station_id, station_name) VALUES ('B', 'Benchmark') RETURNING station_key")
+    station_key = cursor.fetchone()[0]
+    ensure_partitions(cursor, start, end)
+    # The rollups are refreshed for the same touched range the DAG would report
+    cursor.execute(_FILL_OBSERVATIONS_QUERY, {'station_key': station_key, 'start': start, 'end': end,
+                                              'interval': interval})
+    refresh_rollups(cursor, [[station_key, start.isoformat() + 'Z', end.isoformat() + 'Z']])
+    cursor.execute("ANALYZE weather_observations; ANALYZE weather_observations_hourly; ANALYZE weather_observations_daily;")
+
+
+def raw(conn, start, end):
+    df = pd.read_sql_query(RAW_QUERY, conn, params={'station': 'Benchmark', 'start': start, 'end': end})
+    payload = df.to_json(orient='split', date_format='iso')
+    return len(df), len(df), len(payload)
+
+
+def downsampled(conn, start, end, points):
+    source, bucket, start, end = plan_resolution(start, end, points)
+    df = pd.read_sql_query(timeseries_query(source), conn,
+                           params={'station': 'Benchmark', 'start': start, 'end': end, 'bucket': bucket})
+    series = downsample_series(df, COLUMNS, points)
+    payload = sum(len(series[column].to_json(orient='split', date_format='iso')) for column in COLUMNS)
+    return len(df), max(len(values) for values in series.values()), payload, source, bucket
+
+
+def timed(run, repeat):
+    # Best of `repeat`, after a first run warming the caches up
+    result = run()
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--interval', type=int, default=10, help="Minutes between observations.")
+    parser.add_argument('--windows', type=int, nargs='+', default=[1, 7, 30, 90, 180], help="Window lengths in days.")
+    parser.add_argument('--points', type=int, default=TIMESERIES_POINTS)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # pandas warns about psycopg2 connections; the app reads through them the same way
+    warnings.filterwarnings('ignore', message='pandas only supports SQLAlchemy')
+    end = datetime.utcnow().replace(second=0, microsecond=0)
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            create_test_schema(cursor, 'bench_timeseries')
+            fill(cursor, end - timedelta(days=args.days), end, args.interval)
+        print(f"{'days':>5} {'method':>12} {'source':>7} {'bucket':>7} {'db rows':>8} {'points':>7} "
+              f"{'payload KB':>11} {'ms':>8}")
+        for days in args.windows:
+            start = end - timedelta(days=days)
+            (rows, points, payload), raw_seconds = timed(lambda: raw(conn, start, end), args.repeat)
+            print(f"{days:>5} {'raw':>12} {'raw':>7} {'-':>7} {rows:>8} {points:>7} {payload / 1024:>11.1f} "
+                  f"{raw_seconds * 1000:>8.1f}")
+            (rows, points, payload, source, bucket), seconds = timed(
+                lambda: downsampled(conn, start, end, args.points), args.repeat)
+            print(f"{days:>5} {'downsampled':>12} {source:>7} {bucket:>6}s {rows:>8} {points:>7} "
+                  f"{payload / 1024:>11.1f} {seconds * 1000:>8.1f}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
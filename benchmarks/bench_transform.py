@@ -0,0 +1,176 @@
+"""
+Compares the columnar observation transform of utils.transform with the per-row loop it replaced.
+
+The legacy loop reads GeoJSON features; the columnar transform reads the ObservationRecords that
+fetch_observations now stores instead (projecting them is measured by bench_decode), and so does
+legacy-records, the same loop over records. Inputs are cycled from pools of pre-built ones, built
+before the first measurement, so generating them costs next to nothing, they never sit in memory
+as a whole and the pools are not counted in the peaks. Each implementation runs once for
+throughput and once under tracemalloc for peak memory.
+
+Run from the repository root:
+    python -m benchmarks.bench_transform --features 100000 1000000
+"""
+import argparse
+import time
+import tracemalloc
+from functools import lru_cache
+from itertools import cycle, islice
+
+from utils.records import project_observation
+from utils.transform import iter_observation_batches
+
+
+POOL_SIZE = 10000
+
+
+@lru_cache(maxsize=None)
+def feature_pool(stations=100):
+    pool = []
+    for index in range(POOL_SIZE):
+        pool.append({
+            'properties': {
+                'station': f'https://api.weather.gov/stations/BENCH{index % stations:03d}',
+                'timestamp': f'2024-01-01T{index % 24:02d}:{index % 60:02d}:00+00:00',
+                'temperature': {'value': None if index % 17 == 0 else 15 + index % 200 * 0.0371, 'unitCode': 'wmoUnit:degC'},
+                'windSpeed': {'value': None if index % 13 == 0 else index % 400 * 0.0533, 'unitCode': 'wmoUnit:km_h-1'},
+                'humidity': {'value': index % 1000 * 0.0917},
+            }
+        })
+    return pool
+
+
+def synthetic_features(count):
+    return islice(cycle(feature_pool()), count)
+
+
+def synthetic_station_keys(stations=100):
+    return {f'BENCH{station:03d}': station + 1 for station in range(stations)}
+
+
+def legacy_rows(observations, station_keys):
+    """
+    The per-row transform insert_data used before utils.transform, without its logging.
+    """
+    for obs in observations:
+        properties = obs['properties']
+        station_url = properties.get('station')
+        if not station_url:
+            continue
+        station_id = station_url.split('/')[-1]
+        station_key = station_keys.get(station_id)
+        if station_key is None:
+            continue
+        yield (
+            station_key,
+            properties['timestamp'],
+            round(properties.get('temperature', {}).get('value', float('nan')), 2) if properties.get('temperature', {}).get('value') is not None else None,
+            properties.get('temperature', {}).get('unitCode', ''),
+            round(properties.get('windSpeed', {}).get('value', float('nan')), 2) if properties.get('windSpeed', {}).get('value') is not None else None,
+            properties.get('windSpeed', {}).get('unitCode', ''),
+            round(properties.get('humidity', {}).get('value', float('nan')), 2) if properties.get('humidity', {}).get('value') is not None else None
+        )
+
+
+def run_legacy(count, batch_size):
+    rows = 0
+    for _ in legacy_rows(synthetic_features(count), synthetic_station_keys()):
+        rows += 1
+    return rows
+
+
+@lru_cache(maxsize=None)
+def record_pool():
+    return [list(project_observation(feature)) for feature in synthetic_features(POOL_SIZE)]
+
+
+def synthetic_records(count):
+    # A new list per record, as read back from the intermediate store, so records held by a
+    # transform count towards its peak memory
+    return (list(record) for record in islice(cycle(record_pool()), count))
+
+
+def _batches(count, batch_size):
+    return iter_observation_batches(synthetic_records(count), synthetic_station_keys(), batch_size=batch_size)
+
+
+def legacy_record_rows(records, station_keys):
+    """
+    The per-row loop of legacy_rows over the ObservationRecords the columnar transform reads.
+    """
+    for station_id, timestamp, temperature, temperature_unit_code, wind_speed, wind_speed_unit_code, humidity in records:
+        station_key = station_keys.get(station_id) if station_id else None
+        if station_key is None:
+            continue
+        yield (
+            station_key,
+            timestamp,
+            round(temperature, 2) if temperature is not None else None,
+            temperature_unit_code,
+            round(wind_speed, 2) if wind_speed is not None else None,
+            wind_speed_unit_code,
+            round(humidity, 2) if humidity is not None else None,
+        )
+
+
+def run_legacy_records(count, batch_size):
+    rows = 0
+    for _ in legacy_record_rows(synthetic_records(count), synthetic_station_keys()):
+        rows += 1
+    return rows
+
+
+def run_columnar(count, batch_size):
+    rows = 0
+    for batch in _batches(count, batch_size):
+        rows += len(batch)
+    return rows
+
+
+def run_columnar_rows(count, batch_size):
+    rows = 0
+    for batch in _batches(count, batch_size):
+        rows += len(batch.rows())
+    return rows
+
+
+IMPLEMENTATIONS = {
+    'legacy': run_legacy,
+    # The same per-row loop over records, the input of the columnar transform
+    'legacy-records': run_legacy_records,
+    'columnar': run_columnar,
+    # Includes the conversion back to row tuples the loaders send
+    'columnar+rows': run_columnar_rows,
+}
+
+
+def measure(implementation, count, batch_size):
+    started = time.perf_counter()
+    rows = implementation(count, batch_size)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    implementation(count, batch_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--features', type=int, nargs='+', default=[100000])
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--implementations', nargs='+', default=list(IMPLEMENTATIONS), choices=IMPLEMENTATIONS)
+    args = parser.parse_args()
+
+    feature_pool()
+    record_pool()
+    print(f"{'implementation':>15} {'features':>10} {'seconds':>10} {'rows/s':>12} {'peak MiB':>10}")
+    for count in args.features:
+        for name in args.implementations:
+            rows, elapsed, peak = measure(IMPLEMENTATIONS[name], count, args.batch_size)
+            print(f"{name:>15} {count:>10} {elapsed:>10.3f} {rows / elapsed:>12.0f} {peak / 2 ** 20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,208 +1,144 @@
+"""
+Airflow DAG of the weather pipeline.
+
+The scheduler parses this file continuously, so it only imports Airflow and utils.config. The
+task code lives in utils.etl_tasks, imported by each task when it runs, and settings that can
+be tuned per deployment are rendered from Airflow Variables when the task runs instead of
+being read while parsing.
+"""
 from datetime import datetime, timedelta
+import importlib
 from airflow import DAG
-from airflow.operators.python_operator import PythonOperator
-import requests
-import logging
-from utils.shared import get_db_connection
-from utils.sql_queries_dag import *
-from utils.config import *
- 
+from airflow.operators.python import PythonOperator
+from utils.config import (API_RATE_LIMIT, ARCHIVE_AFTER_MONTHS, ARCHIVE_PRUNE, BATCH_SIZE, FETCH_CONCURRENCY,
+                          INGESTION_MODE, LOAD_STRATEGY, NUMBER_OF_STATIONS, PARTITION_PREMAKE_MONTHS,
+                          PARTITION_RETENTION_MONTHS, PIPELINE_BATCH_QUEUE_SIZE, PIPELINE_PAGE_QUEUE_SIZE,
+                          PIPELINED_INGESTION, SHARD_CONCURRENCY, SHARD_SIZE, START_DATE_OFFSET,
+                          STATIONS_MAX_PAGES, TRANSFORM_BATCH_SIZE, WATERMARK_OVERLAP_HOURS)
 
-logger = logging.getLogger(__name__)
 
-
-def fetch_stations(**kwargs):
-    """
-    Fetches available weather stations from the API and pushes the data to XCom.
-    
-    Args:
-        **kwargs: Airflow context variables.
-    
-    Raises:
-        AirflowException: If the API request fails.
+def _task(name):
     """
-    logger.info("Fetching available weather stations...")
-    try:
-        response = requests.get(STATIONS_ENDPOINT)
-        response.raise_for_status()
-        stations = response.json()['features']
-        # Store the stations in XCom for downstream tasks
-        kwargs['ti'].xcom_push(key='stations', value=stations)
-        logger.info(f"Fetched {len(stations)} stations.")
-    except requests.Timeout:
-        logger.error("Request to fetch stations timed out.")
-        raise
-    except requests.ConnectionError:
-        logger.error("Connection error occurred while fetching stations.")
-        raise
-    except requests.RequestException as e:
-        logger.error(f"Error fetching stations: {e}")
-        raise
-
-
-# Function to fetch observations for specific stations
-def fetch_observations(**kwargs):
+    Returns a callable running utils.etl_tasks.<name>, importing that module when the task runs.
+
+    The task code pulls in requests, psycopg2, pandas and pyarrow, which would otherwise be
+    imported on every parse of this file.
     """
-    Fetches weather observations for specific stations and pushes the data to XCom.
+    def run(*args, **kwargs):
+        return getattr(importlib.import_module('utils.etl_tasks'), name)(*args, **kwargs)
+    run.__name__ = run.__qualname__ = name
+    return run
 
-    Args:
-        **kwargs: Airflow context variables, including:
-            - number_of_stations (int): Number of stations to fetch observations for.
-            - start_date_offset (int): Number of days to look back for observations.
 
-    Raises:
-        AirflowException: If the API request fails or if there are connection issues.
+def _variable(name, default):
     """
-    stations = kwargs['ti'].xcom_pull(key='stations', task_ids='fetch_stations')
-    
-    # Limit to the specified number of stations
-    number_of_stations = kwargs.get('number_of_stations', 1)
-    selected_stations = stations[:number_of_stations]
-    # List to store observations for all stations
-    observations_all = []
-    
-    start_date_offset = kwargs.get('start_date_offset', 7)
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=start_date_offset)
-    logger.info(f"Fetching observations for {len(selected_stations)} stations from {start_date} to {end_date}.")
-
-    for station_info in selected_stations:
-        url = f'{STATIONS_ENDPOINT}/{station_info["properties"]["stationIdentifier"]}/observations'
-        params = {
-            'start': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
-            'end': end_date.strftime('%Y-%m-%dT%H:%M:%SZ')
-        }
-        
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            observations = response.json()['features']
-            observations_all.extend(observations)
-            logger.info(f"Fetched {len(observations)} observations for station {station_info['properties']['stationIdentifier']}.")
-        except requests.Timeout:
-            logger.error(f"Request to fetch observations for {station_info['properties']['stationIdentifier']} timed out.")
-            raise
-        except requests.ConnectionError:
-            logger.error(f"Connection error occurred while fetching observations for {station_info['properties']['stationIdentifier']}.")
-            raise
-        except requests.RequestException as e:
-            logger.error(f"Error fetching observations for station {station_info['properties']['stationIdentifier']}: {e}")
-            raise
-
-    # Store all observations in XCom for downstream tasks
-    kwargs['ti'].xcom_push(key='observations', value=observations_all)
-
-
-def insert_data(**kwargs):
-    """
-    Inserts weather observation data into the PostgreSQL database.
-
-    Args:
-        **kwargs: Airflow context variables, including:
-            - batch_size (int): Number of records to insert in each batch.
+    Returns a template reading the Airflow Variable weather_<name>, or `default` when it is not set.
 
-    Raises:
-        Exception: If there is an error during database operations, logs the error and rolls back the transaction.
+    Templates are rendered when the task runs, so parsing never reads the metadata database.
+    Airflow looks Variables up in AIRFLOW_VAR_WEATHER_<NAME> environment variables first and
+    caches them when [secrets] use_cache is enabled. The DAG renders templates as native
+    objects, so Variables hold Python literals, e.g. 25, True or 'copy'.
     """
-    logger.info("Starting to insert data into the database...")
-    observations = kwargs['ti'].xcom_pull(key='observations', task_ids='fetch_observations')
-    stations = kwargs['ti'].xcom_pull(key='stations', task_ids='fetch_stations')
-    logger.info(f"Preparing to insert {len(observations)} observations.")
-
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Use a dictionary to map station_id to its information
-        station_info_dict = {station['properties']['stationIdentifier']: station for station in stations}
-
-        insert_data_batch = []
-        batch_size = kwargs.get('batch_size', 500)
-
-        for obs in observations:
-            properties = obs['properties']
-            
-            # Extract the station_id from the URL in properties['station']
-            station_url = properties.get('station')
-            if not station_url:
-                logger.warning(f"'station' not found in observation: {properties}")
-                continue
-
-            station_id = station_url.split('/')[-1]
-
-            station_info = station_info_dict.get(station_id)
-
-            if station_info is None:
-                logger.warning(f"No station info found for station_id {station_id}, skipping...")
-                continue
-            
-            insert_data_batch.append((
-                station_id,
-                station_info['properties']['name'],
-                station_info['properties']['timeZone'],
-                station_info['geometry']['coordinates'][1],
-                station_info['geometry']['coordinates'][0],
-                properties['timestamp'],
-                round(properties.get('temperature', {}).get('value', float('nan')), 2) if properties.get('temperature', {}).get('value') is not None else None,
-                properties.get('temperature', {}).get('unitCode', ''),
-                round(properties.get('windSpeed', {}).get('value', float('nan')), 2) if properties.get('windSpeed', {}).get('value') is not None else None,
-                properties.get('windSpeed', {}).get('unitCode', ''),
-                round(properties.get('humidity', {}).get('value', float('nan')), 2) if properties.get('humidity', {}).get('value') is not None else None
-            ))
-
-            if len(insert_data_batch) >= batch_size:
-                cursor.executemany(INSERT_OBSERVATION_QUERY, insert_data_batch)
-                logger.info(f"Inserted {len(insert_data_batch)} records into the database.")
-                insert_data_batch = []
-                
-        if insert_data_batch:
-            cursor.executemany(INSERT_OBSERVATION_QUERY, insert_data_batch)
-            logger.info(f"Inserted {len(insert_data_batch)} records into the database.")
-
-        conn.commit()
-        logger.info("Data inserted successfully.")
-
-    except Exception as e:
-        logger.error(f"Database operation error: {e}")
-        if conn:
-            conn.rollback()
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    return f"{{{{ var.value.get('weather_{name}', {default!r}) }}}}"
 
 
 # Default arguments for the DAG
 default_args = {
     'owner': 'airflow',
-    'start_date': datetime.now(),
+    # A fixed start date keeps the DAG identical across parses; catchup=False skips the past runs
+    'start_date': datetime(2024, 1, 1),
     'retries': 1,
     'retry_delay': timedelta(minutes=2),
 }
 
 # Define the DAG
-with DAG('weather_etl_pipeline', default_args=default_args, schedule_interval='@daily') as dag:
+with DAG('weather_etl_pipeline', default_args=default_args, schedule_interval='@daily', catchup=False,
+         render_template_as_native_obj=True) as dag:
+    manage_partitions_task = PythonOperator(
+        task_id='manage_partitions',
+        python_callable=_task('manage_partitions'),
+        op_kwargs={
+            'start_date_offset': _variable('start_date_offset', START_DATE_OFFSET),
+            'premake_months': _variable('partition_premake_months', PARTITION_PREMAKE_MONTHS),
+            'retention_months': _variable('partition_retention_months', PARTITION_RETENTION_MONTHS),
+        },
+        provide_context=True,
+    )
+
     fetch_stations_task = PythonOperator(
         task_id='fetch_stations',
-        python_callable=fetch_stations,
+        python_callable=_task('fetch_stations'),
+        op_kwargs={'max_pages': _variable('stations_max_pages', STATIONS_MAX_PAGES)},
+        provide_context=True,
+    )
+
+    plan_shards_task = PythonOperator(
+        task_id='plan_shards',
+        python_callable=_task('plan_shards'),
+        op_kwargs={
+            'number_of_stations': _variable('number_of_stations', NUMBER_OF_STATIONS),
+            'shard_size': _variable('shard_size', SHARD_SIZE),
+        },
+        provide_context=True,
+    )
+
+    # One task instance per shard; each one retries on its own
+    ingest_shard_task = PythonOperator.partial(
+        task_id='ingest_shard',
+        python_callable=_task('ingest_shard'),
+        op_kwargs={
+            'start_date_offset': _variable('start_date_offset', START_DATE_OFFSET),
+            'max_concurrency': _variable('fetch_concurrency', FETCH_CONCURRENCY),
+            # Shards run side by side, so each one gets its part of the API rate
+            'rate_limit': API_RATE_LIMIT / SHARD_CONCURRENCY,
+            'ingestion_mode': _variable('ingestion_mode', INGESTION_MODE),
+            'watermark_overlap_hours': _variable('watermark_overlap_hours', WATERMARK_OVERLAP_HOURS),
+            'batch_size': _variable('batch_size', BATCH_SIZE),
+            'load_strategy': _variable('load_strategy', LOAD_STRATEGY),
+            'transform_batch_size': _variable('transform_batch_size', TRANSFORM_BATCH_SIZE),
+            'pipelined': _variable('pipelined_ingestion', PIPELINED_INGESTION),
+            'page_queue_size': _variable('pipeline_page_queue_size', PIPELINE_PAGE_QUEUE_SIZE),
+            'batch_queue_size': _variable('pipeline_batch_queue_size', PIPELINE_BATCH_QUEUE_SIZE),
+        },
+        max_active_tis_per_dag=SHARD_CONCURRENCY,
+    ).expand(op_args=plan_shards_task.output)
+
+    update_rollups_task = PythonOperator(
+        task_id='update_rollups',
+        python_callable=_task('update_rollups'),
+        trigger_rule='all_done',
+        provide_context=True,
+    )
+
+    report_shards_task = PythonOperator(
+        task_id='report_shards',
+        python_callable=_task('report_shards'),
+        trigger_rule='all_done',
         provide_context=True,
     )
 
-    fetch_observations_task = PythonOperator(
-        task_id='fetch_observations',
-        python_callable=fetch_observations,
-        op_kwargs={'start_date_offset': START_DATE_OFFSET, 'number_of_stations': NUMBER_OF_STATIONS},
+    cleanup_intermediate_task = PythonOperator(
+        task_id='cleanup_intermediate',
+        python_callable=_task('cleanup_intermediate'),
+        trigger_rule='all_done',
         provide_context=True,
     )
 
-    insert_data_task = PythonOperator(
-        task_id='insert_data',
-        python_callable=insert_data,
-        op_kwargs={'batch_size': BATCH_SIZE},
+    archive_history_task = PythonOperator(
+        task_id='archive_history',
+        python_callable=_task('archive_history'),
+        op_kwargs={
+            'archive_after_months': _variable('archive_after_months', ARCHIVE_AFTER_MONTHS),
+            'prune': _variable('archive_prune', ARCHIVE_PRUNE),
+        },
         provide_context=True,
     )
 
-    # Set task dependencies
-    fetch_stations_task >> fetch_observations_task >> insert_data_task
+    # Set task dependencies. update_rollups and report_shards run once every shard is done, so a
+    # failed shard (reported by report_shards, a leaf) fails the run. archive_history follows the
+    # rollup refresh so it never races a backfill of the months it exports; as a leaf, it also
+    # fails the run when the refresh or the archive fails. cleanup_intermediate deletes the run's
+    # intermediate data once the shards, the last tasks reading it, are done
+    manage_partitions_task >> fetch_stations_task >> plan_shards_task >> ingest_shard_task
+    ingest_shard_task >> [update_rollups_task, report_shards_task, cleanup_intermediate_task]
+    update_rollups_task >> archive_history_task
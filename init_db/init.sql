@@ -1,15 +1,89 @@
-CREATE TABLE IF NOT EXISTS weather_observations (
-    id SERIAL PRIMARY KEY,
-    station_id VARCHAR(10),
+CREATE TABLE IF NOT EXISTS stations (
+    station_key SERIAL PRIMARY KEY,
+    station_id VARCHAR(10) NOT NULL UNIQUE,
     station_name VARCHAR(100),
     station_timezone VARCHAR(50),
     latitude DECIMAL(9,6),
     longitude DECIMAL(9,6),
-    observation_timestamp TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS stations_station_name_idx ON stations (station_name);
+
+-- Monthly range partitions (weather_observations_yYYYYmMM) are created ahead of time by the
+-- manage_partitions task of the weather_etl_pipeline DAG, which also drops expired ones.
+CREATE TABLE IF NOT EXISTS weather_observations (
+    id SERIAL,
+    station_key INTEGER NOT NULL REFERENCES stations (station_key),
+    observation_timestamp TIMESTAMP NOT NULL,
     temperature DECIMAL(5,2),
     temperature_unit_code VARCHAR(20),
     wind_speed DECIMAL(5,2),
     wind_speed_unit_code VARCHAR(20),
     humidity DECIMAL(5,2),
-    UNIQUE(station_id, observation_timestamp)
+    PRIMARY KEY (station_key, observation_timestamp)
+) PARTITION BY RANGE (observation_timestamp);
+
+-- The primary key serves the per-station range lookups of the app, the BRIN index serves
+-- time range scans across every station.
+CREATE INDEX IF NOT EXISTS weather_observations_observation_timestamp_brin
+    ON weather_observations USING BRIN (observation_timestamp);
+
+-- Hourly and daily rollups of weather_observations, refreshed by the update_rollups task for the
+-- buckets each run touched. max_wind_speed_change is the largest absolute change between an
+-- observation in the bucket and the station's previous observation.
+CREATE TABLE IF NOT EXISTS weather_observations_hourly (
+    station_key INTEGER NOT NULL REFERENCES stations (station_key),
+    bucket_start TIMESTAMP NOT NULL,
+    observation_count INTEGER NOT NULL,
+    temperature_min DECIMAL(5,2),
+    temperature_max DECIMAL(5,2),
+    temperature_avg NUMERIC,
+    temperature_count INTEGER NOT NULL,
+    wind_speed_min DECIMAL(5,2),
+    wind_speed_max DECIMAL(5,2),
+    wind_speed_avg NUMERIC,
+    wind_speed_count INTEGER NOT NULL,
+    humidity_min DECIMAL(5,2),
+    humidity_max DECIMAL(5,2),
+    humidity_avg NUMERIC,
+    humidity_count INTEGER NOT NULL,
+    max_wind_speed_change DECIMAL(5,2),
+    PRIMARY KEY (station_key, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS weather_observations_daily (
+    station_key INTEGER NOT NULL REFERENCES stations (station_key),
+    bucket_start TIMESTAMP NOT NULL,
+    observation_count INTEGER NOT NULL,
+    temperature_min DECIMAL(5,2),
+    temperature_max DECIMAL(5,2),
+    temperature_avg NUMERIC,
+    temperature_count INTEGER NOT NULL,
+    wind_speed_min DECIMAL(5,2),
+    wind_speed_max DECIMAL(5,2),
+    wind_speed_avg NUMERIC,
+    wind_speed_count INTEGER NOT NULL,
+    humidity_min DECIMAL(5,2),
+    humidity_max DECIMAL(5,2),
+    humidity_avg NUMERIC,
+    humidity_count INTEGER NOT NULL,
+    max_wind_speed_change DECIMAL(5,2),
+    PRIMARY KEY (station_key, bucket_start)
+);
+
+-- The primary keys serve the per-station queries of the app, the bucket indexes serve the
+-- all-stations overview, which reads one time window of every station.
+CREATE INDEX IF NOT EXISTS weather_observations_hourly_bucket_start_idx
+    ON weather_observations_hourly (bucket_start);
+
+CREATE INDEX IF NOT EXISTS weather_observations_daily_bucket_start_idx
+    ON weather_observations_daily (bucket_start);
+
+-- Version counter of the data served by the app, bumped by the DAG whenever it commits new
+-- observations or rollups so that cached query results can be invalidated.
+CREATE TABLE IF NOT EXISTS data_versions (
+    dataset VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
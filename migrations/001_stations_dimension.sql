@@ -0,0 +1,47 @@
+-- Moves the per-row station attributes of weather_observations into the stations dimension table.
+-- Run once against databases created before the stations table existed:
+--     psql -h <host> -U postgres -d postgres -f migrations/001_stations_dimension.sql
+-- Dropped columns only release their space after VACUUM FULL weather_observations.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stations (
+    station_key SERIAL PRIMARY KEY,
+    station_id VARCHAR(10) NOT NULL UNIQUE,
+    station_name VARCHAR(100),
+    station_timezone VARCHAR(50),
+    latitude DECIMAL(9,6),
+    longitude DECIMAL(9,6),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS stations_station_name_idx ON stations (station_name);
+
+-- Keep the attributes of the most recent observation of each station
+INSERT INTO stations (station_id, station_name, station_timezone, latitude, longitude)
+SELECT DISTINCT ON (station_id) station_id, station_name, station_timezone, latitude, longitude
+FROM weather_observations
+WHERE station_id IS NOT NULL
+ORDER BY station_id, observation_timestamp DESC
+ON CONFLICT (station_id) DO NOTHING;
+
+ALTER TABLE weather_observations ADD COLUMN station_key INTEGER REFERENCES stations (station_key);
+
+UPDATE weather_observations o
+SET station_key = s.station_key
+FROM stations s
+WHERE s.station_id = o.station_id;
+
+DELETE FROM weather_observations WHERE station_key IS NULL;
+
+ALTER TABLE weather_observations ALTER COLUMN station_key SET NOT NULL;
+ALTER TABLE weather_observations ADD UNIQUE (station_key, observation_timestamp);
+
+-- Dropping station_id also drops the old UNIQUE(station_id, observation_timestamp) constraint
+ALTER TABLE weather_observations
+    DROP COLUMN station_id,
+    DROP COLUMN station_name,
+    DROP COLUMN station_timezone,
+    DROP COLUMN latitude,
+    DROP COLUMN longitude;
+
+COMMIT;
@@ -0,0 +1,55 @@
+-- Converts weather_observations into a table range-partitioned by month on observation_timestamp.
+-- Run once after 001_stations_dimension.sql:
+--     psql -h <host> -U postgres -d postgres -f migrations/002_partition_weather_observations.sql
+-- Partitions for the months already holding data are created here; later months are created
+-- by the manage_partitions task of the DAG.
+BEGIN;
+
+ALTER TABLE weather_observations RENAME TO weather_observations_unpartitioned;
+ALTER INDEX weather_observations_pkey RENAME TO weather_observations_unpartitioned_pkey;
+
+CREATE TABLE weather_observations (
+    id INTEGER NOT NULL DEFAULT nextval('weather_observations_id_seq'),
+    station_key INTEGER NOT NULL REFERENCES stations (station_key),
+    observation_timestamp TIMESTAMP NOT NULL,
+    temperature DECIMAL(5,2),
+    temperature_unit_code VARCHAR(20),
+    wind_speed DECIMAL(5,2),
+    wind_speed_unit_code VARCHAR(20),
+    humidity DECIMAL(5,2),
+    PRIMARY KEY (station_key, observation_timestamp)
+) PARTITION BY RANGE (observation_timestamp);
+
+CREATE INDEX weather_observations_observation_timestamp_brin
+    ON weather_observations USING BRIN (observation_timestamp);
+
+DO $$
+DECLARE
+    month TIMESTAMP;
+BEGIN
+    FOR month IN
+        SELECT generate_series(date_trunc('month', MIN(observation_timestamp)),
+                               date_trunc('month', MAX(observation_timestamp)),
+                               INTERVAL '1 month')
+        FROM weather_observations_unpartitioned
+    LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF weather_observations FOR VALUES FROM (%L) TO (%L)',
+                       'weather_observations_' || to_char(month, '"y"YYYY"m"MM'),
+                       month,
+                       month + INTERVAL '1 month');
+    END LOOP;
+END $$;
+
+INSERT INTO weather_observations (id, station_key, observation_timestamp, temperature, temperature_unit_code,
+                                  wind_speed, wind_speed_unit_code, humidity)
+SELECT id, station_key, observation_timestamp, temperature, temperature_unit_code,
+       wind_speed, wind_speed_unit_code, humidity
+FROM weather_observations_unpartitioned
+WHERE observation_timestamp IS NOT NULL;
+
+ALTER SEQUENCE weather_observations_id_seq OWNED BY weather_observations.id;
+DROP TABLE weather_observations_unpartitioned;
+
+ANALYZE weather_observations;
+
+COMMIT;
@@ -0,0 +1,89 @@
+-- Adds the hourly and daily rollup tables and fills them from the stored observations.
+-- Run once after 002_partition_weather_observations.sql:
+--     psql -h <host> -U postgres -d postgres -f migrations/003_rollups.sql
+-- Later runs of the DAG keep the rollups current through the update_rollups task.
+BEGIN;
+
+-- Hourly and daily rollups of weather_observations, refreshed by the update_rollups task for the
+-- buckets each run touched. max_wind_speed_change is the largest absolute change between an
+-- observation in the bucket and the station's previous observation.
+CREATE TABLE IF NOT EXISTS weather_observations_hourly (
+    station_key INTEGER NOT NULL REFERENCES stations (station_key),
+    bucket_start TIMESTAMP NOT NULL,
+    observation_count INTEGER NOT NULL,
+    temperature_min DECIMAL(5,2),
+    temperature_max DECIMAL(5,2),
+    temperature_avg NUMERIC,
+    temperature_count INTEGER NOT NULL,
+    wind_speed_min DECIMAL(5,2),
+    wind_speed_max DECIMAL(5,2),
+    wind_speed_avg NUMERIC,
+    wind_speed_count INTEGER NOT NULL,
+    humidity_min DECIMAL(5,2),
+    humidity_max DECIMAL(5,2),
+    humidity_avg NUMERIC,
+    humidity_count INTEGER NOT NULL,
+    max_wind_speed_change DECIMAL(5,2),
+    PRIMARY KEY (station_key, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS weather_observations_daily (
+    station_key INTEGER NOT NULL REFERENCES stations (station_key),
+    bucket_start TIMESTAMP NOT NULL,
+    observation_count INTEGER NOT NULL,
+    temperature_min DECIMAL(5,2),
+    temperature_max DECIMAL(5,2),
+    temperature_avg NUMERIC,
+    temperature_count INTEGER NOT NULL,
+    wind_speed_min DECIMAL(5,2),
+    wind_speed_max DECIMAL(5,2),
+    wind_speed_avg NUMERIC,
+    wind_speed_count INTEGER NOT NULL,
+    humidity_min DECIMAL(5,2),
+    humidity_max DECIMAL(5,2),
+    humidity_avg NUMERIC,
+    humidity_count INTEGER NOT NULL,
+    max_wind_speed_change DECIMAL(5,2),
+    PRIMARY KEY (station_key, bucket_start)
+);
+
+INSERT INTO weather_observations_hourly (station_key, bucket_start, observation_count,
+                     temperature_min, temperature_max, temperature_avg, temperature_count,
+                     wind_speed_min, wind_speed_max, wind_speed_avg, wind_speed_count,
+                     humidity_min, humidity_max, humidity_avg, humidity_count,
+                     max_wind_speed_change)
+SELECT station_key,
+       date_trunc('hour', observation_timestamp),
+       COUNT(*),
+       MIN(temperature), MAX(temperature), AVG(temperature), COUNT(temperature),
+       MIN(wind_speed), MAX(wind_speed), AVG(wind_speed), COUNT(wind_speed),
+       MIN(humidity), MAX(humidity), AVG(humidity), COUNT(humidity),
+       MAX(ABS(wind_speed - previous_wind_speed))
+FROM (
+    SELECT o.*, LAG(o.wind_speed) OVER (PARTITION BY o.station_key ORDER BY o.observation_timestamp) AS previous_wind_speed
+    FROM weather_observations o
+) observations
+GROUP BY station_key, date_trunc('hour', observation_timestamp);
+
+INSERT INTO weather_observations_daily (station_key, bucket_start, observation_count,
+                     temperature_min, temperature_max, temperature_avg, temperature_count,
+                     wind_speed_min, wind_speed_max, wind_speed_avg, wind_speed_count,
+                     humidity_min, humidity_max, humidity_avg, humidity_count,
+                     max_wind_speed_change)
+SELECT station_key,
+       date_trunc('day', observation_timestamp),
+       COUNT(*),
+       MIN(temperature), MAX(temperature), AVG(temperature), COUNT(temperature),
+       MIN(wind_speed), MAX(wind_speed), AVG(wind_speed), COUNT(wind_speed),
+       MIN(humidity), MAX(humidity), AVG(humidity), COUNT(humidity),
+       MAX(ABS(wind_speed - previous_wind_speed))
+FROM (
+    SELECT o.*, LAG(o.wind_speed) OVER (PARTITION BY o.station_key ORDER BY o.observation_timestamp) AS previous_wind_speed
+    FROM weather_observations o
+) observations
+GROUP BY station_key, date_trunc('day', observation_timestamp);
+
+ANALYZE weather_observations_hourly;
+ANALYZE weather_observations_daily;
+
+COMMIT;
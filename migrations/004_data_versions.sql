@@ -0,0 +1,12 @@
+-- Adds the data_versions table used to invalidate the app's query cache.
+-- Run once after 003_rollups.sql:
+--     psql -h <host> -U postgres -d postgres -f migrations/004_data_versions.sql
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    dataset VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMIT;
@@ -0,0 +1,12 @@
+-- Indexes the rollups by bucket, for the app's all-stations overview which reads one time
+-- window of every station. Run once after 004_data_versions.sql:
+--     psql -h <host> -U postgres -d postgres -f migrations/005_rollup_bucket_indexes.sql
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS weather_observations_hourly_bucket_start_idx
+    ON weather_observations_hourly (bucket_start);
+
+CREATE INDEX IF NOT EXISTS weather_observations_daily_bucket_start_idx
+    ON weather_observations_daily (bucket_start);
+
+COMMIT;
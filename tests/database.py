@@ -0,0 +1,29 @@
+import os
+import unittest
+import psycopg2
+from utils.shared import get_db_connection
+
+INIT_SQL = os.path.join(os.path.dirname(__file__), '..', 'init_db', 'init.sql')
+
+
+def connect_or_skip():
+    """
+    Connects to the database configured through the DATABASE_* variables, or skips the test
+    class when none is configured or reachable.
+    """
+    if not os.getenv('DATABASE_HOST'):
+        raise unittest.SkipTest("DATABASE_HOST is not set.")
+    try:
+        return get_db_connection()
+    except psycopg2.OperationalError as e:
+        raise unittest.SkipTest(f"Database not reachable: {e}")
+
+
+def create_test_schema(cursor, schema):
+    """
+    Creates the pipeline tables in a throwaway schema and makes it the current one for the
+    rest of the transaction. Rolling the transaction back removes everything.
+    """
+    cursor.execute(f"CREATE SCHEMA {schema}; SET LOCAL search_path TO {schema};")
+    with open(INIT_SQL) as init_sql:
+        cursor.execute(init_sql.read())
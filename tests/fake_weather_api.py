@@ -0,0 +1,226 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class FakeWeatherAPI:
+    """
+    Local stand-in for the weather.gov API used by tests and benchmarks.
+
+    Serves `/stations` and `/stations/<id>/observations` with synthetic GeoJSON features
+    and an artificial per-request latency. When `page_size` is set, responses are split into
+    pages linked through `pagination.next` cursors the same way weather.gov does it, including
+    the trailing empty page. With `validators`, 200 responses carry an ETag and a Last-Modified
+    header, and conditional requests matching them are answered with `304 Not Modified`.
+
+    Usage:
+        with FakeWeatherAPI(number_of_stations=50, latency=0.05) as api:
+            requests.get(f'{api.stations_endpoint}/ST0001/observations')
+    """
+
+    def __init__(self, number_of_stations=10, observations_per_station=24, latency=0.0, page_size=None,
+                 validators=False, rate_limit=None, slow_latency=1.0, retry_after='0'):
+        self.number_of_stations = number_of_stations
+        self.observations_per_station = observations_per_station
+        self.latency = latency
+        self.page_size = page_size
+        self.validators = validators
+        self.last_modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.rate_limit = rate_limit
+        self.slow_latency = slow_latency
+        self.retry_after = retry_after
+        self.faults = deque()
+        self._observations = {}
+        self.status_counts = Counter()
+        self._allowance = float(rate_limit or 0)
+        self._allowance_at = time.monotonic()
+        self.request_count = 0
+        self.full_response_count = 0
+        self.not_modified_count = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def stations_endpoint(self):
+        return f'{self.base_url}/stations'
+
+    def station_ids(self):
+        return [f'ST{index:04d}' for index in range(self.number_of_stations)]
+
+    def station_feature(self, station_id):
+        index = int(station_id[2:])
+        return {
+            'id': f'{self.stations_endpoint}/{station_id}',
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [-120.0 + index % 50, 30.0 + index % 20]},
+            'properties': {
+                'stationIdentifier': station_id,
+                'name': f'Station {station_id}',
+                'timeZone': 'America/Chicago',
+            },
+        }
+
+    def observation_feature(self, station_id, timestamp):
+        return {
+            'id': f'{self.stations_endpoint}/{station_id}/observations/{timestamp}',
+            'type': 'Feature',
+            'properties': {
+                'station': f'{self.stations_endpoint}/{station_id}',
+                'timestamp': timestamp,
+                'temperature': {'unitCode': 'wmoUnit:degC', 'value': 20.123},
+                'windSpeed': {'unitCode': 'wmoUnit:km_h-1', 'value': 11.456},
+                'relativeHumidity': {'unitCode': 'wmoUnit:percent', 'value': 55.789},
+            },
+        }
+
+    def observation_features(self, station_id):
+        # Built once per station, so serving a page costs little more than encoding it
+        key = (station_id, self.observations_per_station)
+        if key not in self._observations:
+            start = datetime(2024, 1, 1)
+            self._observations[key] = [
+                self.observation_feature(station_id, (start + timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M:%S+00:00'))
+                for hour in range(self.observations_per_station)
+            ]
+        return self._observations[key]
+
+    def paginate(self, path, features, query):
+        """
+        Returns the page of `features` selected by the `cursor` query parameter.
+        """
+        if not self.page_size:
+            return {'features': features}
+        offset = int(parse_qs(query).get('cursor', ['0'])[0])
+        return {
+            'features': features[offset:offset + self.page_size],
+            'pagination': {'next': f'{self.base_url}{path}?cursor={min(offset + self.page_size, len(features))}'},
+        }
+
+    def handle(self, path, query=''):
+        """
+        Returns the (status, payload) served for a request path and query string.
+        """
+        parts = [part for part in path.split('/') if part]
+        if parts == ['stations']:
+            features = [self.station_feature(station_id) for station_id in self.station_ids()]
+            return 200, self.paginate(path, features, query)
+        if len(parts) == 3 and parts[0] == 'stations' and parts[2] == 'observations':
+            return 200, self.paginate(path, self.observation_features(parts[1]), query)
+        return 404, {'detail': 'Not Found'}
+
+    def next_fault(self):
+        """
+        Returns the fault to inject into the current request, or None.
+
+        Returns:
+            tuple: (status, Retry-After header or None) of an error response, or ('slow', None).
+        """
+        with self._lock:
+            if self.faults:
+                fault = self.faults.popleft()
+                return fault, self.retry_after if fault == 429 else None
+            if self.rate_limit:
+                now = time.monotonic()
+                self._allowance = min(self.rate_limit, self._allowance + (now - self._allowance_at) * self.rate_limit)
+                self._allowance_at = now
+                if self._allowance < 1:
+                    return 429, f'{(1 - self._allowance) / self.rate_limit:.3f}'
+                self._allowance -= 1
+        return None
+
+    def not_modified(self, headers, etag):
+        """
+        Tells whether a conditional request can be answered with `304 Not Modified`.
+        """
+        if 'If-None-Match' in headers:
+            return headers['If-None-Match'] == etag
+        if 'If-Modified-Since' in headers:
+            try:
+                return parsedate_to_datetime(headers['If-Modified-Since']) >= self.last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with api._lock:
+                    api.request_count += 1
+                if api.latency:
+                    time.sleep(api.latency)
+                fault = api.next_fault()
+                if fault is not None and fault[0] == 'slow':
+                    time.sleep(api.slow_latency)
+                elif fault is not None:
+                    status, retry_after = fault
+                    with api._lock:
+                        api.status_counts[status] += 1
+                    body = json.dumps({'status': status}).encode()
+                    self.send_response(status)
+                    self.send_header('Content-Length', str(len(body)))
+                    if retry_after is not None:
+                        self.send_header('Retry-After', retry_after)
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                url = urlsplit(self.path)
+                status, payload = api.handle(url.path, url.query)
+                body = json.dumps(payload).encode()
+                if api.validators and status == 200:
+                    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                    if api.not_modified(self.headers, etag):
+                        with api._lock:
+                            api.not_modified_count += 1
+                            api.status_counts[304] += 1
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+                with api._lock:
+                    api.full_response_count += 1
+                    api.status_counts[status] += 1
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/geo+json')
+                self.send_header('Content-Length', str(len(body)))
+                if api.validators and status == 200:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', format_datetime(api.last_modified, usegmt=True))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
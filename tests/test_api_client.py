@@ -0,0 +1,80 @@
+import unittest
+from itertools import islice
+from utils.api_client import create_session, fetch_concurrently, iter_features, iter_pages
+from tests.fake_weather_api import FakeWeatherAPI
+
+class TestApiClient(unittest.TestCase):
+    """
+    Unit tests for the weather.gov API client helpers.
+    This class runs the pager and the concurrent fetcher against a local fake API.
+    """
+
+    def setUp(self):
+        self.api = FakeWeatherAPI(number_of_stations=250, observations_per_station=95, page_size=20).start()
+        self.session = create_session()
+
+    def tearDown(self):
+        self.session.close()
+        self.api.stop()
+
+    def test_iter_features_follows_every_page(self):
+        """
+        Test that iter_features follows `pagination.next` until the trailing empty page.
+
+        The fake API serves 250 stations in pages of 20, so 13 pages of data plus
+        the final empty page must be requested.
+        """
+        station_ids = [feature['properties']['stationIdentifier']
+                       for feature in iter_features(self.session, self.api.stations_endpoint)]
+
+        self.assertEqual(station_ids, self.api.station_ids())
+        self.assertEqual(self.api.request_count, 14)
+
+    def test_iter_features_is_lazy(self):
+        """
+        Test that iter_features only requests the pages that are consumed.
+        """
+        features = iter_features(self.session, self.api.stations_endpoint)
+        first = list(islice(features, 25))
+
+        self.assertEqual(len(first), 25)
+        self.assertEqual(self.api.request_count, 2)
+
+    def test_iter_pages_max_pages(self):
+        """
+        Test that iter_pages stops after `max_pages` pages.
+        """
+        pages = list(iter_pages(self.session, self.api.stations_endpoint, max_pages=3))
+
+        self.assertEqual([len(page) for page in pages], [20, 20, 20])
+        self.assertEqual(self.api.request_count, 3)
+
+    def test_iter_features_observations(self):
+        """
+        Test that the observations of a station are read across pages with the
+        query parameters of the first request.
+        """
+        url = f'{self.api.stations_endpoint}/ST0007/observations'
+        observations = list(iter_features(self.session, url, params={'start': '2024-01-01T00:00:00Z'}))
+
+        self.assertEqual(len(observations), 95)
+        self.assertEqual(len({obs['properties']['timestamp'] for obs in observations}), 95)
+
+    def test_fetch_concurrently_collects_failures(self):
+        """
+        Test that fetch_concurrently returns the results of the items that succeeded
+        together with the exceptions of the ones that failed.
+        """
+        def fetch(item):
+            if item % 2:
+                raise ValueError(item)
+            return item * 10
+
+        results, failures = fetch_concurrently(fetch, range(6), max_workers=3)
+
+        self.assertEqual(sorted(results), [(0, 0), (2, 20), (4, 40)])
+        self.assertEqual(sorted(item for item, _ in failures), [1, 3, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
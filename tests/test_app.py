@@ -1,7 +1,13 @@
 import unittest
+from datetime import datetime, timedelta
 from unittest.mock import patch
 import pandas as pd
-from weather_app.app import get_average_temperature, get_max_wind_speed_change, get_station_names
+from utils.query_cache import QueryCache
+from utils.sql_queries_app import *
+from weather_app.app import (find_nearby_stations, find_stations_in_area, get_average_temperature,
+                             get_max_wind_speed_change, get_station_names, get_station_timeseries,
+                             get_stations_overview, name_pattern)
+from tests.database import connect_or_skip, create_test_schema
 
 class TestWeatherApp(unittest.TestCase):
     """
@@ -9,8 +15,15 @@ class TestWeatherApp(unittest.TestCase):
     This class tests the functions get_average_temperature, get_max_wind_speed_change, and get_station_names.
     """
 
-    @patch('weather_app.app.get_db_connection')
-    def test_get_average_temperature(self, mock_get_db_connection):
+    def setUp(self):
+        # Each test gets an empty query cache whose data version never changes
+        self.cache = QueryCache(lambda: 0)
+        patcher = patch('weather_app.app.get_query_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('weather_app.app.db_connection')
+    def test_get_average_temperature(self, mock_db_connection):
         """
         Test the get_average_temperature function.
 
@@ -18,9 +31,9 @@ class TestWeatherApp(unittest.TestCase):
         an average temperature for a specific weather station. It checks that the function
         correctly retrieves the average temperature.
 
-        :param mock_get_db_connection: Mock object for the get_db_connection function.
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
         """
-        mock_conn = mock_get_db_connection.return_value
+        mock_conn = mock_db_connection.return_value.__enter__.return_value
         mock_conn.cursor.return_value.__enter__.return_value.fetchall.return_value = [(20.5,)]
         pd.read_sql_query = lambda query, con, params: pd.DataFrame({'average_temperature': [20.5]})
 
@@ -28,8 +41,8 @@ class TestWeatherApp(unittest.TestCase):
         self.assertEqual(result, 20.5)
 
 
-    @patch('weather_app.app.get_db_connection') 
-    def test_get_max_wind_speed_change(self, mock_get_db_connection):
+    @patch('weather_app.app.db_connection') 
+    def test_get_max_wind_speed_change(self, mock_db_connection):
         """
         Test the get_max_wind_speed_change function.
 
@@ -37,15 +50,172 @@ class TestWeatherApp(unittest.TestCase):
         the maximum change in wind speed for a specific weather station. It checks that
         the function retrieves the correct maximum wind speed change.
 
-        :param mock_get_db_connection: Mock object for the get_db_connection function.
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
         """
-        mock_conn = mock_get_db_connection.return_value
+        mock_conn = mock_db_connection.return_value.__enter__.return_value
         mock_conn.cursor.return_value.__enter__.return_value.fetchall.return_value = [(5.0,)]
         pd.read_sql_query = lambda query, con, params: pd.DataFrame({'max_change': [5.0]})
 
         result = get_max_wind_speed_change("Sample Station")
         self.assertEqual(result, 5.0)
 
+    @patch('weather_app.app.db_connection')
+    def test_results_are_cached(self, mock_db_connection):
+        """
+        Test that repeated calls are served from the query cache without a database connection.
+
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        """
+        pd.read_sql_query = lambda query, con, params: pd.DataFrame({'average_temperature': [20.5]})
+
+        self.assertEqual(get_average_temperature("Sample Station"), 20.5)
+        self.assertEqual(get_average_temperature("Sample Station"), 20.5)
+
+        mock_db_connection.assert_called_once()
+        self.assertEqual((self.cache.stats()['hits'], self.cache.stats()['misses']), (1, 1))
+
+    @patch('weather_app.app.read_cached_query')
+    def test_get_stations_overview(self, mock_read_cached_query):
+        """
+        Test that the overview is read with one query for the requested page, and that the
+        number of matching stations is split off the rows.
+
+        :param mock_read_cached_query: Mock object for the cached query runner.
+        """
+        mock_read_cached_query.return_value = pd.DataFrame({
+            'station_name': ['B', 'A'], 'average_temperature': [21.0, 20.0], 'max_change': [3.0, 5.0],
+            'station_count': [12, 12],
+        })
+
+        df, total = get_stations_overview('st_', order_by='average_temperature', descending=True, page=3, page_size=5)
+
+        self.assertEqual(total, 12)
+        self.assertEqual(list(df.columns), ['station_name', 'average_temperature', 'max_change'])
+        mock_read_cached_query.assert_called_once_with(stations_overview_query('average_temperature', True),
+                                                       ('%st\\_%', 5, 10), name='stations_overview')
+
+    @patch('weather_app.app.pd.read_sql_query')
+    @patch('weather_app.app.db_connection')
+    def test_get_station_timeseries(self, mock_db_connection, mock_read_sql_query):
+        """
+        Test that a long window is read from the hourly rollup, downsampled to the requested
+        points, and cached for windows aligned to the same buckets.
+        """
+        buckets = pd.date_range('2024-01-01', periods=2000, freq='h')
+        mock_read_sql_query.return_value = pd.DataFrame({'bucket': buckets, 'temperature': range(2000),
+                                                         'wind_speed': 1.0, 'humidity': None})
+        end = datetime(2024, 3, 25, 10, 5)
+
+        series = get_station_timeseries("Alpha", end - timedelta(days=83), end, points=100)
+        get_station_timeseries("Alpha", end + timedelta(minutes=5) - timedelta(days=83), end + timedelta(minutes=5),
+                               points=100)
+
+        mock_read_sql_query.assert_called_once()
+        query = mock_read_sql_query.call_args.args[0]
+        self.assertIn('weather_observations_hourly', query)
+        self.assertEqual(mock_read_sql_query.call_args.kwargs['params']['bucket'], 18000)
+        self.assertEqual((len(series['temperature']), len(series['wind_speed']), len(series['humidity'])),
+                         (100, 100, 0))
+
+    @patch('weather_app.app.pd.read_sql_query')
+    @patch('weather_app.app.db_connection')
+    def test_station_search(self, mock_db_connection, mock_read_sql_query):
+        """
+        Test that nearby and area searches share one station index, built from a single query.
+        """
+        mock_read_sql_query.return_value = pd.DataFrame({
+            'station_id': ['JFK', 'LGA', 'LAX'], 'station_name': ['Kennedy', 'LaGuardia', 'Los Angeles'],
+            'latitude': [40.64, 40.78, 33.94], 'longitude': [-73.78, -73.87, -118.41]})
+
+        nearby = find_nearby_stations(40.73, -73.99, k=2)
+        area = find_stations_in_area(30.0, -125.0, 45.0, -70.0)
+
+        mock_read_sql_query.assert_called_once()
+        self.assertEqual(nearby['station_id'].tolist(), ['LGA', 'JFK'])
+        self.assertEqual(area['station_name'].tolist(), ['Kennedy', 'LaGuardia', 'Los Angeles'])
+
+    def test_stations_overview_rejects_unknown_columns(self):
+        """
+        Test that the overview can only be ordered by its own columns, since the column is part of the SQL.
+        """
+        with self.assertRaises(ValueError):
+            stations_overview_query('station_name; DROP TABLE stations')
+
+    def test_name_pattern(self):
+        """
+        Test that the filter text matches anywhere in the name, with LIKE wildcards taken literally.
+        """
+        self.assertEqual(name_pattern(' Lake '), '%Lake%')
+        self.assertEqual(name_pattern('100%_\\'), '%100\\%\\_\\\\%')
+        self.assertEqual(name_pattern(''), '%%')
+
+
+class TestStationsOverviewQuery(unittest.TestCase):
+    """
+    Database tests for the all-stations overview query, skipped when no database is reachable.
+    """
+
+    def setUp(self):
+        self.conn = connect_or_skip()
+        self.cursor = self.conn.cursor()
+        create_test_schema(self.cursor, 'test_overview')
+        yesterday = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+        last_week = yesterday - timedelta(days=7)
+        # (name, [(bucket_start, temperature_avg, temperature_count, max_wind_speed_change)])
+        stations = [
+            ('Alpha', [(last_week, 10.0, 1, 2.0), (last_week + timedelta(hours=1), 20.0, 3, 4.0), (yesterday, 5.0, 2, 7.0)]),
+            ('Beta', [(last_week, 30.0, 2, 1.0), (yesterday, 6.0, 1, 9.0)]),
+            ('Gamma_1', [(last_week, 15.0, 1, None)]),
+        ]
+        for number, (name, buckets) in enumerate(stations):
+            self.cursor.execute("INSERT INTO stations (station_id, station_name) VALUES (%s, %s) RETURNING station_key",
+                                (f'S{number}', name))
+            station_key = self.cursor.fetchone()[0]
+            for table in ('weather_observations_hourly', 'weather_observations_daily'):
+                self.cursor.executemany(f"""
+                    INSERT INTO {table} (station_key, bucket_start, observation_count, temperature_avg,
+                                         temperature_count, wind_speed_count, humidity_count, max_wind_speed_change)
+                    VALUES (%s, date_trunc(%s, %s::timestamp), %s, %s, %s, 0, 0, %s)
+                    ON CONFLICT (station_key, bucket_start) DO NOTHING;
+                """, [(station_key, 'day' if table.endswith('daily') else 'hour', bucket_start, count, average, count,
+                       change) for bucket_start, average, count, change in buckets])
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def overview(self, pattern='%', limit=10, offset=0, **kwargs):
+        self.cursor.execute(stations_overview_query(**kwargs), (pattern, limit, offset))
+        return self.cursor.fetchall()
+
+    def test_matches_per_station_queries(self):
+        """
+        Test that each overview row holds the values of the per-station queries for the same station.
+        """
+        rows = self.overview()
+
+        self.assertEqual([row[0] for row in rows], ['Alpha', 'Beta', 'Gamma_1'])
+        for station_name, average_temperature, max_change, station_count in rows:
+            self.cursor.execute(average_temperature_query(), (station_name,))
+            self.assertEqual(average_temperature, self.cursor.fetchone()[0])
+            self.cursor.execute(max_wind_speed_change_query(), (station_name,))
+            self.assertEqual(max_change, self.cursor.fetchone()[0])
+            self.assertEqual(station_count, 3)
+
+    def test_orders_filters_and_paginates(self):
+        """
+        Test that rows are ordered with missing values last, filtered by name and paginated,
+        with the count of every matching station on each page.
+        """
+        by_change = self.overview(order_by='max_change', descending=True)
+        self.assertEqual([row[0] for row in by_change], ['Beta', 'Alpha', 'Gamma_1'])
+
+        self.assertEqual([row[0] for row in self.overview(name_pattern('_'))], ['Gamma_1'])
+        self.assertEqual([row[0] for row in self.overview(name_pattern('A'))], ['Alpha', 'Beta', 'Gamma_1'])
+
+        page = self.overview(limit=2, offset=2)
+        self.assertEqual([(row[0], row[3]) for row in page], [('Gamma_1', 3)])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,213 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import MagicMock
+import pandas as pd
+from utils.archive import HISTORY_COLUMNS, ObservationArchive, archive_holds_month, monthly_history, prune_month
+from utils.partitions import ensure_partitions, list_partitions
+from utils.rollups import refresh_rollups
+from utils.sql_queries_app import monthly_history_query
+from utils.sql_queries_dag import *
+from tests.database import connect_or_skip, create_test_schema
+
+def observation_rows(station_keys, start, hours):
+    return [
+        (station_key, start + timedelta(hours=hour), 10.0 + hour % 5, 'wmoUnit:degC', float(hour % 7),
+         'wmoUnit:km_h-1', 50.0 + station_key)
+        for station_key in station_keys for hour in range(hours)
+    ]
+
+class RowsCursor:
+    """
+    Cursor returning canned rows from fetchmany, like a server-side cursor.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        self._rows = iter(self.rows)
+
+    def fetchmany(self, size):
+        chunk = []
+        for row in self._rows:
+            chunk.append(row)
+            if len(chunk) == size:
+                break
+        return chunk
+
+class TestObservationArchive(unittest.TestCase):
+    """
+    Unit tests for the Parquet archive of closed months.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.archive = ObservationArchive(self.directory.name)
+
+    def test_export_month_partitions_by_station_and_month(self):
+        """
+        Test that a month is read in chunks, written as one file per station and recorded in the manifest.
+        """
+        cursor = RowsCursor(observation_rows([1, 2], datetime(2024, 1, 1), 48))
+
+        exported = self.archive.export_month(cursor, datetime(2024, 1, 20), fetch_size=10)
+
+        self.assertEqual(exported, 96)
+        self.assertEqual(cursor.executed, [(EXPORT_MONTH_QUERY, (datetime(2024, 1, 1), datetime(2024, 2, 1)))])
+        for station_key in (1, 2):
+            self.assertTrue(os.path.exists(os.path.join(self.directory.name, f'station_key={station_key}',
+                                                        'month=2024-01', 'data.parquet')))
+        self.assertTrue(self.archive.is_archived(datetime(2024, 1, 1)))
+        self.assertFalse(self.archive.is_archived(datetime(2024, 2, 1)))
+        self.assertEqual(self.archive.manifest()['2024-01']['rows'], 96)
+
+    def test_export_month_merges_with_archived_rows(self):
+        """
+        Test that exporting a month again keeps the archived rows and replaces those with the same timestamp.
+        """
+        self.archive.export_month(RowsCursor(observation_rows([1], datetime(2024, 1, 1), 24)), datetime(2024, 1, 1))
+        backfill = [(1, datetime(2024, 1, 1, 5), 99.0, 'wmoUnit:degC', 1.0, 'wmoUnit:km_h-1', None),
+                    (1, datetime(2024, 1, 30), 5.0, 'wmoUnit:degC', 1.0, 'wmoUnit:km_h-1', None)]
+
+        self.archive.export_month(RowsCursor(backfill), datetime(2024, 1, 1))
+
+        table = self.archive.scan([1]).to_pandas()
+        self.assertEqual(len(table), 25)
+        self.assertTrue(table['observation_timestamp'].is_monotonic_increasing)
+        self.assertEqual(table.loc[table['observation_timestamp'] == datetime(2024, 1, 1, 5), 'temperature'].item(), 99.0)
+
+    def test_scan_filters_stations_and_time(self):
+        """
+        Test that scans only return the requested stations, time range and columns.
+        """
+        rows = observation_rows([1, 2], datetime(2024, 1, 31), 48)
+        for month in (datetime(2024, 1, 1), datetime(2024, 2, 1)):
+            self.archive.export_month(RowsCursor([row for row in rows if row[1].month == month.month]), month)
+
+        table = self.archive.scan([2], start=datetime(2024, 1, 31, 12), end=datetime(2024, 2, 1, 12),
+                                  columns=['station_key', 'observation_timestamp'])
+
+        self.assertEqual(table.column_names, ['station_key', 'observation_timestamp'])
+        self.assertEqual(set(table.column('station_key').to_pylist()), {2})
+        self.assertEqual(len(table), 24)
+        self.assertEqual(self.archive.count_rows(), 96)
+
+    def test_monthly_summary(self):
+        """
+        Test that archived observations are aggregated by month across the selected stations.
+        """
+        self.archive.export_month(RowsCursor(observation_rows([1, 2, 3], datetime(2024, 1, 1), 10)),
+                                  datetime(2024, 1, 1))
+
+        summary = self.archive.monthly_summary([1, 2])
+
+        self.assertEqual(list(summary.columns), list(HISTORY_COLUMNS))
+        row = summary.iloc[0]
+        self.assertEqual(row['month'], pd.Timestamp(2024, 1, 1))
+        self.assertEqual(row['observation_count'], 20)
+        self.assertAlmostEqual(row['temperature_avg'], 12.0)
+        self.assertEqual((row['temperature_min'], row['temperature_max'], row['wind_speed_max']), (10.0, 14.0, 6.0))
+        self.assertAlmostEqual(row['humidity_avg'], 51.5)
+
+    def test_monthly_history_prefers_postgres(self):
+        """
+        Test that months still in Postgres come from the rollups and the others from the archive.
+        """
+        for month in (datetime(2023, 12, 1), datetime(2024, 1, 1)):
+            self.archive.export_month(RowsCursor(observation_rows([1], month, 10)), month)
+        recent = pd.DataFrame([[datetime(2024, 1, 1), 3, Decimal('1.5'), Decimal('1.0'), Decimal('2.0'),
+                                Decimal('4.0'), None]], columns=list(HISTORY_COLUMNS))
+
+        history = monthly_history(recent, self.archive, [1], datetime(2023, 1, 1), datetime(2025, 1, 1))
+
+        self.assertEqual(history['month'].tolist(), [pd.Timestamp(2023, 12, 1), pd.Timestamp(2024, 1, 1)])
+        self.assertEqual(history['observation_count'].tolist(), [10, 3])
+        self.assertEqual(history['temperature_avg'].tolist()[1], 1.5)
+        self.assertEqual(monthly_history(recent, None, [1], datetime(2023, 1, 1), datetime(2025, 1, 1))['month'].tolist(),
+                         [pd.Timestamp(2024, 1, 1)])
+
+    def test_archive_holds_month(self):
+        """
+        Test that a month's partition may only be dropped once the month is archived with all of its rows.
+        """
+        self.archive.export_month(RowsCursor(observation_rows([1, 2], datetime(2024, 1, 1), 24)), datetime(2024, 1, 1))
+        cursor = MagicMock()
+
+        cursor.fetchone.return_value = (48,)
+        self.assertTrue(archive_holds_month(cursor, self.archive, datetime(2024, 1, 10)))
+        cursor.fetchone.return_value = (49,)
+        self.assertFalse(archive_holds_month(cursor, self.archive, datetime(2024, 1, 10)))
+        cursor.reset_mock()
+        self.assertFalse(archive_holds_month(cursor, self.archive, datetime(2024, 2, 1)))
+        cursor.execute.assert_not_called()
+
+    def test_prune_month(self):
+        """
+        Test that pruning drops the month's partition and deletes its rollups.
+        """
+        cursor = MagicMock()
+
+        prune_month(cursor, datetime(2024, 1, 15))
+
+        self.assertEqual(cursor.execute.call_count, 3)
+        params = [call.args[1] if len(call.args) > 1 else None for call in cursor.execute.call_args_list]
+        self.assertEqual(params, [None, (datetime(2024, 1, 1), datetime(2024, 2, 1)),
+                                  (datetime(2024, 1, 1), datetime(2024, 2, 1))])
+
+
+class TestArchiveDatabase(unittest.TestCase):
+    """
+    Database tests for exporting and pruning months, skipped when no database is reachable.
+    """
+
+    def setUp(self):
+        self.conn = connect_or_skip()
+        self.cursor = self.conn.cursor()
+        create_test_schema(self.cursor, 'test_archive')
+        ensure_partitions(self.cursor, datetime(2024, 1, 1), datetime(2024, 2, 1))
+        self.cursor.execute("INSERT INTO stations (station_id, station_name) VALUES ('A', 'Alpha') RETURNING station_key")
+        self.station_key = self.cursor.fetchone()[0]
+        self.cursor.executemany("INSERT INTO weather_observations VALUES (DEFAULT, %s, %s, %s, %s, %s, %s, %s)",
+                                observation_rows([self.station_key], datetime(2024, 1, 30), 72))
+        refresh_rollups(self.cursor, [[self.station_key, '2024-01-30T00:00:00Z', '2024-02-02T00:00:00Z']])
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.archive = ObservationArchive(self.directory.name)
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def test_archive_matches_rollups_and_prunes(self):
+        """
+        Test that the archive yields the monthly history of the rollups, and that pruning a month
+        removes it from Postgres while the combined history stays the same.
+        """
+        start, end = datetime(2024, 1, 1), datetime(2024, 3, 1)
+        self.assertEqual(self.archive.export_month(self.cursor, datetime(2024, 1, 1)), 48)
+        self.cursor.execute(monthly_history_query(), ('Alpha', start, end))
+        recent = pd.DataFrame(self.cursor.fetchall(), columns=list(HISTORY_COLUMNS))
+        before = monthly_history(recent, None, [self.station_key], start, end)
+
+        pd.testing.assert_frame_equal(self.archive.monthly_summary([self.station_key], start, end),
+                                      before.iloc[:1], check_dtype=False)
+
+        self.assertTrue(archive_holds_month(self.cursor, self.archive, datetime(2024, 1, 1)))
+        self.assertFalse(archive_holds_month(self.cursor, self.archive, datetime(2024, 2, 1)))
+        prune_month(self.cursor, datetime(2024, 1, 1))
+        self.assertNotIn('weather_observations_y2024m01', list_partitions(self.cursor))
+        self.cursor.execute(monthly_history_query(), ('Alpha', start, end))
+        recent = pd.DataFrame(self.cursor.fetchall(), columns=list(HISTORY_COLUMNS))
+        self.assertEqual(len(recent), 1)
+        pd.testing.assert_frame_equal(monthly_history(recent, self.archive, [self.station_key], start, end), before,
+                                      check_dtype=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from utils.downsampling import DAY, HOUR, downsample_series, lttb, plan_resolution
+from utils.partitions import ensure_partitions
+from utils.rollups import refresh_rollups
+from utils.sql_queries_app import timeseries_query
+from tests.database import connect_or_skip, create_test_schema
+
+class TestLTTB(unittest.TestCase):
+    """
+    Unit tests for the Largest-Triangle-Three-Buckets downsampling.
+    """
+
+    def test_keeps_endpoints_and_point_count(self):
+        """
+        Test that the requested number of increasing indexes is returned, starting and ending
+        with the first and last points.
+        """
+        x = np.arange(10000)
+        y = np.sin(x / 100)
+
+        selected = lttb(x, y, 100)
+
+        self.assertEqual(len(selected), 100)
+        self.assertEqual((selected[0], selected[-1]), (0, 9999))
+        self.assertTrue(np.all(np.diff(selected) > 0))
+
+    def test_keeps_spikes(self):
+        """
+        Test that isolated peaks and troughs survive, where averaging the buckets would flatten them.
+        """
+        y = np.zeros(5000)
+        y[1234], y[3210] = 50.0, -40.0
+
+        selected = lttb(np.arange(5000), y, 50)
+
+        self.assertIn(1234, selected)
+        self.assertIn(3210, selected)
+
+    def test_short_series_are_kept(self):
+        """
+        Test that every point is kept when the series is not longer than requested.
+        """
+        self.assertEqual(lttb([0, 1, 2], [5, 6, 7], 10).tolist(), [0, 1, 2])
+        self.assertEqual(lttb([], [], 10).tolist(), [])
+
+
+class TestPlanResolution(unittest.TestCase):
+    """
+    Unit tests for the choice of bucket size and source per window.
+    """
+
+    def test_sources_by_window_length(self):
+        """
+        Test that short windows are bucketed from raw observations, and longer ones from the
+        hourly or daily rollups in whole hours or days.
+        """
+        start = datetime(2024, 6, 1, 13, 7)
+        self.assertEqual(plan_resolution(start, start + timedelta(days=1), 500, oversample=4)[:2], ('raw', 44))
+        self.assertEqual(plan_resolution(start, start + timedelta(days=90), 500, oversample=4)[:2],
+                         ('hourly', 2 * HOUR))
+        self.assertEqual(plan_resolution(start, start + timedelta(days=3650), 500, oversample=4)[:2],
+                         ('daily', 2 * DAY))
+
+    def test_window_is_aligned_to_buckets(self):
+        """
+        Test that the window is widened to whole buckets, so that nearby windows plan the same query.
+        """
+        end = datetime(2024, 6, 30, 13, 7)
+        first = plan_resolution(end - timedelta(days=90), end, 500, oversample=4)
+        later = plan_resolution(end + timedelta(minutes=20) - timedelta(days=90), end + timedelta(minutes=20), 500,
+                                oversample=4)
+
+        self.assertEqual(first, ('hourly', 2 * HOUR, datetime(2024, 4, 1, 12), datetime(2024, 6, 30, 14)))
+        self.assertEqual(first, later)
+
+
+class TestDownsampleSeries(unittest.TestCase):
+    """
+    Unit tests for downsampling the columns of a bucketed frame.
+    """
+
+    def test_downsample_series(self):
+        """
+        Test that each column is downsampled on its own, leaving its missing values out.
+        """
+        buckets = pd.date_range('2024-01-01', periods=1000, freq='h')
+        df = pd.DataFrame({'bucket': buckets, 'temperature': np.arange(1000, dtype=float),
+                           'humidity': [None] * 990 + [50.0] * 10})
+
+        series = downsample_series(df, ['temperature', 'humidity'], 100)
+
+        self.assertEqual(len(series['temperature']), 100)
+        self.assertEqual(series['temperature'].index[0], buckets[0])
+        self.assertEqual(series['temperature'].index[-1], buckets[-1])
+        self.assertEqual(series['humidity'].tolist(), [50.0] * 10)
+        self.assertEqual(series['humidity'].index[0], buckets[990])
+
+
+class TestTimeseriesQuery(unittest.TestCase):
+    """
+    Database tests for the bucketed time series query, skipped when no database is reachable.
+    """
+
+    def setUp(self):
+        self.conn = connect_or_skip()
+        self.cursor = self.conn.cursor()
+        create_test_schema(self.cursor, 'test_timeseries')
+        self.start = datetime(2024, 1, 1)
+        ensure_partitions(self.cursor, self.start, self.start)
+        self.cursor.execute("INSERT INTO stations (station_id, station_name) VALUES ('A', 'Alpha') RETURNING station_key")
+        station_key = self.cursor.fetchone()[0]
+        # One observation every 10 minutes for 4 days, humidity missing every other hour
+        self.cursor.executemany("INSERT INTO weather_observations VALUES (DEFAULT, %s, %s, %s, 'wmoUnit:degC', %s, 'wmoUnit:km_h-1', %s)", [
+            (station_key, self.start + timedelta(minutes=10 * step), float(step % 17), float(step % 5),
+             None if step // 6 % 2 else 50.0 + step % 3)
+            for step in range(4 * 24 * 6)
+        ])
+        refresh_rollups(self.cursor, [[station_key, '2024-01-01T00:00:00Z', '2024-01-05T00:00:00Z']])
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def timeseries(self, source, bucket):
+        self.cursor.execute(timeseries_query(source), {'station': 'Alpha', 'start': self.start,
+                                                       'end': self.start + timedelta(days=4), 'bucket': bucket})
+        return pd.DataFrame(self.cursor.fetchall(), columns=['bucket', 'temperature', 'wind_speed', 'humidity'])
+
+    def test_sources_agree(self):
+        """
+        Test that buckets aggregated from the raw observations and from either rollup hold the same averages.
+        """
+        raw = self.timeseries('raw', DAY)
+        self.assertEqual(raw['bucket'].tolist(), [self.start + timedelta(days=day) for day in range(4)])
+        for source in ('hourly', 'daily'):
+            pd.testing.assert_frame_equal(self.timeseries(source, DAY), raw, check_exact=False)
+
+    def test_buckets_are_aligned_on_the_epoch(self):
+        """
+        Test that raw buckets start on multiples of their width, with one row per bucket holding observations.
+        """
+        bucket = 7 * 60
+        df = self.timeseries('raw', bucket)
+        epochs = [(self.start + timedelta(minutes=10 * step) - datetime(1970, 1, 1)).total_seconds()
+                  for step in range(4 * 24 * 6)]
+
+        self.assertTrue(all((timestamp - datetime(1970, 1, 1)).total_seconds() % bucket == 0
+                            for timestamp in df['bucket']))
+        self.assertEqual(len(df), len({epoch // bucket for epoch in epochs}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,122 +1,260 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
-from unittest.mock import patch, MagicMock
-from dags.weather_etl_pipeline import fetch_stations, fetch_observations, insert_data
+from datetime import datetime, timedelta
+from unittest.mock import call, patch, MagicMock
+import requests
+from airflow.exceptions import AirflowException
+from dags.weather_etl_pipeline import dag
+from utils.etl_tasks import (archive_history, cleanup_intermediate, fetch_stations, fetch_observations, ingest_shard,
+                             insert_data, manage_partitions, plan_shards, report_shards, stream_observations,
+                             update_rollups)
+from utils.intermediate_store import LocalFileStore
+from utils.records import ObservationRecord, StationRecord
+from utils.watermarks import parse_utc
 from utils.sql_queries_dag import *
 
+def json_response(payload):
+    response = MagicMock()
+    response.content = json.dumps(payload).encode()
+    return response
+
+def station_record(station_id):
+    return StationRecord(station_id, None, None, None, None)
+
 class TestETL(unittest.TestCase):
     """
     Unit tests for the ETL (Extract, Transform, Load) operations in the weather ETL pipeline.
-    This class tests the functions fetch_stations, fetch_observations, and insert_data.
+    This class tests the functions fetch_stations, fetch_observations and insert_data, and the
+    shard tasks built on them.
     """
 
-    @patch('dags.weather_etl_pipeline.requests.get')
-    def test_fetch_stations(self, mock_requests_get):
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.store = LocalFileStore(self.store_dir.name)
+        store_patcher = patch('utils.etl_tasks.get_intermediate_store', return_value=self.store)
+        store_patcher.start()
+        self.addCleanup(store_patcher.stop)
+        self.addCleanup(self.store_dir.cleanup)
+
+    def write_dataset(self, dataset, records):
+        """
+        Writes records to the test intermediate store and returns their manifest.
+        """
+        writer = self.store.open_writer('test_run', dataset)
+        writer.write_all(records)
+        return writer.close()
+
+    @patch('utils.etl_tasks.get_observation_archive')
+    @patch('utils.etl_tasks.drop_partitions_before')
+    @patch('utils.etl_tasks.ensure_partitions')
+    @patch('utils.etl_tasks.db_connection')
+    def test_manage_partitions_retention(self, mock_db_connection, mock_ensure_partitions, mock_drop_partitions_before,
+                                         mock_get_archive):
+        """
+        Test that retention never drops the months a run writes to, only drops archived months
+        and is not applied to backfill runs.
+        """
+        now = datetime.utcnow()
+        manage_partitions(start_date_offset=7, premake_months=1, retention_months=24)
+
+        cutoff = mock_drop_partitions_before.call_args.args[1]
+        self.assertEqual(cutoff, datetime(now.year - 2, now.month, 1))
+        droppable = mock_drop_partitions_before.call_args.kwargs['droppable']
+        with patch('utils.etl_tasks.archive_holds_month', return_value=False) as mock_archive_holds_month:
+            self.assertFalse(droppable('cursor', datetime(2000, 1, 1)))
+        mock_archive_holds_month.assert_called_once_with('cursor', mock_get_archive.return_value, datetime(2000, 1, 1))
+
+        mock_drop_partitions_before.reset_mock()
+        dag_run = MagicMock(conf={'mode': 'backfill', 'start': '2000-01-01T00:00:00Z'})
+        manage_partitions(start_date_offset=7, premake_months=1, retention_months=24, dag_run=dag_run)
+
+        self.assertEqual(mock_ensure_partitions.call_args.args[1], datetime(2000, 1, 1))
+        mock_drop_partitions_before.assert_not_called()
+
+    @patch('utils.etl_tasks.bump_data_version')
+    @patch('utils.station_registry.execute_values', return_value=[('123', 1), ('456', 2)])
+    @patch('utils.etl_tasks.db_connection')
+    @patch('utils.etl_tasks.get_http_cache')
+    @patch('utils.etl_tasks.create_session')
+    def test_fetch_stations(self, mock_create_session, mock_get_http_cache, mock_db_connection, mock_execute_values,
+                            mock_bump_data_version):
         """
         Test the fetch_stations function.
 
-        This test mocks the requests.get method to simulate a successful API call
+        This test mocks the HTTP session to simulate a successful API call
         that returns a list of weather stations. It checks that the function
-        correctly pushes the station data to XCom.
+        upserts the stations into the stations table, bumps the data version since
+        they changed, writes the station data to the intermediate store and pushes
+        its manifest to XCom.
 
-        :param mock_requests_get: Mock object for the requests.get method.
+        :param mock_create_session: Mock object for the create_session function.
+        :param mock_get_http_cache: Mock object for the get_http_cache function.
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        :param mock_execute_values: Mock object for psycopg2's execute_values.
+        :param mock_bump_data_version: Mock object for the bump_data_version function.
         """
-        mock_requests_get.return_value.status_code = 200
-        mock_requests_get.return_value.json.return_value = {
+        mock_session = mock_create_session.return_value
+        mock_session.get.return_value = json_response({
             'features': [
                 {'properties': {'stationIdentifier': '123'}},
                 {'properties': {'stationIdentifier': '456'}}
             ]
-        }
+        })
         
         mock_kwargs = {'ti': MagicMock()}
         fetch_stations(**mock_kwargs)
 
-        mock_kwargs['ti'].xcom_push.assert_called_once_with(key='stations', value=mock_requests_get.return_value.json.return_value['features'])
+        mock_create_session.assert_called_once_with(cache=mock_get_http_cache.return_value)
+        mock_kwargs['ti'].xcom_push.assert_called_once_with(key='stations', value=unittest.mock.ANY)
+        manifest = mock_kwargs['ti'].xcom_push.call_args.kwargs['value']
+        self.assertEqual(manifest['count'], 2)
+        self.assertEqual([StationRecord._make(station) for station in self.store.read(manifest)],
+                         [station_record('123'), station_record('456')])
 
-    @patch('dags.weather_etl_pipeline.requests.get')
-    def test_fetch_observations(self, mock_requests_get):
+        mock_execute_values.assert_called_once()
+        self.assertEqual(mock_execute_values.call_args.args[1], UPSERT_STATIONS_QUERY)
+        self.assertEqual([row[0] for row in mock_execute_values.call_args.args[2]], ['123', '456'])
+        mock_bump_data_version.assert_called_once()
+        mock_db_connection.return_value.__enter__.return_value.commit.assert_called_once()
+
+    @patch('utils.etl_tasks.create_session')
+    def test_fetch_observations(self, mock_create_session):
         """
         Test the fetch_observations function.
 
-        This test mocks the requests.get method to simulate fetching observations
+        This test mocks the pooled HTTP session to simulate fetching observations
         for the stations retrieved in the fetch_stations test. It checks that
-        the correct API call is made and that the function pushes data to XCom.
+        the correct API call is made and that the function returns the manifest of the
+        observations it wrote.
 
-        :param mock_requests_get: Mock object for the requests.get method.
+        :param mock_create_session: Mock object for the create_session function.
         """
-        mock_kwargs = {
-            'ti': MagicMock()
-        }
-        mock_kwargs['ti'].xcom_pull.return_value = [
-            {'properties': {'stationIdentifier': '123'}},
-            {'properties': {'stationIdentifier': '456'}}
-        ]
-
-        mock_requests_get.return_value.status_code = 200
-        mock_requests_get.return_value.json.return_value = {
+        mock_session = mock_create_session.return_value
+        mock_session.get.return_value = json_response({
             'features': [{'properties': {'timestamp': '2024-01-01T00:00:00Z'}}]
-        }
+        })
+
+        manifest, failed_stations = fetch_observations(['123'], ti=MagicMock())
+
+        mock_session.get.assert_called_with('https://api.weather.gov/stations/123/observations', params=unittest.mock.ANY)
+        self.assertEqual(manifest['count'], 1)
+        self.assertEqual(failed_stations, [])
+
+    @patch('utils.etl_tasks.create_session')
+    def test_fetch_observations_collects_failures(self, mock_create_session):
+        """
+        Test that fetch_observations keeps going when a single station fails.
+
+        This test makes the request for one of the two stations raise a timeout and checks
+        that the observations of the other station are still written while the failing
+        station is reported.
+
+        :param mock_create_session: Mock object for the create_session function.
+        """
+        def get(url, params):
+            if '/456/' in url:
+                raise requests.Timeout('timed out')
+            return json_response({'features': [{'properties': {'timestamp': '2024-01-01T00:00:00Z'}}]})
+
+        mock_create_session.return_value.get.side_effect = get
+
+        observations_manifest, failed_stations = fetch_observations(['123', '456'], ti=MagicMock(), max_concurrency=2)
+
+        self.assertEqual(list(self.store.read(observations_manifest)),
+                         [[None, '2024-01-01T00:00:00Z', None, '', None, '', None]])
+        self.assertEqual(failed_stations, [{'station_id': '456', 'error': 'timed out'}])
+
+    @patch('utils.etl_tasks.create_session')
+    def test_fetch_observations_fails_when_every_station_fails(self, mock_create_session):
+        """
+        Test that fetch_observations fails the task when no station could be fetched.
+
+        :param mock_create_session: Mock object for the create_session function.
+        """
+        mock_create_session.return_value.get.side_effect = requests.ConnectionError('refused')
+
+        with self.assertRaises(AirflowException):
+            fetch_observations(['123'], ti=MagicMock())
+
+    @patch('utils.etl_tasks.db_connection')
+    @patch('utils.etl_tasks.create_session')
+    def test_fetch_observations_incremental(self, mock_create_session, mock_db_connection):
+        """
+        Test that fetch_observations in incremental mode starts each station at its
+        high-watermark minus the overlap, and stations without one at the full window.
 
-        fetch_observations(**mock_kwargs)
+        :param mock_create_session: Mock object for the create_session function.
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        """
+        watermark = datetime.utcnow() - timedelta(hours=5)
+        mock_cursor = mock_db_connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchall.return_value = [('123', watermark)]
+        mock_session = mock_create_session.return_value
+        mock_session.get.return_value = json_response({'features': []})
+
+        fetch_observations(['123', '456'], ti=MagicMock(), ingestion_mode='incremental', watermark_overlap_hours=2)
+
+        starts = {call.args[0].split('/')[-2]: parse_utc(call.kwargs['params']['start'])
+                  for call in mock_session.get.call_args_list}
+        self.assertEqual(starts['123'], (watermark - timedelta(hours=2)).replace(microsecond=0))
+        self.assertAlmostEqual(starts['456'], datetime.utcnow() - timedelta(days=7), delta=timedelta(minutes=1))
+
+    @patch('utils.etl_tasks.db_connection')
+    @patch('utils.etl_tasks.create_session')
+    def test_fetch_observations_backfill(self, mock_create_session, mock_db_connection):
+        """
+        Test that a backfill run requests the range of the DAG run conf without reading watermarks.
 
-        mock_requests_get.assert_called_with('https://api.weather.gov/stations/123/observations', params=unittest.mock.ANY)
+        :param mock_create_session: Mock object for the create_session function.
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        """
+        mock_session = mock_create_session.return_value
+        mock_session.get.return_value = json_response({'features': []})
+        dag_run = MagicMock(conf={'mode': 'backfill', 'start': '2024-01-01T00:00:00Z', 'end': '2024-02-01T00:00:00Z'})
 
-        mock_kwargs['ti'].xcom_push.assert_called_once()
+        fetch_observations(['123'], ti=MagicMock(), dag_run=dag_run, ingestion_mode='incremental')
 
+        mock_session.get.assert_called_once_with(
+            'https://api.weather.gov/stations/123/observations',
+            params={'start': '2024-01-01T00:00:00Z', 'end': '2024-02-01T00:00:00Z'}
+        )
+        mock_db_connection.assert_not_called()
 
-    @patch('dags.weather_etl_pipeline.get_db_connection')
-    def test_insert_data(self, mock_get_db_connection):
+    @patch('utils.etl_tasks.db_connection')
+    def test_insert_data(self, mock_db_connection):
         """
         Test the insert_data function.
 
-        This test mocks the database connection to ensure that the data fetched
-        from XCom is inserted correctly into the database. It verifies that
-        the cursor's executemany method is called with the correct arguments.
+        This test mocks the database connection to ensure that the data read
+        from the intermediate store is inserted correctly into the database. It verifies that
+        the station keys are loaded once into the station registry and that the cursor's
+        executemany method is called with the correct arguments.
 
-        :param mock_get_db_connection: Mock object for the get_db_connection function.
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
         """
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_get_db_connection.return_value = mock_conn
-        mock_conn.cursor.return_value = mock_cursor
-
-        observations = [
-            {
-                'properties': {
-                    'station': 'http://example.com/station/123',
-                    'timestamp': '2024-09-28T23:10:51Z',
-                    'temperature': {'value': 20.5, 'unitCode': 'CEL'},
-                    'windSpeed': {'value': 5.0, 'unitCode': 'KMH'},
-                    'humidity': {'value': 50}
-                }
-            }
-        ]
-        
-        stations = [
-            {
-                'properties': {
-                    'stationIdentifier': '123',
-                    'name': 'Sample Station',
-                    'timeZone': 'UTC'
-                },
-                'geometry': {
-                    'coordinates': [-99.1332, 19.4326]
-                }
-            }
-        ]
+        mock_db_connection.return_value.__enter__.return_value = mock_conn
+        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_cursor.fetchall.return_value = [('123', 7)]
 
-        mock_ti = MagicMock()
-        mock_ti.xcom_pull.side_effect = [observations, stations]
+        observations = [ObservationRecord('123', '2024-09-28T23:10:51Z', 20.5, 'CEL', 5.0, 'KMH', 50)]
 
-        insert_data(ti=mock_ti)
+        loaded, touched_ranges = insert_data(self.write_dataset('observations', observations), ti=MagicMock())
 
+        self.assertEqual(loaded, 1)
+        self.assertEqual(touched_ranges, [[7, '2024-09-28T23:10:51Z', '2024-09-28T23:10:51Z']])
         mock_cursor.executemany.assert_called_once()
+        self.assertEqual(mock_cursor.execute.call_args_list, [
+            call(SELECT_STATION_KEYS_QUERY),
+            call(BUMP_DATA_VERSION_QUERY, ('weather_observations',)),
+        ])
         expected_call_args = [(
-            '123',
-            'Sample Station',
-            'UTC',
-            19.4326, 
-            -99.1332, 
+            7,
             '2024-09-28T23:10:51Z',
             20.5,
             'CEL',
@@ -126,6 +264,296 @@ class TestETL(unittest.TestCase):
         )]
         mock_cursor.executemany.assert_called_with(INSERT_OBSERVATION_QUERY, expected_call_args)
 
+    @patch('utils.etl_tasks.db_connection')
+    def test_insert_data_keeps_version_when_nothing_is_inserted(self, mock_db_connection):
+        """
+        Test that the data version is not bumped when every row was already stored.
+
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        """
+        mock_cursor = mock_db_connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchall.return_value = [('123', 7)]
+        mock_cursor.rowcount = 0
+        observations = [ObservationRecord('123', '2024-09-28T23:10:51Z', 20.5, 'CEL', 5.0, 'KMH', 50)]
+
+        loaded, _ = insert_data(self.write_dataset('observations', observations), ti=MagicMock())
+
+        self.assertEqual(loaded, 0)
+        self.assertNotIn(call(BUMP_DATA_VERSION_QUERY, ('weather_observations',)), mock_cursor.execute.call_args_list)
+
+    @patch('utils.etl_tasks.db_connection')
+    def test_insert_data_raises_database_errors(self, mock_db_connection):
+        """
+        Test that insert_data fails, so the shard task is retried, when the load fails.
+
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        """
+        mock_cursor = mock_db_connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        mock_cursor.execute.side_effect = Exception('connection lost')
+
+        with self.assertRaises(Exception):
+            insert_data(self.write_dataset('observations', []), ti=MagicMock())
+
+    @patch('utils.etl_tasks.db_connection')
+    @patch('utils.etl_tasks.create_session')
+    def test_stream_observations(self, mock_create_session, mock_db_connection):
+        """
+        Test that stream_observations loads the pages of every station in committed batches.
+
+        :param mock_create_session: Mock object for the create_session function.
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        """
+        mock_conn = mock_db_connection.return_value.__enter__.return_value
+        mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+        mock_cursor.fetchall.return_value = [('123', 7), ('456', 8)]
+
+        def get(url, params):
+            station_id = url.split('/')[-2]
+            return json_response({'features': [{'properties': {
+                'station': f'https://api.weather.gov/stations/{station_id}', 'timestamp': '2024-01-01T00:00:00Z',
+                'temperature': {'value': 1.234, 'unitCode': 'CEL'}}}]})
+
+        mock_create_session.return_value.get.side_effect = get
+
+        fetched, loaded, failed_stations, touched_ranges, stats = stream_observations(
+            ['123', '456'], ti=MagicMock(), max_concurrency=2, transform_batch_size=1)
+
+        self.assertEqual((fetched, loaded, failed_stations), (2, 2, []))
+        self.assertEqual(sorted(row for call_args in mock_cursor.executemany.call_args_list for row in call_args.args[1]),
+                         [(7, '2024-01-01T00:00:00Z', 1.23, 'CEL', None, '', None),
+                          (8, '2024-01-01T00:00:00Z', 1.23, 'CEL', None, '', None)])
+        self.assertEqual(touched_ranges, [[7, '2024-01-01T00:00:00Z', '2024-01-01T00:00:00Z'],
+                                          [8, '2024-01-01T00:00:00Z', '2024-01-01T00:00:00Z']])
+        # One commit per batch, then one bumping the data version once for the shard
+        self.assertEqual(mock_conn.commit.call_count, 3)
+        self.assertEqual(mock_cursor.execute.call_args_list.count(call(BUMP_DATA_VERSION_QUERY, ('weather_observations',))), 1)
+        self.assertEqual(stats['queues']['batches']['items'], 2)
+
+    def test_plan_shards(self):
+        """
+        Test that plan_shards splits the selected stations into shards of `shard_size`.
+        """
+        mock_ti = MagicMock()
+        mock_ti.xcom_pull.return_value = self.write_dataset('stations', [station_record(str(n)) for n in range(7)])
+
+        op_args = plan_shards(ti=mock_ti, number_of_stations=5, shard_size=2)
+
+        self.assertEqual(op_args, [
+            [{'index': 0, 'station_ids': ['0', '1']}],
+            [{'index': 1, 'station_ids': ['2', '3']}],
+            [{'index': 2, 'station_ids': ['4']}],
+        ])
+        mock_ti.xcom_push.assert_called_once_with(key='shards', value=[shard for shard, in op_args])
+
+    @patch('utils.etl_tasks.insert_data', return_value=(3, [[7, '2024-01-01T00:00:00Z', '2024-01-01T02:00:00Z']]))
+    @patch('utils.etl_tasks.fetch_observations')
+    def test_ingest_shard(self, mock_fetch_observations, mock_insert_data):
+        """
+        Test that ingest_shard fetches the shard's stations into its own dataset, loads them
+        and returns their counts, timings and touched ranges.
+
+        :param mock_fetch_observations: Mock object for the fetch_observations function.
+        :param mock_insert_data: Mock object for the insert_data function.
+        """
+        manifest = {'count': 3, 'chunks': []}
+        mock_fetch_observations.return_value = (manifest, [{'station_id': 'B', 'error': 'timed out'}])
+
+        summary = ingest_shard({'index': 4, 'station_ids': ['A', 'B']}, ti=MagicMock(), load_strategy='copy')
+
+        self.assertEqual(mock_fetch_observations.call_args.args, (['A', 'B'],))
+        self.assertEqual(mock_fetch_observations.call_args.kwargs['dataset'], 'observations-0004')
+        self.assertEqual(mock_insert_data.call_args.args, (manifest,))
+        self.assertEqual(mock_insert_data.call_args.kwargs['load_strategy'], 'copy')
+        self.assertEqual({name: summary[name] for name in ('index', 'stations', 'fetched', 'loaded', 'touched_ranges')},
+                         {'index': 4, 'stations': 2, 'fetched': 3, 'loaded': 3,
+                          'touched_ranges': [[7, '2024-01-01T00:00:00Z', '2024-01-01T02:00:00Z']]})
+        self.assertEqual(summary['failed_stations'], [{'station_id': 'B', 'error': 'timed out'}])
+
+    @patch('utils.etl_tasks.refresh_rollups')
+    @patch('utils.etl_tasks.db_connection')
+    def test_update_rollups_merges_shards(self, mock_db_connection, mock_refresh_rollups):
+        """
+        Test that update_rollups refreshes the touched ranges of every shard that completed.
+
+        :param mock_db_connection: Mock object for the pooled db_connection context manager.
+        :param mock_refresh_rollups: Mock object for the refresh_rollups function.
+        """
+        mock_ti = MagicMock()
+        mock_ti.xcom_pull.return_value = [
+            {'touched_ranges': [[2, '2024-01-01T05:00:00Z', '2024-01-01T06:00:00Z']]},
+            {'touched_ranges': [[1, '2024-01-01T00:00:00Z', '2024-01-01T01:00:00Z']]},
+        ]
+
+        update_rollups(ti=mock_ti)
+
+        mock_ti.xcom_pull.assert_called_once_with(task_ids='ingest_shard')
+        self.assertEqual(mock_refresh_rollups.call_args.args[1], [
+            [1, '2024-01-01T00:00:00Z', '2024-01-01T01:00:00Z'],
+            [2, '2024-01-01T05:00:00Z', '2024-01-01T06:00:00Z'],
+        ])
+
+    def test_report_shards(self):
+        """
+        Test that report_shards totals the shard summaries, reports failed stations and fails
+        the run when a shard did not complete.
+        """
+        shards = [{'index': 0, 'station_ids': ['A']}, {'index': 1, 'station_ids': ['B', 'C']}]
+        summary = {'index': 1, 'stations': 2, 'fetched': 10, 'loaded': 9, 'fetch_seconds': 1.5, 'load_seconds': 0.5,
+                   'failed_stations': [{'station_id': 'C', 'error': 'timed out'}], 'touched_ranges': []}
+        mock_ti = MagicMock()
+        mock_ti.xcom_pull.side_effect = lambda task_ids, key='return_value': shards if key == 'shards' else [summary]
+
+        with self.assertRaises(AirflowException):
+            report_shards(ti=mock_ti)
+        mock_ti.xcom_push.assert_called_once_with(key='failed_stations', value=[{'station_id': 'C', 'error': 'timed out'}])
+
+        shards.pop(0)
+        report = report_shards(ti=mock_ti)
+        self.assertEqual(report['totals'], {'stations': 2, 'fetched': 10, 'loaded': 9, 'failed_stations': 1,
+                                            'fetch_seconds': 1.5, 'load_seconds': 0.5})
+
+    def test_cleanup_intermediate(self):
+        """
+        Test that cleanup_intermediate deletes the datasets of its run and leaves other runs alone.
+        """
+        self.write_dataset('stations', [station_record('A')])
+        other = self.store.open_writer('other_run', 'stations')
+        other.write(station_record('B'))
+        other.close()
+
+        cleanup_intermediate(run_id='test_run')
+
+        self.assertFalse(os.path.exists(self.store.run_path('test_run')))
+        self.assertTrue(os.path.exists(self.store.run_path('other_run')))
+
+    def test_dag_maps_ingestion_over_shards(self):
+        """
+        Test that ingest_shard is mapped over the output of plan_shards and that the final
+        tasks, including the intermediate data cleanup, run once every shard is done.
+        """
+        ingest_shard_task = dag.get_task('ingest_shard')
+
+        self.assertEqual(ingest_shard_task.upstream_task_ids, {'plan_shards'})
+        self.assertIn('op_args', ingest_shard_task.expand_input.value)
+        for task_id in ('update_rollups', 'report_shards', 'cleanup_intermediate'):
+            self.assertEqual(dag.get_task(task_id).upstream_task_ids, {'ingest_shard'})
+            self.assertEqual(dag.get_task(task_id).trigger_rule, 'all_done')
+
+    @patch('utils.etl_tasks.bump_data_version')
+    @patch('utils.etl_tasks.prune_month')
+    @patch('utils.etl_tasks.lock_partition')
+    @patch('utils.etl_tasks.list_partitions')
+    @patch('utils.etl_tasks.get_observation_archive')
+    @patch('utils.etl_tasks.db_connection')
+    def test_archive_history(self, mock_db_connection, mock_get_archive, mock_list_partitions, mock_lock_partition,
+                             mock_prune_month, mock_bump_data_version):
+        """
+        Test that closed months are exported once without pruning, and exported, checked and
+        pruned in one transaction each with pruning.
+        """
+        mock_conn = mock_db_connection.return_value.__enter__.return_value
+        archive = mock_get_archive.return_value
+        now = datetime.utcnow()
+        old, archived, recent = (datetime(now.year - 1, 1, 1), datetime(now.year - 1, 2, 1),
+                                 datetime(now.year, now.month, 1))
+        mock_list_partitions.return_value = {'old': old, 'archived': archived, 'recent': recent}
+        archive.is_archived.side_effect = lambda month: month == archived
+        archive.export_month.return_value = 10
+        archive.count_rows.return_value = 10
+
+        self.assertEqual(archive_history(archive_after_months=3), [f'{old:%Y-%m}'])
+        mock_prune_month.assert_not_called()
+
+        self.assertEqual(archive_history(archive_after_months=3, prune=True), [f'{old:%Y-%m}', f'{archived:%Y-%m}'])
+        self.assertEqual([call.args[1] for call in mock_prune_month.call_args_list], [old, archived])
+        self.assertEqual([call.args[1] for call in mock_lock_partition.call_args_list], [old, archived])
+        self.assertEqual(mock_bump_data_version.call_count, 2)
+        self.assertEqual(mock_conn.commit.call_count, 3)
+
+    @patch('utils.etl_tasks.prune_month')
+    @patch('utils.etl_tasks.lock_partition')
+    @patch('utils.etl_tasks.list_partitions')
+    @patch('utils.etl_tasks.get_observation_archive')
+    @patch('utils.etl_tasks.db_connection')
+    def test_archive_history_keeps_unverified_months(self, mock_db_connection, mock_get_archive, mock_list_partitions,
+                                                     mock_lock_partition, mock_prune_month):
+        """
+        Test that a month is not pruned when the archive holds fewer rows than were exported.
+        """
+        mock_conn = mock_db_connection.return_value.__enter__.return_value
+        mock_list_partitions.return_value = {'old': datetime(2000, 1, 1)}
+        mock_get_archive.return_value.export_month.return_value = 10
+        mock_get_archive.return_value.count_rows.return_value = 9
+
+        with self.assertRaises(AirflowException):
+            archive_history(archive_after_months=3, prune=True)
+        mock_prune_month.assert_not_called()
+        mock_conn.rollback.assert_called_once()
+        mock_conn.commit.assert_not_called()
+
+    def test_dag_archives_after_rollups(self):
+        """
+        Test that archive_history runs after the rollup refresh.
+        """
+        self.assertEqual(dag.get_task('archive_history').upstream_task_ids, {'update_rollups'})
+
+class TestDAGParse(unittest.TestCase):
+    """
+    Tests of what parsing the DAG file costs the scheduler.
+    """
+
+    # Modules only the tasks need; parsing the DAG must not import them
+    TASK_MODULES = ('psycopg2', 'pandas', 'pyarrow', 'numpy', 'orjson', 'utils.etl_tasks', 'utils.shared')
+
+    def test_parse_imports_no_task_modules(self):
+        """
+        Test that importing the DAG file in a fresh interpreter leaves the task code and its
+        dependencies unimported.
+        """
+        script = (f"import json, sys; import dags.weather_etl_pipeline; "
+                  f"print(json.dumps([m for m in {self.TASK_MODULES!r} if m in sys.modules]))")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True)
+
+        self.assertEqual(json.loads(output.stdout.strip().splitlines()[-1]), [])
+
+    def test_dag_is_deterministic(self):
+        """
+        Test that the DAG has a fixed start date and does not catch up on the runs before it.
+        """
+        for task in dag.tasks:
+            self.assertEqual(task.start_date.replace(tzinfo=None), datetime(2024, 1, 1))
+        self.assertFalse(dag.catchup)
+
+    def test_settings_render_from_variables(self):
+        """
+        Test that settings render as native values, from an Airflow Variable when set and from
+        utils.config otherwise.
+        """
+        variables = {'weather_number_of_stations': '25'}
+        value = MagicMock()
+        value.get.side_effect = lambda key, default=None: variables.get(key, default)
+        op_kwargs = dag.get_task('plan_shards').op_kwargs
+        env = dag.get_template_env()
+
+        rendered = {key: env.from_string(template).render(var=MagicMock(value=value))
+                    for key, template in op_kwargs.items()}
+
+        self.assertEqual(rendered, {'number_of_stations': 25, 'shard_size': 50})
+        self.assertIs(env.from_string(dag.get_task('archive_history').op_kwargs['prune']).render(
+            var=MagicMock(value=value)), False)
+
+    @patch('utils.etl_tasks.report_shards', return_value={'totals': {}})
+    def test_task_callables_run_the_task_code(self, mock_report_shards):
+        """
+        Test that the DAG's callables run the function of the same name in utils.etl_tasks.
+        """
+        python_callable = dag.get_task('report_shards').python_callable
+
+        self.assertEqual(python_callable(ti='ti'), {'totals': {}})
+        self.assertEqual(python_callable.__name__, 'report_shards')
+        mock_report_shards.assert_called_once_with(ti='ti')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+import unittest
+from utils.api_client import create_session, iter_features
+from utils.http_cache import HTTPCache
+from tests.fake_weather_api import FakeWeatherAPI
+
+class TestHTTPCache(unittest.TestCase):
+    """
+    Unit tests for the on-disk HTTP cache.
+    This class reads the station catalogue of a local fake API that supports conditional requests.
+    """
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.api = FakeWeatherAPI(number_of_stations=50, page_size=20, validators=True).start()
+
+    def tearDown(self):
+        self.api.stop()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def read_catalogue(self, cache):
+        session = create_session(cache=cache)
+        try:
+            return [feature['properties']['stationIdentifier']
+                    for feature in iter_features(session, self.api.stations_endpoint)]
+        finally:
+            session.close()
+
+    def test_unchanged_catalogue_is_revalidated(self):
+        """
+        Test that a later run only receives `304 Not Modified` responses for an unchanged catalogue
+        and serves the pages from the cache.
+
+        The fake API serves 50 stations in pages of 20, so 3 pages of data plus the final empty page.
+        """
+        first = self.read_catalogue(HTTPCache(self.path))
+        self.assertEqual(self.api.full_response_count, 4)
+
+        second = self.read_catalogue(HTTPCache(self.path))
+
+        self.assertEqual(second, first)
+        self.assertEqual(second, self.api.station_ids())
+        self.assertEqual(self.api.full_response_count, 4)
+        self.assertEqual(self.api.not_modified_count, 4)
+
+    def test_changed_pages_are_downloaded_again(self):
+        """
+        Test that only the pages whose content changed are sent in full again.
+        """
+        self.read_catalogue(HTTPCache(self.path))
+        self.api.number_of_stations = 55
+
+        stations = self.read_catalogue(HTTPCache(self.path))
+
+        self.assertEqual(stations, self.api.station_ids())
+        # The last page of data grows and a new trailing empty page appears
+        self.assertEqual(self.api.full_response_count, 6)
+        self.assertEqual(self.api.not_modified_count, 2)
+
+    def test_if_modified_since(self):
+        """
+        Test that the Last-Modified validator is sent back when the server did not send an ETag.
+        """
+        cache = HTTPCache(self.path)
+        self.read_catalogue(cache)
+        url = self.api.stations_endpoint
+        meta, _ = cache.lookup(url)
+        del meta['headers']['ETag']
+        cache.touch(url, meta, validated=False)
+
+        session = create_session(cache=cache)
+        response = session.get(url)
+        session.close()
+
+        self.assertTrue(response.from_cache)
+        self.assertEqual(self.api.not_modified_count, 1)
+
+    def test_fresh_entries_skip_the_server(self):
+        """
+        Test that entries validated less than `max_age` seconds ago are served without any request.
+        """
+        self.read_catalogue(HTTPCache(self.path, max_age=3600))
+        requests_sent = self.api.request_count
+
+        stations = self.read_catalogue(HTTPCache(self.path, max_age=3600))
+
+        self.assertEqual(stations, self.api.station_ids())
+        self.assertEqual(self.api.request_count, requests_sent)
+
+    def test_size_based_eviction(self):
+        """
+        Test that the least recently used entries are evicted once the cache exceeds `max_size`.
+        """
+        clock = iter(range(1000))
+        cache = HTTPCache(self.path, max_size=10000, clock=lambda: next(clock))
+        self.read_catalogue(cache)
+
+        self.assertLessEqual(cache.size(), 10000)
+        # Pages of 20 stations take about 4 KB each, so only the two most recent pages fit
+        self.assertIsNone(cache.lookup(self.api.stations_endpoint))
+        self.assertIsNotNone(cache.lookup(f'{self.api.stations_endpoint}?cursor=50'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from utils.intermediate_store import IntermediateStore, LocalFileStore, get_intermediate_store
+
+class TestLocalFileStore(unittest.TestCase):
+    """
+    Unit tests for the local filesystem intermediate store.
+    """
+
+    def setUp(self):
+        self.store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.store_dir.cleanup)
+        self.store = LocalFileStore(self.store_dir.name)
+
+    def test_round_trip_across_chunks(self):
+        """
+        Test that records written over several chunks are read back in order and that
+        the manifest lists every chunk.
+        """
+        records = [{'id': index, 'value': index * 1.5} for index in range(25)]
+        writer = self.store.open_writer('scheduled__2024-01-01T00:00:00+00:00', 'observations', chunk_size=10)
+        writer.write_all(records)
+        manifest = writer.close()
+
+        self.assertEqual(manifest['count'], 25)
+        self.assertEqual(len(manifest['chunks']), 3)
+        self.assertTrue(all(path.endswith('.ndjson.gz') and os.path.exists(path) for path in manifest['chunks']))
+        self.assertEqual(list(self.store.read(manifest)), records)
+
+    def test_concurrent_writes(self):
+        """
+        Test that writes from several threads all end up in the dataset.
+        """
+        writer = self.store.open_writer('run', 'observations', chunk_size=7)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda start: writer.write_all({'id': start + i} for i in range(50)), range(0, 400, 50)))
+        manifest = writer.close()
+
+        self.assertEqual(sorted(record['id'] for record in self.store.read(manifest)), list(range(400)))
+
+    def test_reopening_a_dataset_replaces_it(self):
+        """
+        Test that a retried task does not pick up the chunks of a previous attempt.
+        """
+        first = self.store.open_writer('run', 'stations', chunk_size=1)
+        first.write_all([{'id': 1}, {'id': 2}])
+        first.close()
+
+        second = self.store.open_writer('run', 'stations', chunk_size=1)
+        second.write({'id': 3})
+        manifest = second.close()
+
+        self.assertEqual(list(self.store.read(manifest)), [{'id': 3}])
+        self.assertEqual(os.listdir(os.path.dirname(manifest['chunks'][0])), ['part-00000.ndjson.gz'])
+
+    def test_delete_run(self):
+        """
+        Test that delete_run removes every dataset of the run.
+        """
+        writer = self.store.open_writer('run', 'stations')
+        writer.write({'id': 1})
+        writer.close()
+
+        self.store.delete_run('run')
+
+        self.assertFalse(os.path.exists(self.store.run_path('run')))
+
+    def test_stores_implement_every_operation(self):
+        """
+        Test that the base class cannot be instantiated, so backends must implement every operation.
+        """
+        with self.assertRaises(TypeError):
+            IntermediateStore()
+
+    def test_unknown_backend(self):
+        """
+        Test that an unknown backend name is rejected.
+        """
+        with self.assertRaises(ValueError):
+            get_intermediate_store('s3')
+
+
+if __name__ == '__main__':
+    unittest.main()
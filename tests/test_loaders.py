@@ -0,0 +1,152 @@
+import unittest
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+from utils.loaders import CsvRowStream, load_observations
+from utils.partitions import ensure_partitions
+from utils.sql_queries_dag import *
+from tests.database import connect_or_skip, create_test_schema
+
+ROWS = [
+    (1, '2024-09-28T23:10:51Z', 20.5, 'CEL', 5.0, 'KMH', 50),
+    (2, '2024-09-28T23:20:51Z', None, 'unit, "quoted"', None, '', None),
+    (3, '2024-09-28T23:30:51Z', -1.25, 'CEL', 0.0, 'KMH', 99.5),
+]
+
+class TestLoaders(unittest.TestCase):
+    """
+    Unit tests for the observation load strategies in utils.loaders.
+    """
+
+    def test_executemany_batches(self):
+        """
+        Test that the executemany strategy sends the rows in batches of `batch_size`.
+        """
+        cursor = MagicMock()
+
+        count = load_observations(cursor, iter(ROWS), strategy='executemany', batch_size=2)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(cursor.executemany.call_args_list, [
+            unittest.mock.call(INSERT_OBSERVATION_QUERY, ROWS[:2]),
+            unittest.mock.call(INSERT_OBSERVATION_QUERY, ROWS[2:]),
+        ])
+
+    @patch('utils.loaders.execute_values')
+    def test_execute_values_batches(self, mock_execute_values):
+        """
+        Test that the execute_values strategy sends one multi-row INSERT per batch.
+
+        :param mock_execute_values: Mock object for psycopg2's execute_values.
+        """
+        cursor = MagicMock()
+
+        count = load_observations(cursor, iter(ROWS), strategy='execute_values', batch_size=2)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(mock_execute_values.call_args_list, [
+            unittest.mock.call(cursor, INSERT_OBSERVATION_VALUES_QUERY, ROWS[:2], page_size=2),
+            unittest.mock.call(cursor, INSERT_OBSERVATION_VALUES_QUERY, ROWS[2:], page_size=2),
+        ])
+
+    def test_copy_stages_and_merges(self):
+        """
+        Test that the copy strategy creates the staging table, streams every row
+        through COPY and merges the staging table in a single statement.
+        """
+        cursor = MagicMock()
+        copied = []
+        cursor.copy_expert.side_effect = lambda query, stream, size: copied.append(stream.read())
+
+        count = load_observations(cursor, iter(ROWS), strategy='copy')
+
+        self.assertEqual(count, 3)
+        self.assertEqual(cursor.execute.call_args_list, [
+            unittest.mock.call(CREATE_OBSERVATION_STAGING_QUERY),
+            unittest.mock.call(MERGE_OBSERVATION_STAGING_QUERY),
+        ])
+        self.assertEqual(cursor.copy_expert.call_args.args[0], COPY_OBSERVATION_STAGING_QUERY)
+        self.assertEqual(copied[0].splitlines(), [
+            '1,2024-09-28T23:10:51Z,20.5,CEL,5.0,KMH,50',
+            '2,2024-09-28T23:20:51Z,\\N,"unit, ""quoted""",\\N,,\\N',
+            '3,2024-09-28T23:30:51Z,-1.25,CEL,0.0,KMH,99.5',
+        ])
+
+    def test_returns_rows_inserted(self):
+        """
+        Test that every strategy returns the rows the database inserted, not the rows sent.
+        """
+        for strategy in ('executemany', 'execute_values', 'copy'):
+            cursor = MagicMock()
+            cursor.rowcount = 1
+            with patch('utils.loaders.execute_values'):
+                count = load_observations(cursor, iter(ROWS), strategy=strategy, batch_size=2)
+
+            self.assertEqual(count, 1 if strategy == 'copy' else 2, strategy)
+
+    def test_csv_row_stream_small_reads(self):
+        """
+        Test that reading the CSV stream in small pieces yields the same text as a single read.
+        """
+        expected = CsvRowStream(ROWS).read()
+        stream = CsvRowStream(iter(ROWS))
+
+        pieces = []
+        while True:
+            piece = stream.read(7)
+            if not piece:
+                break
+            self.assertLessEqual(len(piece), 7)
+            pieces.append(piece)
+
+        self.assertEqual(''.join(pieces), expected)
+        self.assertEqual(stream.count, 3)
+
+    def test_unknown_strategy(self):
+        """
+        Test that an unknown load strategy is rejected.
+        """
+        with self.assertRaises(ValueError):
+            load_observations(MagicMock(), ROWS, strategy='bulk')
+
+
+class TestLoadStrategiesDatabase(unittest.TestCase):
+    """
+    Database tests comparing what each load strategy stores, skipped when no database is reachable.
+    """
+
+    def setUp(self):
+        self.conn = connect_or_skip()
+        self.cursor = self.conn.cursor()
+        create_test_schema(self.cursor, 'test_loaders')
+        ensure_partitions(self.cursor, datetime(2024, 9, 1), datetime(2024, 9, 30))
+        self.cursor.execute("INSERT INTO stations (station_id) SELECT 'S' || n FROM generate_series(1, 3) n")
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def test_strategies_store_identical_rows(self):
+        """
+        Test that every strategy stores the same values, keeping empty strings apart from NULLs,
+        and returns the number of rows inserted.
+        """
+        stored = {}
+        for strategy in ('executemany', 'execute_values', 'copy'):
+            self.cursor.execute("SAVEPOINT load")
+            self.assertEqual(load_observations(self.cursor, ROWS, strategy=strategy), 3)
+            # Rows already stored are skipped and not counted, so nothing reports a change
+            self.assertEqual(load_observations(self.cursor, ROWS, strategy=strategy, batch_size=2), 0)
+            self.cursor.execute("SELECT station_key, observation_timestamp, temperature, temperature_unit_code, "
+                                "wind_speed, wind_speed_unit_code, humidity FROM weather_observations "
+                                "ORDER BY station_key")
+            stored[strategy] = self.cursor.fetchall()
+            self.cursor.execute("ROLLBACK TO SAVEPOINT load")
+
+        self.assertEqual(len(stored['executemany']), 3)
+        self.assertEqual(stored['copy'], stored['executemany'])
+        self.assertEqual(stored['execute_values'], stored['executemany'])
+        self.assertEqual(stored['copy'][1][3:6], ('unit, "quoted"', None, ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
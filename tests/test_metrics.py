@@ -0,0 +1,238 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+from utils.loaders import load_observations
+from utils.metrics import (HTTP_REQUEST_SECONDS, QUERY_SECONDS, ROWS, STAGE_SECONDS, MetricsRegistry, endpoint, metrics,
+                           task_metrics, timed, timed_query)
+from utils.resilience import ResilientSession, TokenBucket
+from tests.fake_weather_api import FakeWeatherAPI
+
+class MetricsTestCase(unittest.TestCase):
+    """
+    Enables the process-wide metrics for the duration of a test, starting from empty values.
+    """
+
+    def setUp(self):
+        metrics.clear()
+        metrics.enabled = True
+        self.addCleanup(setattr, metrics, 'enabled', False)
+        self.addCleanup(metrics.clear)
+
+class TestMetricsRegistry(unittest.TestCase):
+    """
+    Unit tests for the metrics registry and its Prometheus text exposition.
+    """
+
+    def test_render_counters_and_histograms(self):
+        """
+        Test that counters and histograms are rendered with cumulative buckets, sum, count and
+        escaped labels, and that metrics without values are left out.
+        """
+        registry = MetricsRegistry(enabled=True)
+        rows = registry.counter('rows_total', 'Rows.', ('outcome',))
+        latency = registry.histogram('latency_seconds', 'Latency.', ('endpoint',), buckets=(0.1, 1.0))
+        registry.counter('unused_total', 'Never incremented.')
+        rows.inc(3, outcome='inserted')
+        rows.inc(outcome='inserted')
+        latency.observe(0.05, endpoint='/a"b')
+        latency.observe(0.5, endpoint='/a"b')
+        latency.observe(5, endpoint='/a"b')
+
+        self.assertEqual(registry.render({'task': 'fetch'}), '\n'.join([
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{task="fetch",endpoint="/a\\"b",le="0.1"} 1',
+            'latency_seconds_bucket{task="fetch",endpoint="/a\\"b",le="1.0"} 2',
+            'latency_seconds_bucket{task="fetch",endpoint="/a\\"b",le="+Inf"} 3',
+            'latency_seconds_sum{task="fetch",endpoint="/a\\"b"} 5.55',
+            'latency_seconds_count{task="fetch",endpoint="/a\\"b"} 3',
+            '# HELP rows_total Rows.',
+            '# TYPE rows_total counter',
+            'rows_total{task="fetch",outcome="inserted"} 4',
+        ]) + '\n')
+
+    def test_disabled_registry_records_nothing(self):
+        """
+        Test that nothing is recorded while the registry is disabled and timers are a shared no-op.
+        """
+        registry = MetricsRegistry(enabled=False)
+        rows = registry.counter('rows_total', 'Rows.')
+        latency = registry.histogram('latency_seconds', 'Latency.')
+
+        rows.inc(5)
+        latency.observe(1.0)
+        with latency.time() as timer:
+            pass
+
+        self.assertIs(timer, latency.time())
+        self.assertEqual(registry.render(), '')
+
+    def test_write_textfile(self):
+        """
+        Test that the textfile holds the rendered metrics and no temporary file is left behind.
+        """
+        registry = MetricsRegistry(enabled=True)
+        registry.counter('rows_total', 'Rows.').inc(2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics', 'app.prom')
+
+            registry.write_textfile(path, {'task': 'app'})
+
+            with open(path) as textfile:
+                self.assertEqual(textfile.read(), registry.render({'task': 'app'}))
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['app.prom'])
+
+    def test_metric_names_are_unique_per_type(self):
+        """
+        Test that a name registered again returns the same metric, unless it is of another type.
+        """
+        registry = MetricsRegistry()
+
+        self.assertIs(registry.counter('rows_total', 'Rows.'), registry.counter('rows_total', 'Rows.'))
+        with self.assertRaises(ValueError):
+            registry.histogram('rows_total', 'Rows.')
+
+    def test_endpoint(self):
+        """
+        Test that station identifiers and query strings are removed from endpoint labels.
+        """
+        self.assertEqual(endpoint('https://api.weather.gov/stations/KJFK/observations?start=2024'),
+                         '/stations/{station_id}/observations')
+        self.assertEqual(endpoint('https://api.weather.gov/stations?cursor=abc'), '/stations')
+
+class TestInstrumentation(MetricsTestCase):
+    """
+    Unit tests for the metrics recorded by the instrumented pipeline and app code.
+    """
+
+    def test_timed_stages_and_tasks(self):
+        """
+        Test that timed functions and task callables record their wall time, and that tasks
+        export the metrics of their process to a textfile labelled with the task instance.
+        """
+        @timed('inner')
+        def inner():
+            time.sleep(0.01)
+
+        @task_metrics
+        def outer(**kwargs):
+            inner()
+            return 'done'
+
+        with tempfile.TemporaryDirectory() as directory, patch('utils.metrics.METRICS_TEXTFILE_DIR', directory):
+            ti = MagicMock(task_id='ingest_shard', map_index=2)
+            self.assertEqual(outer(ti=ti), 'done')
+
+            with open(os.path.join(directory, 'weather_pipeline_ingest_shard_2.prom')) as textfile:
+                exported = textfile.read()
+        self.assertEqual(STAGE_SECONDS.count(stage='inner'), 1)
+        self.assertEqual(STAGE_SECONDS.count(stage='outer'), 1)
+        self.assertIn('weather_stage_duration_seconds_count{map_index="2",task="ingest_shard",stage="outer"} 1',
+                      exported)
+
+    def test_http_latency_per_endpoint(self):
+        """
+        Test that every request attempt is timed under its endpoint and status.
+        """
+        api = FakeWeatherAPI(number_of_stations=2, observations_per_station=5).start()
+        self.addCleanup(api.stop)
+        api.faults.append(503)
+        session = ResilientSession(rate_limiter=TokenBucket(1000, burst=100), backoff_base=0.01)
+
+        session.get(f'{api.stations_endpoint}/ST0001/observations').raise_for_status()
+
+        self.assertEqual(HTTP_REQUEST_SECONDS.count(endpoint='/stations/{station_id}/observations', status=503), 1)
+        self.assertEqual(HTTP_REQUEST_SECONDS.count(endpoint='/stations/{station_id}/observations', status=200), 1)
+
+    def test_rows_inserted_and_skipped(self):
+        """
+        Test that loaders count the rows ON CONFLICT skipped apart from those inserted.
+        """
+        cursor = MagicMock()
+        cursor.rowcount = 3
+
+        load_observations(cursor, [(1, '2024-01-01T00:00:00Z', 1.0, 'c', 1.0, 'k', 1.0)] * 5,
+                          strategy='executemany', batch_size=5)
+
+        self.assertEqual((ROWS.value(outcome='inserted'), ROWS.value(outcome='skipped')), (3, 2))
+
+    def test_slow_query_log(self):
+        """
+        Test that queries are timed and only those over the threshold are logged.
+        """
+        with self.assertLogs('utils.metrics', level='WARNING') as logs:
+            with timed_query('fast', slow_seconds=10):
+                pass
+            with timed_query('slow', ('Alpha',), slow_seconds=0.0):
+                pass
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("Slow query slow", logs.output[0])
+        self.assertIn("'Alpha'", logs.output[0])
+        self.assertEqual(QUERY_SECONDS.count(query='fast'), 1)
+
+class TestSlowQueryLogWhileDisabled(unittest.TestCase):
+    """
+    Checks that slow queries are logged whether metrics are enabled or not.
+    """
+
+    def test_slow_query_log_while_disabled(self):
+        """
+        Test that a slow query is logged, and not recorded, while metrics are disabled.
+        """
+        with patch.object(metrics, 'enabled', False), self.assertLogs('utils.metrics', level='WARNING') as logs:
+            with timed_query('slow', slow_seconds=0.0):
+                pass
+
+        self.assertIn("Slow query slow", logs.output[0])
+        self.assertEqual(QUERY_SECONDS.count(query='slow'), 0)
+
+class TestDisabledOverhead(unittest.TestCase):
+    """
+    Checks that instrumentation costs next to nothing while metrics are disabled.
+    """
+
+    CALLS = 100000
+
+    def best_of(self, run, repeat=5):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def test_disabled_overhead(self):
+        """
+        Test that, while disabled, a counter increment and a timed block each cost about as much
+        as calling an empty function with the same arguments.
+        """
+        registry = MetricsRegistry(enabled=False)
+        rows = registry.counter('rows_total', 'Rows.', ('outcome',))
+        stage_seconds = registry.histogram('stage_seconds', 'Stage durations.', ('stage',))
+
+        def empty(amount=1, **labels):
+            pass
+
+        def baseline():
+            for _ in range(self.CALLS):
+                empty(1, outcome='inserted')
+                empty(stage='load')
+
+        def instrumented():
+            for _ in range(self.CALLS):
+                rows.inc(1, outcome='inserted')
+                with stage_seconds.time(stage='load'):
+                    pass
+
+        baseline_seconds = self.best_of(baseline)
+        instrumented_seconds = self.best_of(instrumented)
+
+        self.assertLess(instrumented_seconds, 4 * baseline_seconds)
+        self.assertEqual(registry.render(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
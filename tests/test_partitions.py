@@ -0,0 +1,184 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from utils.partitions import add_months, drop_partitions_before, ensure_partitions, partition_months, partition_name
+from utils.rollups import refresh_rollups
+from utils.sql_queries_app import *
+from utils.sql_queries_dag import *
+from tests.database import connect_or_skip, create_test_schema
+
+SEED_QUERY = """
+INSERT INTO stations (station_id, station_name, station_timezone, latitude, longitude)
+SELECT 'T' || n, 'Test Station ' || n, 'UTC', 30 + n / 100.0, -100 - n / 100.0
+FROM generate_series(1, 200) n;
+
+INSERT INTO weather_observations (station_key, observation_timestamp, temperature, temperature_unit_code,
+                                  wind_speed, wind_speed_unit_code, humidity)
+SELECT s.station_key, ts, 15 + random() * 10, 'wmoUnit:degC', random() * 30, 'wmoUnit:km_h-1', random() * 100
+FROM stations s
+CROSS JOIN generate_series(date_trunc('hour', LOCALTIMESTAMP) - INTERVAL '150 days', LOCALTIMESTAMP, INTERVAL '1 hour') ts;
+
+ANALYZE;
+"""
+
+def partition_cursor(existing):
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [(name,) for name in existing]
+    return cursor
+
+class TestPartitions(unittest.TestCase):
+    """
+    Unit tests for the monthly partition management helpers.
+    """
+
+    def test_month_arithmetic(self):
+        """
+        Test month arithmetic across year boundaries and partition naming.
+        """
+        self.assertEqual(add_months(datetime(2024, 11, 15, 8), 2), datetime(2025, 1, 1))
+        self.assertEqual(add_months(datetime(2024, 1, 31), -1), datetime(2023, 12, 1))
+        self.assertEqual(partition_months(datetime(2024, 11, 30), datetime(2025, 1, 1)),
+                         [datetime(2024, 11, 1), datetime(2024, 12, 1), datetime(2025, 1, 1)])
+        self.assertEqual(partition_name(datetime(2024, 3, 1)), 'weather_observations_y2024m03')
+
+    def test_ensure_partitions_creates_missing_months(self):
+        """
+        Test that only the months without a partition are created, with monthly bounds.
+        """
+        cursor = partition_cursor(['weather_observations_y2024m12'])
+
+        created = ensure_partitions(cursor, datetime(2024, 11, 20), datetime(2025, 1, 5))
+
+        self.assertEqual(created, ['weather_observations_y2024m11', 'weather_observations_y2025m01'])
+        create_calls = cursor.execute.call_args_list[1:]
+        self.assertEqual([call.args[1] for call in create_calls], [
+            (datetime(2024, 11, 1), datetime(2024, 12, 1)),
+            (datetime(2025, 1, 1), datetime(2025, 2, 1)),
+        ])
+
+    def test_drop_partitions_before(self):
+        """
+        Test that only partitions whose whole month lies before the cutoff are dropped, with
+        their hourly and daily rollup buckets, and that tables not following the partition
+        naming are left alone.
+        """
+        cursor = partition_cursor([
+            'weather_observations_y2024m02',
+            'weather_observations_y2024m01',
+            'weather_observations_y2024m03',
+            'weather_observations_legacy',
+        ])
+
+        dropped = drop_partitions_before(cursor, datetime(2024, 3, 1))
+
+        self.assertEqual(dropped, ['weather_observations_y2024m01', 'weather_observations_y2024m02'])
+        # The partition list, then a drop and two rollup deletes per month
+        self.assertEqual(cursor.execute.call_count, 7)
+        self.assertEqual([call.args[1] for call in cursor.execute.call_args_list if len(call.args) > 1][1:], [
+            (datetime(2024, 1, 1), datetime(2024, 2, 1)), (datetime(2024, 1, 1), datetime(2024, 2, 1)),
+            (datetime(2024, 2, 1), datetime(2024, 3, 1)), (datetime(2024, 2, 1), datetime(2024, 3, 1)),
+        ])
+
+    def test_drop_partitions_before_keeps_partitions_not_droppable(self):
+        """
+        Test that expired partitions are kept when `droppable` refuses them.
+        """
+        cursor = partition_cursor(['weather_observations_y2024m01', 'weather_observations_y2024m02'])
+
+        dropped = drop_partitions_before(cursor, datetime(2024, 3, 1),
+                                         droppable=lambda cursor, month: month == datetime(2024, 2, 1))
+
+        self.assertEqual(dropped, ['weather_observations_y2024m02'])
+        self.assertEqual(cursor.execute.call_count, 4)
+
+
+class TestAppQueryPlans(unittest.TestCase):
+    """
+    EXPLAIN-based tests proving that the app queries read the rollups through an index and
+    that the rollup refresh prunes the partitions of weather_observations.
+
+    They run against the database configured through the DATABASE_* variables, inside a
+    throwaway schema that is rolled back afterwards, and are skipped when none is reachable.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = connect_or_skip()
+        cursor = cls.conn.cursor()
+        create_test_schema(cursor, 'test_partitions')
+        now = datetime.utcnow()
+        cls.partitions = ensure_partitions(cursor, add_months(now, -6), add_months(now, 2))
+        cursor.execute(SEED_QUERY)
+        cursor.execute("SELECT station_key FROM stations")
+        since = (now - timedelta(days=15)).isoformat()
+        refresh_rollups(cursor, [[station_key, since, now.isoformat()] for (station_key,) in cursor.fetchall()])
+        cursor.execute("ANALYZE")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.rollback()
+        cls.conn.close()
+
+    def scans(self, query, params):
+        """
+        Returns the (node type, relation, loops) of every scan of the plan of `query`.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", params)
+        plan = cursor.fetchone()[0][0]['Plan']
+        scans = []
+        nodes = [plan]
+        while nodes:
+            node = nodes.pop()
+            if 'Relation Name' in node:
+                scans.append((node['Node Type'], node['Relation Name'], node['Actual Loops']))
+            nodes.extend(node.get('Plans', []))
+        return scans
+
+    def assert_rollup_index_scan(self, scans, rollup):
+        """
+        Asserts that `rollup` is read through an index and that no raw observations are scanned.
+        """
+        self.assertIn(rollup, [relation for _, relation, _ in scans])
+        for node_type, relation, _ in scans:
+            self.assertFalse(relation.startswith('weather_observations_y'), relation)
+            if relation == rollup:
+                self.assertIn(node_type, ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'), relation)
+
+    def test_average_temperature_query_plan(self):
+        """
+        Test that the average temperature query reads the daily rollup through an index.
+        """
+        self.assert_rollup_index_scan(self.scans(average_temperature_query(), ('Test Station 7',)),
+                                      'weather_observations_daily')
+
+    def test_max_wind_speed_change_query_plan(self):
+        """
+        Test that the max wind speed change query reads the hourly rollup through an index.
+        """
+        self.assert_rollup_index_scan(self.scans(max_wind_speed_change_query(), ('Test Station 7',)),
+                                      'weather_observations_hourly')
+
+    def test_refresh_rollup_query_plan(self):
+        """
+        Test that refreshing a recent range only executes scans of the partitions holding it,
+        through an index.
+        """
+        now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        start = now - timedelta(hours=1)
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT station_key FROM stations WHERE station_id = 'T7'")
+        station_key = cursor.fetchone()[0]
+
+        scans = self.scans(REFRESH_HOURLY_ROLLUP_QUERY, ([station_key], [start], [now]))
+
+        executed = [(node_type, relation) for node_type, relation, loops in scans
+                    if relation.startswith('weather_observations_y') and loops]
+        self.assertTrue(executed)
+        for node_type, relation in executed:
+            self.assertGreaterEqual(relation, partition_name(start - timedelta(days=1)))
+            self.assertIn(node_type, ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'), relation)
+
+
+if __name__ == '__main__':
+    unittest.main()
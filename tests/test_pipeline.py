@@ -0,0 +1,123 @@
+import threading
+import time
+import unittest
+from utils.pipeline import MeteredQueue, run_pipeline
+
+def batches_of(size):
+    """
+    Returns a transform grouping records into lists of `size`.
+    """
+    def transform(records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    return transform
+
+def fetch_pages(pages, page_size=10):
+    """
+    Returns a fetch function emitting `pages` pages of `page_size` (item, n) records per item.
+    """
+    def fetch(item, emit):
+        for page in range(pages):
+            emit([(item, page * page_size + n) for n in range(page_size)])
+        return pages * page_size
+    return fetch
+
+class TestPipeline(unittest.TestCase):
+    """
+    Unit tests for the bounded-queue fetch/transform/load pipeline.
+    """
+
+    def test_every_record_is_loaded(self):
+        """
+        Test that every fetched record reaches the loader in batches and per-item counts are returned.
+        """
+        loaded = []
+
+        results, failures, stats = run_pipeline(fetch_pages(5), ['A', 'B', 'C'], batches_of(7), loaded.append,
+                                                max_concurrency=2)
+
+        self.assertEqual(sorted(results), [('A', 50), ('B', 50), ('C', 50)])
+        self.assertEqual(failures, [])
+        self.assertEqual(sorted(record for batch in loaded for record in batch),
+                         sorted((item, n) for item in 'ABC' for n in range(50)))
+        self.assertEqual(stats['queues']['pages']['items'], 15)
+        self.assertEqual(stats['queues']['batches']['items'], len(loaded))
+
+    def test_backpressure_bounds_queues(self):
+        """
+        Test that a slow loader blocks the producers instead of letting pages pile up.
+        """
+        def load(batch):
+            time.sleep(0.01)
+
+        _, _, stats = run_pipeline(fetch_pages(20), ['A', 'B', 'C', 'D'], batches_of(10), load, max_concurrency=4,
+                                   page_queue_size=3, batch_queue_size=1)
+
+        self.assertLessEqual(stats['queues']['pages']['max_depth'], 3)
+        self.assertLessEqual(stats['queues']['batches']['max_depth'], 1)
+        self.assertGreater(stats['stages']['fetch']['blocked_seconds'], 0)
+        self.assertGreater(stats['stages']['load']['busy_seconds'], 0.5)
+
+    def test_failed_items_are_reported(self):
+        """
+        Test that an item whose fetch fails is reported while the other items are loaded.
+        """
+        fetch = fetch_pages(2)
+
+        def failing_fetch(item, emit):
+            if item == 'B':
+                raise ValueError('unavailable')
+            return fetch(item, emit)
+
+        loaded = []
+        results, failures, _ = run_pipeline(failing_fetch, ['A', 'B'], batches_of(5), loaded.extend)
+
+        self.assertEqual(results, [('A', 20)])
+        self.assertEqual([item for item, _ in failures], ['B'])
+        self.assertEqual(len(loaded), 20)
+
+    def test_load_error_stops_every_stage(self):
+        """
+        Test that a loader error is raised once the fetch and transform threads have stopped.
+        """
+        def load(batch):
+            raise RuntimeError('database gone')
+
+        with self.assertRaises(RuntimeError):
+            run_pipeline(fetch_pages(100), ['A', 'B'], batches_of(10), load, max_concurrency=2, page_queue_size=2)
+        self.assertEqual([thread.name for thread in threading.enumerate() if thread.name.startswith('pipeline-')], [])
+
+    def test_transform_error_is_raised(self):
+        """
+        Test that a transformer error is raised in the calling thread.
+        """
+        def transform(records):
+            for _ in records:
+                raise ValueError('bad record')
+            yield []
+
+        with self.assertRaises(ValueError):
+            run_pipeline(fetch_pages(100), ['A'], transform, lambda batch: None, page_queue_size=2)
+
+    def test_metered_queue_stats(self):
+        """
+        Test that the queue reports its depth and the time its consumer waited.
+        """
+        pages = MeteredQueue(4)
+        pages.put('a')
+        pages.put('b')
+        pages.close()
+
+        self.assertEqual(list(pages), ['a', 'b'])
+        stats = pages.stats()
+        self.assertEqual((stats['items'], stats['max_depth'], stats['mean_depth']), (2, 2, 1.5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+from utils.query_cache import QueryCache, bump_data_version
+from utils.sql_queries_dag import *
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestQueryCache(unittest.TestCase):
+    """
+    Unit tests for the shared query result cache.
+    """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.version = 1
+        self.load_version = MagicMock(side_effect=lambda: self.version)
+
+    def cache(self, **kwargs):
+        options = {'max_entries': 10, 'ttl': 100, 'version_check_interval': 10}
+        options.update(kwargs)
+        return QueryCache(self.load_version, clock=self.clock, **options)
+
+    def test_hits_run_no_query(self):
+        """
+        Test that a cached result is served without calling the loader or reading the version again.
+        """
+        cache = self.cache()
+        load = MagicMock(return_value='result')
+
+        self.assertEqual(cache.get('key', load), 'result')
+        self.clock.now = 5
+        self.assertEqual(cache.get('key', load), 'result')
+
+        load.assert_called_once()
+        self.load_version.assert_called_once()
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'invalidations': 0,
+                                         'entries': 1, 'version': 1})
+
+    def test_new_data_version_invalidates(self):
+        """
+        Test that results are reloaded once the data version changes and the check interval elapsed.
+        """
+        cache = self.cache()
+        load = MagicMock(side_effect=['old', 'new'])
+        cache.get('key', load)
+
+        self.version = 2
+        self.clock.now = 5
+        self.assertEqual(cache.get('key', load), 'old')
+        self.clock.now = 10
+        self.assertEqual(cache.get('key', load), 'new')
+
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        self.assertEqual(cache.stats()['version'], 2)
+
+    def test_entries_expire_after_ttl(self):
+        """
+        Test that an entry older than the TTL is reloaded even if the data version did not change.
+        """
+        cache = self.cache(version_check_interval=1000)
+        load = MagicMock(side_effect=['first', 'second'])
+        cache.get('key', load)
+
+        self.clock.now = 100
+
+        self.assertEqual(cache.get('key', load), 'second')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """
+        Test that the cache keeps at most max_entries, evicting the least recently used first.
+        """
+        cache = self.cache(max_entries=2)
+        cache.get('a', lambda: 'a')
+        cache.get('b', lambda: 'b')
+        cache.get('a', lambda: 'unused')
+        cache.get('c', lambda: 'c')
+
+        load = MagicMock(return_value='b again')
+        self.assertEqual(cache.get('a', load), 'a')
+        self.assertEqual(cache.get('b', load), 'b again')
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_failures_are_not_cached(self):
+        """
+        Test that an exception from the loader propagates and the next call loads again.
+        """
+        cache = self.cache()
+
+        with self.assertRaises(RuntimeError):
+            cache.get('key', MagicMock(side_effect=RuntimeError('database down')))
+
+        self.assertEqual(cache.get('key', lambda: 'result'), 'result')
+
+    def test_version_read_does_not_block_hits(self):
+        """
+        Test that hits are served from the cache while another thread is reading the data version.
+        """
+        cache = self.cache()
+        cache.get('key', lambda: 'result')
+        reading, release = threading.Event(), threading.Event()
+
+        def slow_version():
+            reading.set()
+            release.wait(5)
+            return 1
+
+        self.load_version.side_effect = slow_version
+        self.clock.now = 10
+        reader = threading.Thread(target=cache.get, args=('key', lambda: 'unused'))
+        reader.start()
+        self.addCleanup(reader.join)
+        self.addCleanup(release.set)
+        self.assertTrue(reading.wait(5))
+
+        self.assertEqual(cache.get('key', lambda: 'unused'), 'result')
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(self.load_version.call_count, 2)
+
+    def test_bump_data_version(self):
+        """
+        Test that bumping the data version upserts the app's dataset row.
+        """
+        cursor = MagicMock()
+
+        bump_data_version(cursor)
+
+        cursor.execute.assert_called_once_with(BUMP_DATA_VERSION_QUERY, ('weather_observations',))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import unittest
+from unittest.mock import patch
+from utils import records
+from utils.records import ObservationRecord, StationRecord, loads, project_observation, project_station
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'weather_gov_observations.json')
+
+class TestRecords(unittest.TestCase):
+    """
+    Unit tests for the JSON decoding and the projection of API features onto records.
+    """
+
+    def test_loads_with_and_without_orjson(self):
+        """
+        Test that documents decode the same with orjson and with the stdlib fallback.
+        """
+        document = b'{"features": [{"properties": {"value": 1.5}}]}'
+
+        with patch.object(records, 'orjson', None):
+            fallback = loads(document)
+
+        self.assertEqual(loads(document), fallback)
+        self.assertEqual(fallback, {'features': [{'properties': {'value': 1.5}}]})
+
+    def test_project_station(self):
+        """
+        Test that a station feature maps to a stations table row with latitude before longitude.
+        """
+        feature = {
+            'id': 'https://api.weather.gov/stations/123',
+            'geometry': {'type': 'Point', 'coordinates': [-99.1332, 19.4326]},
+            'properties': {'stationIdentifier': '123', 'name': 'Sample Station', 'timeZone': 'UTC', 'elevation': {}},
+        }
+
+        self.assertEqual(project_station(feature), StationRecord('123', 'Sample Station', 'UTC', 19.4326, -99.1332))
+        self.assertEqual(project_station({'properties': {'stationIdentifier': '9'}, 'geometry': None}),
+                         ('9', None, None, None, None))
+
+    def test_project_observation(self):
+        """
+        Test that an observation feature keeps only the loaded fields, reading the station id
+        from its URL and humidity from relativeHumidity.
+        """
+        feature = {
+            'properties': {
+                'station': 'https://api.weather.gov/stations/KORD',
+                'timestamp': '2024-01-01T00:00:00+00:00',
+                'textDescription': 'Cloudy',
+                'temperature': {'unitCode': 'wmoUnit:degC', 'value': 1.7, 'qualityControl': 'V'},
+                'windSpeed': {'unitCode': 'wmoUnit:km_h-1', 'value': None, 'qualityControl': 'Z'},
+                'relativeHumidity': {'unitCode': 'wmoUnit:percent', 'value': 88.2, 'qualityControl': 'V'},
+                'windGust': {'unitCode': 'wmoUnit:km_h-1', 'value': None, 'qualityControl': 'Z'},
+            }
+        }
+
+        self.assertEqual(project_observation(feature), ObservationRecord(
+            'KORD', '2024-01-01T00:00:00+00:00', 1.7, 'wmoUnit:degC', None, 'wmoUnit:km_h-1', 88.2))
+        self.assertEqual(project_observation({'properties': {'timestamp': 't', 'temperature': None}}),
+                         (None, 't', None, '', None, '', None))
+
+    def test_project_fixture_page(self):
+        """
+        Test the projection of a page in the full weather.gov observation schema.
+        """
+        with open(FIXTURE, 'rb') as fixture:
+            features = loads(fixture.read())['features']
+
+        observations = [project_observation(feature) for feature in features]
+
+        self.assertEqual(observations[0], ObservationRecord(
+            'KORD', '2024-09-28T23:51:00+00:00', 22.8, 'wmoUnit:degC', 20.376, 'wmoUnit:km_h-1', 50.86))
+        self.assertIs(observations[0].station_id, observations[1].station_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
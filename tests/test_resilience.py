@@ -0,0 +1,232 @@
+import time
+import unittest
+from datetime import datetime, timezone
+import requests
+from utils.api_client import fetch_concurrently, iter_features
+from utils.resilience import CircuitBreaker, CircuitOpenError, ResilientSession, TokenBucket, parse_retry_after
+from tests.fake_weather_api import FakeWeatherAPI
+
+class FakeClock:
+    """
+    Clock whose time only moves when `sleep` is called.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class TestRateLimiterAndCircuitBreaker(unittest.TestCase):
+    """
+    Unit tests for the token bucket, the circuit breaker and Retry-After parsing, on a fake clock.
+    """
+
+    def test_token_bucket_paces_after_burst(self):
+        """
+        Test that the bucket serves `burst` tokens at once, then one token every 1 / rate seconds.
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(rate=4, burst=2, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(4)]
+
+        self.assertEqual(waits, [0.0, 0.0, 0.25, 0.25])
+        self.assertEqual(clock.now, 0.5)
+
+    def test_token_bucket_slow_down_and_speed_up(self):
+        """
+        Test that slow_down halves the rate and pauses callers, and speed_up raises it back to max_rate.
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=1, increase=0.5, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+
+        bucket.slow_down(pause=2.0)
+        self.assertEqual(bucket.rate, 5)
+        self.assertAlmostEqual(bucket.acquire(), 2.2)
+
+        bucket.speed_up()
+        bucket.speed_up()
+        self.assertEqual(bucket.rate, 10)
+
+    def test_circuit_breaker(self):
+        """
+        Test that the circuit opens after consecutive failures, lets a single trial through after
+        `reset_timeout` and closes again when the trial succeeds.
+        """
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+        for _ in range(2):
+            breaker.before_request()
+            breaker.record_failure()
+        breaker.record_success()
+        for _ in range(3):
+            breaker.before_request()
+            breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+        clock.sleep(10)
+        breaker.before_request()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        clock.sleep(10)
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_parse_retry_after(self):
+        """
+        Test that Retry-After is read as seconds or as an HTTP date.
+        """
+        now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertEqual(parse_retry_after('Mon, 01 Jan 2024 12:00:30 GMT', now=now), 30.0)
+        self.assertEqual(parse_retry_after('Mon, 01 Jan 2024 11:00:00 GMT', now=now), 0.0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+class TestResilientSession(unittest.TestCase):
+    """
+    Unit tests for the retrying session.
+    This class runs it against a local fake API that injects 429s, 5xx responses and slow replies.
+    """
+
+    def setUp(self):
+        self.api = FakeWeatherAPI(number_of_stations=20, observations_per_station=30, page_size=10,
+                                  slow_latency=0.5).start()
+        self.sleeps = []
+
+    def tearDown(self):
+        self.api.stop()
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        time.sleep(seconds)
+
+    def session(self, rate=1000, burst=100, **kwargs):
+        kwargs.setdefault('backoff_base', 0.01)
+        kwargs.setdefault('timeout', 2)
+        return ResilientSession(rate_limiter=TokenBucket(rate, burst=burst), sleep=self.sleep, **kwargs)
+
+    def read_observations(self, session, station_id='ST0001'):
+        return list(iter_features(session, f'{self.api.stations_endpoint}/{station_id}/observations'))
+
+    def test_retries_throttled_and_failed_requests(self):
+        """
+        Test that 429 and 5xx responses are retried and every page is eventually read.
+        """
+        self.api.faults.extend([429, 503, 500, 502])
+        session = self.session()
+
+        observations = self.read_observations(session)
+
+        self.assertEqual(len(observations), 30)
+        self.assertEqual(session.stats()['retries'], 4)
+        self.assertEqual(session.stats()['throttled'], 1)
+        self.assertEqual(session.stats()['circuit'], CircuitBreaker.CLOSED)
+
+    def test_respects_retry_after(self):
+        """
+        Test that a 429 is retried only after its Retry-After, and that it slows the rate limiter down.
+        """
+        self.api.faults.append(429)
+        self.api.retry_after = '0.3'
+        session = self.session(rate=100)
+
+        self.read_observations(session)
+
+        self.assertGreaterEqual(self.sleeps[0], 0.3)
+        self.assertLess(session.rate_limiter.rate, 100)
+
+    def test_slow_replies_time_out_and_are_retried(self):
+        """
+        Test that requests are sent with a timeout and retried when the server is too slow.
+        """
+        self.api.faults.append('slow')
+        session = self.session(timeout=0.1)
+
+        observations = self.read_observations(session)
+
+        self.assertEqual(len(observations), 30)
+        self.assertEqual(session.stats()['retries'], 1)
+
+    def test_gives_up_after_max_retries(self):
+        """
+        Test that the last error response is reported once the retries run out.
+        """
+        self.api.faults.extend([503] * 3)
+        session = self.session(max_retries=2)
+
+        with self.assertRaises(requests.HTTPError):
+            self.read_observations(session)
+        self.assertEqual(self.api.status_counts[503], 3)
+
+    def test_circuit_breaker_fails_fast(self):
+        """
+        Test that the circuit opens after consecutive server errors and stops sending requests.
+        """
+        self.api.faults.extend([500] * 10)
+        session = self.session(circuit_breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+
+        with self.assertRaises(CircuitOpenError):
+            self.read_observations(session)
+        self.assertEqual(self.api.request_count, 3)
+
+    def test_throttled_half_open_trial_closes_the_circuit(self):
+        """
+        Test that a 429 answering the half-open trial request settles it, so the session does
+        not keep failing fast once the server is reachable again.
+        """
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        session = self.session(circuit_breaker=breaker, max_retries=0)
+        self.api.faults.extend([500, 500])
+        for _ in range(2):
+            with self.assertRaises(requests.HTTPError):
+                self.read_observations(session)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        clock.sleep(10)
+        self.api.faults.append(429)
+        with self.assertRaises(requests.HTTPError):
+            self.read_observations(session)
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(len(self.read_observations(session)), 30)
+
+    def test_concurrent_fetches_against_a_rate_limited_server(self):
+        """
+        Test that concurrent fetches against a rate-limited server all succeed, with the client
+        starting well above the allowed rate. The throughput reached is measured by
+        benchmarks/bench_fetch_observations.py --server-rate-limit, not here.
+        """
+        self.api.rate_limit = 40
+        self.api.page_size = None
+        session = self.session(rate=200, burst=5)
+
+        results, failures = fetch_concurrently(lambda station_id: self.read_observations(session, station_id),
+                                               self.api.station_ids() * 5, max_workers=8)
+
+        self.assertEqual(failures, [])
+        self.assertEqual(len(results), 100)
+        self.assertEqual(self.api.status_counts[200], 100)
+        self.assertEqual(session.stats()['throttled'], self.api.status_counts[429])
+        self.assertEqual(session.stats()['circuit'], CircuitBreaker.CLOSED)
+
+
+if __name__ == '__main__':
+    unittest.main()
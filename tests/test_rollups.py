@@ -0,0 +1,152 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock
+from utils.partitions import ensure_partitions
+from utils.records import ObservationRecord
+from utils.rollups import TouchedRanges, refresh_rollups
+from utils.sql_queries_dag import *
+from utils.transform import transform_observations
+from tests.database import connect_or_skip, create_test_schema
+
+OBSERVATIONS = [
+    ('2024-03-01T10:00:00', 10.0, 5.0),
+    ('2024-03-01T10:30:00', 12.0, 9.0),
+    ('2024-03-01T11:00:00', 14.0, 8.0),
+    ('2024-03-02T09:00:00', 20.0, 1.0),
+]
+
+def observation(station, timestamp):
+    return ObservationRecord(str(station), timestamp, None, '', None, '', None)
+
+class TestTouchedRanges(unittest.TestCase):
+    """
+    Unit tests for the tracking of loaded observation ranges.
+    """
+
+    def test_track_batches_records_range_per_station(self):
+        """
+        Test that tracking passes batches through and keeps the earliest and latest timestamp per station.
+        """
+        ranges = TouchedRanges()
+        batches = [
+            transform_observations([observation(2, '2024-01-01T05:00:00Z'), observation(1, '2024-01-01T03:00:00Z'),
+                                    observation(2, '2024-01-01T01:00:00Z')], {'1': 1, '2': 2}),
+            transform_observations([observation(2, '2024-01-01T03:00:00Z'), observation(2, '2024-01-01T06:00:00Z')],
+                                   {'1': 1, '2': 2}),
+        ]
+
+        self.assertEqual(list(ranges.track_batches(batches)), batches)
+        self.assertEqual(ranges.to_list(), [
+            [1, '2024-01-01T03:00:00Z', '2024-01-01T03:00:00Z'],
+            [2, '2024-01-01T01:00:00Z', '2024-01-01T06:00:00Z'],
+        ])
+
+    def test_refresh_rollups_sends_arrays(self):
+        """
+        Test that refresh_rollups refreshes both rollups with one array parameter per column.
+        """
+        cursor = MagicMock()
+        cursor.rowcount = 3
+
+        counts = refresh_rollups(cursor, [[1, '2024-01-01T03:00:00Z', '2024-01-01T05:00:00+00:00']])
+
+        self.assertEqual(counts, (3, 3))
+        params = ([1], [datetime(2024, 1, 1, 3)], [datetime(2024, 1, 1, 5)])
+        self.assertEqual([call.args for call in cursor.execute.call_args_list],
+                         [(REFRESH_HOURLY_ROLLUP_QUERY, params), (REFRESH_DAILY_ROLLUP_QUERY, params)])
+
+    def test_refresh_rollups_without_ranges(self):
+        """
+        Test that nothing is executed when no observations were loaded.
+        """
+        cursor = MagicMock()
+
+        self.assertEqual(refresh_rollups(cursor, []), (0, 0))
+        cursor.execute.assert_not_called()
+
+
+class TestRollupRefresh(unittest.TestCase):
+    """
+    Database tests for the rollup refresh queries, skipped when no database is reachable.
+    """
+
+    def setUp(self):
+        self.conn = connect_or_skip()
+        self.cursor = self.conn.cursor()
+        create_test_schema(self.cursor, 'test_rollups')
+        ensure_partitions(self.cursor, datetime(2024, 3, 1), datetime(2024, 3, 1))
+        self.cursor.execute("INSERT INTO stations (station_id) VALUES ('A') RETURNING station_key")
+        self.station_key = self.cursor.fetchone()[0]
+        self.insert(OBSERVATIONS)
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def insert(self, observations):
+        for timestamp, temperature, wind_speed in observations:
+            self.cursor.execute(INSERT_OBSERVATION_QUERY,
+                                (self.station_key, timestamp, temperature, 'CEL', wind_speed, 'KMH', 50))
+
+    def rollup(self, table):
+        self.cursor.execute(f"""
+            SELECT bucket_start, observation_count, temperature_min, temperature_max,
+                   ROUND(temperature_avg, 2), max_wind_speed_change
+            FROM {table} ORDER BY bucket_start
+        """)
+        return [(row[0], row[1], float(row[2]), float(row[3]), float(row[4]),
+                 None if row[5] is None else float(row[5])) for row in self.cursor.fetchall()]
+
+    def test_refresh_matches_raw_aggregates(self):
+        """
+        Test that the buckets hold the raw aggregates, with wind speed changes measured
+        against the previous observation even across bucket boundaries.
+        """
+        refresh_rollups(self.cursor, [[self.station_key, OBSERVATIONS[0][0], OBSERVATIONS[-1][0]]])
+
+        self.assertEqual(self.rollup('weather_observations_hourly'), [
+            (datetime(2024, 3, 1, 10), 2, 10.0, 12.0, 11.0, 4.0),
+            (datetime(2024, 3, 1, 11), 1, 14.0, 14.0, 14.0, 1.0),
+            (datetime(2024, 3, 2, 9), 1, 20.0, 20.0, 20.0, 7.0),
+        ])
+        self.assertEqual(self.rollup('weather_observations_daily'), [
+            (datetime(2024, 3, 1), 3, 10.0, 14.0, 12.0, 4.0),
+            (datetime(2024, 3, 2), 1, 20.0, 20.0, 20.0, 7.0),
+        ])
+
+    def test_incremental_refresh_only_rewrites_touched_buckets(self):
+        """
+        Test that a refresh of a later range updates its buckets and leaves earlier ones as they were.
+        """
+        refresh_rollups(self.cursor, [[self.station_key, OBSERVATIONS[0][0], OBSERVATIONS[-1][0]]])
+        self.cursor.execute("UPDATE weather_observations SET temperature = 0 WHERE observation_timestamp < '2024-03-02'")
+        self.insert([('2024-03-02T09:30:00', 30.0, 3.0)])
+
+        hourly, daily = refresh_rollups(self.cursor, [[self.station_key, '2024-03-02T09:30:00', '2024-03-02T09:30:00']])
+
+        self.assertEqual((hourly, daily), (1, 1))
+        self.assertEqual(self.rollup('weather_observations_hourly')[0], (datetime(2024, 3, 1, 10), 2, 10.0, 12.0, 11.0, 4.0))
+        self.assertEqual(self.rollup('weather_observations_daily')[-1], (datetime(2024, 3, 2), 2, 20.0, 30.0, 25.0, 7.0))
+
+    def test_backfilled_gap_updates_the_following_bucket(self):
+        """
+        Test that filling a gap refreshes the wind speed change of the first observation after
+        it, and that an observation after a gap longer than a day is compared with its predecessor.
+        """
+        refresh_rollups(self.cursor, [[self.station_key, OBSERVATIONS[0][0], OBSERVATIONS[-1][0]]])
+        self.insert([('2024-03-01T20:00:00', 16.0, 2.0), ('2024-03-05T12:00:00', 18.0, 6.0)])
+
+        refresh_rollups(self.cursor, [[self.station_key, '2024-03-01T20:00:00', '2024-03-01T20:00:00']])
+        refresh_rollups(self.cursor, [[self.station_key, '2024-03-05T12:00:00', '2024-03-05T12:00:00']])
+
+        hourly = {row[0]: row[5] for row in self.rollup('weather_observations_hourly')}
+        self.assertEqual(hourly[datetime(2024, 3, 1, 20)], 6.0)
+        self.assertEqual(hourly[datetime(2024, 3, 2, 9)], 1.0)
+        self.assertEqual(hourly[datetime(2024, 3, 5, 12)], 5.0)
+        daily = {row[0]: row[5] for row in self.rollup('weather_observations_daily')}
+        self.assertEqual((daily[datetime(2024, 3, 1)], daily[datetime(2024, 3, 2)], daily[datetime(2024, 3, 5)]),
+                         (6.0, 1.0, 5.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
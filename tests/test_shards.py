@@ -0,0 +1,40 @@
+import unittest
+from utils.shards import split_shards, summarize_shards
+
+class TestShards(unittest.TestCase):
+    """
+    Unit tests for splitting stations into shards and summarizing the shard results.
+    """
+
+    def test_split_shards(self):
+        """
+        Test that stations are split into consecutive shards of at most `shard_size` stations.
+        """
+        self.assertEqual(split_shards(['A', 'B', 'C'], 2), [
+            {'index': 0, 'station_ids': ['A', 'B']},
+            {'index': 1, 'station_ids': ['C']},
+        ])
+        self.assertEqual(split_shards([], 2), [])
+
+    def test_summarize_shards(self):
+        """
+        Test that summaries are ordered by shard, totalled, and that missing shards are reported.
+        """
+        shards = split_shards(['A', 'B', 'C', 'D', 'E'], 2)
+        summaries = [
+            {'index': 2, 'stations': 1, 'fetched': 5, 'loaded': 5, 'failed_stations': [],
+             'fetch_seconds': 1.0, 'load_seconds': 0.25},
+            {'index': 0, 'stations': 2, 'fetched': 7, 'loaded': 6, 'failed_stations': [{'station_id': 'B'}],
+             'fetch_seconds': 2.0, 'load_seconds': 0.5},
+        ]
+
+        report = summarize_shards(shards, summaries)
+
+        self.assertEqual([summary['index'] for summary in report['shards']], [0, 2])
+        self.assertEqual(report['missing_shards'], [1])
+        self.assertEqual(report['totals'], {'stations': 3, 'fetched': 12, 'loaded': 11, 'failed_stations': 1,
+                                            'fetch_seconds': 3.0, 'load_seconds': 0.75})
+
+
+if __name__ == '__main__':
+    unittest.main()
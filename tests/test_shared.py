@@ -0,0 +1,118 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from utils.shared import ConnectionPool, PoolTimeout
+
+def fake_connection():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.info.transaction_status = TRANSACTION_STATUS_IDLE
+    return conn
+
+class TestConnectionPool(unittest.TestCase):
+    """
+    Unit tests for the thread-safe connection pool.
+    """
+
+    def setUp(self):
+        self.connect = MagicMock(side_effect=fake_connection)
+
+    def test_connections_are_reused(self):
+        """
+        Test that min_size connections are opened up front and returned connections are reused.
+        """
+        pool = ConnectionPool(self.connect, min_size=1, max_size=2)
+        self.assertEqual(self.connect.call_count, 1)
+
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertEqual(pool.metrics()['in_use'], 1)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.connect.call_count, 1)
+        self.assertEqual(pool.metrics(), {
+            'size': 1, 'in_use': 0, 'idle': 1, 'max_size': 2, 'checkouts': 2,
+            'waits': 0, 'wait_time': 0.0, 'max_wait_time': 0.0, 'timeouts': 0, 'discarded': 0,
+        })
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        """
+        Test that uncommitted work is rolled back when a connection goes back to the pool.
+        """
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1)
+
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                conn.info.transaction_status = TRANSACTION_STATUS_INTRANS
+                raise ValueError("boom")
+
+        conn.rollback.assert_called_once()
+        self.assertEqual(pool.metrics()['idle'], 1)
+
+    def test_connection_errors_discard_the_connection(self):
+        """
+        Test that a connection raising a connection-level error is closed instead of reused.
+        """
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            with pool.connection() as broken:
+                raise psycopg2.OperationalError("server closed the connection")
+        with pool.connection() as conn:
+            self.assertIsNot(conn, broken)
+
+        broken.close.assert_called_once()
+        self.assertEqual(pool.metrics()['discarded'], 1)
+        self.assertEqual(pool.metrics()['size'], 1)
+
+    def test_health_check_replaces_dead_connections(self):
+        """
+        Test that idle connections are probed before reuse and replaced when the probe fails.
+        """
+        pool = ConnectionPool(self.connect, min_size=1, max_size=1, health_check_interval=0)
+        with pool.connection() as dead:
+            dead.cursor.return_value.__enter__.return_value.execute.side_effect = psycopg2.OperationalError
+
+        with pool.connection() as conn:
+            self.assertIsNot(conn, dead)
+        with pool.connection() as healthy:
+            self.assertIs(healthy, conn)
+
+        healthy.cursor.return_value.__enter__.return_value.execute.assert_called_with("SELECT 1")
+        self.assertEqual(pool.metrics()['discarded'], 1)
+
+    def test_exhausted_pool_waits_then_times_out(self):
+        """
+        Test that a checkout waits for a returned connection, and times out when none comes back.
+        """
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1)
+        conn = pool.getconn()
+        threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+
+        self.assertIs(pool.getconn(timeout=5), conn)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(timeout=0.01)
+
+        metrics = pool.metrics()
+        self.assertEqual((metrics['waits'], metrics['timeouts'], metrics['in_use']), (2, 1, 1))
+        self.assertGreater(metrics['wait_time'], 0.04)
+
+    def test_failed_connect_releases_its_slot(self):
+        """
+        Test that a connection attempt that fails does not permanently use up pool capacity.
+        """
+        self.connect.side_effect = [psycopg2.OperationalError("refused"), fake_connection()]
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.getconn()
+        pool.putconn(pool.getconn(timeout=0.01))
+
+        self.assertEqual(pool.metrics()['size'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
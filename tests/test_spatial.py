@@ -0,0 +1,143 @@
+import unittest
+from unittest.mock import patch
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from utils.spatial import StationIndex, haversine_km
+from utils.sql_queries_app import station_locations_query
+from tests.database import connect_or_skip, create_test_schema
+
+def random_index(size, seed=0, cell_degrees=1.0, south=-90, north=90, west=-180, east=180):
+    rng = np.random.default_rng(seed)
+    latitudes, longitudes = rng.uniform(south, north, size), rng.uniform(west, east, size)
+    ids = [f'S{number:05d}' for number in range(size)]
+    return StationIndex(ids, [f'Station {number}' for number in range(size)], latitudes, longitudes, cell_degrees)
+
+class TestHaversine(unittest.TestCase):
+    """
+    Unit tests for great-circle distances.
+    """
+
+    def test_known_distances(self):
+        """
+        Test a known city pair, a quarter of the equator and a distance across the antimeridian.
+        """
+        distances = haversine_km(40.7128, -74.0060, [51.5074, 0.0, 0.0], [-0.1278, 16.0, 179.5])
+
+        self.assertAlmostEqual(distances[0], 5570, delta=5)
+        self.assertAlmostEqual(haversine_km(0.0, 0.0, [0.0], [90.0])[0], 10007.5, delta=1)
+        self.assertAlmostEqual(haversine_km(0.0, -179.5, [0.0], [179.5])[0], 111.2, delta=0.1)
+
+
+class TestStationIndex(unittest.TestCase):
+    """
+    Unit tests for the spatial index of stations, checked against scanning every station.
+    """
+
+    def test_nearest_matches_a_full_scan(self):
+        """
+        Test that the k nearest stations and their distances match sorting every station by
+        distance, for dense and sparse areas, near the poles and across the antimeridian.
+        """
+        index = random_index(5000)
+        rng = np.random.default_rng(1)
+        points = [(89.9, 10.0), (-89.5, -170.0), (10.0, 179.9), (10.0, -179.9)] + list(
+            zip(rng.uniform(-90, 90, 300), rng.uniform(-180, 180, 300)))
+        for latitude, longitude in points:
+            for k in (1, 7, 40):
+                positions, distances = index.nearest(latitude, longitude, k)
+
+                expected = np.sort(haversine_km(latitude, longitude, index.latitudes, index.longitudes))[:k]
+                np.testing.assert_allclose(distances, expected)
+                np.testing.assert_allclose(
+                    haversine_km(latitude, longitude, index.latitudes[positions], index.longitudes[positions]),
+                    distances)
+
+    def test_nearest_with_few_stations(self):
+        """
+        Test that asking for more stations than indexed returns all of them, closest first.
+        """
+        index = StationIndex(['A', 'B', 'C'], ['Alpha', 'Beta', 'Gamma'], [0.0, 50.0, -60.0], [0.0, 100.0, -120.0])
+
+        positions, distances = index.nearest(1.0, 1.0, 10)
+
+        self.assertEqual(index.station_ids[positions].tolist(), ['A', 'B', 'C'])
+        self.assertTrue(np.all(np.diff(distances) > 0))
+        self.assertEqual(len(StationIndex([], [], [], []).nearest(0.0, 0.0, 3)[0]), 0)
+
+    def test_within_matches_a_full_scan(self):
+        """
+        Test that bounding boxes, including boxes crossing the antimeridian, return the stations
+        a scan would, whether the index reads the cells of the box or compares every station.
+        """
+        index = random_index(5000, cell_degrees=2.5)
+        rng = np.random.default_rng(2)
+        boxes = [(-10.0, 170.0, 10.0, -170.0), (-90.0, -180.0, 90.0, 180.0), (20.0, 5.0, 10.0, 6.0),
+                 (-5.0, 175.0, 5.0, 180.0), (-5.0, -180.0, 5.0, -175.0), (-5.0, 180.0, 5.0, 5.0)]
+        for _ in range(300):
+            south, north = sorted(rng.uniform(-90, 90, 2))
+            west, east = rng.uniform(-180, 180, 2)
+            boxes.append((south, west, north, east))
+        for _ in range(300):
+            south, west = rng.uniform(-90, 90), rng.uniform(-180, 180)
+            height, width = rng.uniform(0, 10, 2)
+            boxes.append((south, west, south + height, (west + width + 180) % 360 - 180))
+        for scan_max_stations in (0, len(index)):
+            with self.subTest(scan_max_stations=scan_max_stations), \
+                    patch('utils.spatial.WITHIN_SCAN_MAX_STATIONS', scan_max_stations):
+                for south, west, north, east in boxes:
+                    width = east - west if east >= west else east - west + 360
+                    expected = np.flatnonzero((index.latitudes >= south) & (index.latitudes <= north)
+                                              & ((index.longitudes - west) % 360 <= width))
+
+                    self.assertEqual(sorted(index.within(south, west, north, east)), expected.tolist())
+
+    def test_from_frame_skips_stations_without_coordinates(self):
+        """
+        Test that an index built from query rows accepts Decimal coordinates and leaves out
+        stations without them, and that records returns the stations with their distances.
+        """
+        df = pd.DataFrame({'station_id': ['A', 'B', 'C'], 'station_name': ['Alpha', 'Beta', 'Gamma'],
+                           'latitude': [Decimal('40.7'), None, Decimal('41.0')],
+                           'longitude': [Decimal('-74.0'), Decimal('-73.0'), Decimal('-74.0')]})
+
+        index = StationIndex.from_frame(df)
+        records = index.records(*index.nearest(41.0, -74.0, 5))
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(records['station_name'].tolist(), ['Gamma', 'Alpha'])
+        self.assertEqual(list(records.columns), ['station_id', 'station_name', 'latitude', 'longitude', 'distance_km'])
+        self.assertAlmostEqual(records['distance_km'].iloc[1], 33.4, delta=0.1)
+
+
+class TestStationLocationsQuery(unittest.TestCase):
+    """
+    Database tests for the query the station index is built from, skipped when no database is reachable.
+    """
+
+    def setUp(self):
+        self.conn = connect_or_skip()
+        self.cursor = self.conn.cursor()
+        create_test_schema(self.cursor, 'test_spatial')
+
+    def tearDown(self):
+        self.conn.rollback()
+        self.conn.close()
+
+    def test_station_locations(self):
+        """
+        Test that the stations with coordinates are read and indexed.
+        """
+        self.cursor.executemany("INSERT INTO stations (station_id, station_name, latitude, longitude) VALUES (%s, %s, %s, %s)",
+                                [('A', 'Alpha', 40.7128, -74.006), ('B', 'Beta', None, None), ('C', 'Gamma', 34.05, -118.24)])
+        self.cursor.execute(station_locations_query())
+        df = pd.DataFrame(self.cursor.fetchall(), columns=[column.name for column in self.cursor.description])
+
+        index = StationIndex.from_frame(df)
+
+        self.assertEqual(sorted(index.station_ids.tolist()), ['A', 'C'])
+        self.assertEqual(index.records(index.within(30.0, -120.0, 35.0, -110.0))['station_name'].tolist(), ['Gamma'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from utils.records import project_station
+from utils.station_registry import StationRegistry
+from utils.sql_queries_dag import *
+
+def station(station_id, name='Sample Station', coordinates=(-99.1332, 19.4326)):
+    return project_station({
+        'properties': {'stationIdentifier': station_id, 'name': name, 'timeZone': 'UTC'},
+        'geometry': {'coordinates': list(coordinates)},
+    })
+
+class TestStationRegistry(unittest.TestCase):
+    """
+    Unit tests for the in-process station registry.
+    """
+
+    @patch('utils.station_registry.execute_values')
+    def test_upsert_pages_and_caches_keys(self, mock_execute_values):
+        """
+        Test that upsert sends deduplicated pages and caches the keys the database returns.
+
+        :param mock_execute_values: Mock object for psycopg2's execute_values.
+        """
+        mock_execute_values.side_effect = [[('A', 1), ('B', 2)], [('C', 3)]]
+        registry = StationRegistry()
+
+        count = registry.upsert(MagicMock(), [station('A'), station('A', name='Renamed'), station('B'), station('C')],
+                                page_size=3)
+
+        self.assertEqual(count, 3)
+        first_page = mock_execute_values.call_args_list[0].args[2]
+        self.assertEqual(first_page, [('A', 'Renamed', 'UTC', 19.4326, -99.1332), ('B', 'Sample Station', 'UTC', 19.4326, -99.1332)])
+        self.assertEqual(mock_execute_values.call_args_list[0].args[1], UPSERT_STATIONS_QUERY)
+        self.assertEqual([registry.get(station_id) for station_id in 'ABC'], [1, 2, 3])
+
+    def test_resolve_queries_only_missing_stations(self):
+        """
+        Test that resolve only asks the database for stations that are not cached.
+        """
+        registry = StationRegistry()
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [('A', 1), ('B', 2)]
+        registry.load(cursor)
+
+        cursor.fetchall.return_value = [('C', 3)]
+        keys = registry.resolve(cursor, ['A', 'C', 'unknown'])
+
+        self.assertEqual(keys, {'A': 1, 'C': 3})
+        self.assertEqual(sorted(cursor.execute.call_args.args[1][0]), ['C', 'unknown'])
+
+        cursor.reset_mock()
+        self.assertEqual(registry.resolve(cursor, ['A', 'B']), {'A': 1, 'B': 2})
+        cursor.execute.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
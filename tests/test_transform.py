@@ -0,0 +1,76 @@
+import math
+import unittest
+from unittest.mock import MagicMock
+from utils.loaders import load_observation_batches
+from utils.records import ObservationRecord
+from utils.sql_queries_dag import *
+from utils.transform import iter_observation_batches, transform_observations
+
+def observation(station='123', timestamp='2024-09-28T23:10:51Z', temperature=20.456, wind_speed=5.0, humidity=50):
+    return ObservationRecord(station, timestamp, temperature, 'wmoUnit:degC', wind_speed, 'wmoUnit:km_h-1', humidity)
+
+class TestTransform(unittest.TestCase):
+    """
+    Unit tests for the columnar observation transform.
+    """
+
+    def test_transform_extracts_and_rounds_columns(self):
+        """
+        Test that records become rounded columns with NaN for missing values and None in rows.
+        """
+        records = [observation(), observation(station='456', temperature=None, wind_speed=None, humidity=12.345)]
+
+        batch = transform_observations(records, {'123': 7, '456': 8})
+
+        self.assertEqual(batch.station_key.tolist(), [7, 8])
+        self.assertEqual(batch.temperature[0], 20.46)
+        self.assertTrue(math.isnan(batch.temperature[1]))
+        self.assertEqual(batch.rows(), [
+            (7, '2024-09-28T23:10:51Z', 20.46, 'wmoUnit:degC', 5.0, 'wmoUnit:km_h-1', 50.0),
+            (8, '2024-09-28T23:10:51Z', None, 'wmoUnit:degC', None, 'wmoUnit:km_h-1', 12.35),
+        ])
+
+    def test_transform_drops_missing_and_unknown_stations(self):
+        """
+        Test that observations without a station or with an unknown one are dropped, and each
+        distinct station is looked up once.
+        """
+        station_keys = MagicMock()
+        station_keys.get.side_effect = {'123': 7}.get
+        records = [observation(), observation(station=None), observation(station='999'), observation()]
+
+        batch = transform_observations(records, station_keys)
+
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(sorted(call.args[0] for call in station_keys.get.call_args_list), ['123', '999'])
+
+    def test_iter_observation_batches(self):
+        """
+        Test that records are transformed in batches and batches left empty are skipped.
+        """
+        records = [observation(timestamp=f'2024-01-01T0{hour}:00:00Z') for hour in range(5)]
+        records[3] = records[4] = observation(station='999')
+
+        batches = list(iter_observation_batches(records, {'123': 7}, batch_size=3))
+
+        self.assertEqual([len(batch) for batch in batches], [3])
+
+    def test_load_observation_batches(self):
+        """
+        Test that batches are loaded as rows with the selected strategy.
+        """
+        cursor = MagicMock()
+        batches = [transform_observations([observation()], {'123': 7}),
+                   transform_observations([observation(timestamp='2024-09-29T00:00:00Z')], {'123': 7})]
+
+        count = load_observation_batches(cursor, batches, strategy='executemany', batch_size=500)
+
+        self.assertEqual(count, 2)
+        cursor.executemany.assert_called_once_with(INSERT_OBSERVATION_QUERY, [
+            (7, '2024-09-28T23:10:51Z', 20.46, 'wmoUnit:degC', 5.0, 'wmoUnit:km_h-1', 50.0),
+            (7, '2024-09-29T00:00:00Z', 20.46, 'wmoUnit:degC', 5.0, 'wmoUnit:km_h-1', 50.0),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from utils.watermarks import load_watermarks, observation_windows, parse_utc
+from utils.sql_queries_dag import *
+
+END = datetime(2024, 10, 8, 12, 0)
+LOOKBACK = timedelta(days=7)
+
+class TestWatermarks(unittest.TestCase):
+    """
+    Unit tests for the incremental ingestion windows.
+    """
+
+    def test_station_without_watermark_gets_full_window(self):
+        """
+        Test that a station with no stored observations is fetched over the full lookback window.
+        """
+        windows = observation_windows(['A'], END, LOOKBACK)
+
+        self.assertEqual(windows, {'A': (END - LOOKBACK, END)})
+
+    def test_window_starts_at_watermark_minus_overlap(self):
+        """
+        Test that a station with a recent watermark is fetched from the watermark minus the overlap.
+        """
+        watermarks = {'A': END - timedelta(hours=20)}
+
+        windows = observation_windows(['A', 'B'], END, LOOKBACK, watermarks=watermarks, overlap=timedelta(hours=2))
+
+        self.assertEqual(windows['A'], (END - timedelta(hours=22), END))
+        self.assertEqual(windows['B'], (END - LOOKBACK, END))
+
+    def test_window_is_capped_to_lookback(self):
+        """
+        Test that an old watermark never extends the window past the lookback and a
+        watermark in the future never produces a window that ends before it starts.
+        """
+        watermarks = {'old': END - timedelta(days=30), 'future': END + timedelta(hours=1)}
+
+        windows = observation_windows(['old', 'future'], END, LOOKBACK, watermarks=watermarks)
+
+        self.assertEqual(windows['old'], (END - LOOKBACK, END))
+        self.assertEqual(windows['future'], (END, END))
+
+    def test_load_watermarks(self):
+        """
+        Test that load_watermarks queries the given stations and ignores stations without observations.
+        """
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [('A', END), ('B', None)]
+
+        self.assertEqual(load_watermarks(cursor, ['A', 'B']), {'A': END})
+        cursor.execute.assert_called_once_with(SELECT_STATION_WATERMARKS_QUERY, (['A', 'B'],))
+
+    def test_parse_utc(self):
+        """
+        Test that ISO timestamps are normalized to naive UTC datetimes.
+        """
+        self.assertEqual(parse_utc('2024-01-01T00:00:00Z'), datetime(2024, 1, 1))
+        self.assertEqual(parse_utc('2024-01-01T02:00:00+02:00'), datetime(2024, 1, 1))
+        self.assertEqual(parse_utc('2024-01-01'), datetime(2024, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+
+from requests.adapters import HTTPAdapter
+
+from utils.config import API_RATE_BURST, API_RATE_LIMIT
+from utils.http_cache import CachingAdapter
+from utils.records import loads
+from utils.resilience import ResilientSession, TokenBucket
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_session(pool_size=10, cache=None, rate_limit=API_RATE_LIMIT, burst=API_RATE_BURST):
+    """
+    Creates a requests session whose connection pool can serve `pool_size` concurrent requests.
+
+    Requests are paced by a token bucket shared by every thread using the session, sent with
+    explicit timeouts and retried with backoff (see utils.resilience.ResilientSession).
+
+    Args:
+        pool_size (int): Maximum number of pooled connections kept per host.
+        cache (HTTPCache): On-disk cache GET responses are served from and revalidated
+            with conditional requests. None disables caching.
+        rate_limit (float): Maximum number of requests per second.
+        burst (int): Number of requests that can be sent at once after an idle period.
+
+    Returns:
+        ResilientSession: A session that reuses TCP/TLS connections between requests.
+    """
+    session = ResilientSession(rate_limiter=TokenBucket(rate_limit, burst=burst))
+    if cache is not None:
+        adapter = CachingAdapter(cache, pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def iter_pages(session, url, params=None, max_pages=None, project=None):
+    """
+    Yields the features of each page of a paginated weather.gov collection.
+
+    Pages are requested lazily, following the `pagination.next` link of the previous page,
+    so only one page is held in memory at a time. Iteration stops on an empty page, when no
+    next link is returned or after `max_pages` pages.
+
+    Responses are decoded with orjson when it is installed. With `project`, each feature is
+    replaced by `project(feature)` as soon as its page is parsed, so the rest of the GeoJSON
+    document is released with the page.
+
+    Args:
+        session (requests.Session): Session used to issue the requests.
+        url (str): URL of the first page.
+        params (dict): Query parameters for the first page. Next links already carry them.
+        max_pages (int): Maximum number of pages to request. None follows every page.
+        project (callable): Maps a feature to the record to yield, e.g. `project_observation`.
+
+    Yields:
+        list: The GeoJSON features (or projected records) of a page.
+
+    Raises:
+        requests.RequestException: If a page request fails.
+    """
+    pages = 0
+    while url:
+        response = session.get(url, params=params)
+        response.raise_for_status()
+        payload = loads(response.content)
+        features = payload.get('features', [])
+        if project is not None:
+            features = [project(feature) for feature in features]
+        pages += 1
+        yield features
+
+        if not features or (max_pages is not None and pages >= max_pages):
+            return
+        next_url = (payload.get('pagination') or {}).get('next')
+        if next_url == url:
+            return
+        url, params = next_url, None
+
+
+def iter_features(session, url, params=None, max_pages=None, project=None):
+    """
+    Yields the GeoJSON features (or projected records) of a paginated weather.gov collection
+    one at a time.
+
+    See `iter_pages` for the pagination and projection rules.
+    """
+    for features in iter_pages(session, url, params=params, max_pages=max_pages, project=project):
+        yield from features
+
+
+def fetch_concurrently(fetch, items, max_workers):
+    """
+    Calls `fetch(item)` for every item using a bounded thread pool.
+
+    A failing item does not stop the others; its exception is collected instead.
+
+    Args:
+        fetch (callable): Function called once per item.
+        items (iterable): Items to fetch.
+        max_workers (int): Maximum number of calls running at the same time.
+
+    Returns:
+        tuple: (results, failures) where results is a list of (item, result) pairs
+            and failures is a list of (item, exception) pairs.
+    """
+    results = []
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(fetch, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                results.append((item, future.result()))
+            except Exception as e:
+                failures.append((item, e))
+    return results, failures
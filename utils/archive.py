@@ -0,0 +1,328 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from utils.config import ARCHIVE_COMPRESSION, ARCHIVE_FETCH_SIZE, ARCHIVE_PATH
+from utils.partitions import add_months, month_start, partition_name
+from utils.rollups import delete_rollups
+from utils.sql_queries_dag import (COUNT_PARTITION_ROWS_QUERY, DROP_PARTITION_QUERY, EXPORT_MONTH_QUERY,
+                                    LOCK_PARTITION_QUERY)
+
+
+logger = logging.getLogger(__name__)
+
+# Columns of an archived observation, in the order of EXPORT_MONTH_QUERY. station_key and month
+# are not stored in the files; they are the hive partition keys of the directories holding them.
+COLUMNS = ('station_key', 'observation_timestamp', 'temperature', 'temperature_unit_code', 'wind_speed',
+           'wind_speed_unit_code', 'humidity')
+MANIFEST = '_manifest.json'
+# Columns of the monthly history, shared by the archive and the Postgres rollups
+HISTORY_COLUMNS = ('month', 'observation_count', 'temperature_avg', 'temperature_min', 'temperature_max',
+                   'wind_speed_max', 'humidity_avg')
+
+
+def _month_key(month):
+    return f'{month.year:04d}-{month.month:02d}'
+
+
+def _write_json(path, value):
+    with open(path, 'w') as json_file:
+        json.dump(value, json_file, indent=1, sort_keys=True)
+
+
+class ObservationArchive:
+    """
+    Compressed Parquet archive of the observations of closed months, for long-range analytics
+    that should not load the weather_observations table.
+
+    Observations are partitioned by station and month, one file per partition, sorted by
+    timestamp so the row group statistics let scans skip rows outside a time range. Reads go
+    through pyarrow datasets over memory-mapped files: the station and month of a filter prune
+    whole directories and only the requested columns are decoded. A manifest records which
+    months were archived and how many rows each export read from Postgres.
+
+    Layout: <path>/station_key=<key>/month=<YYYY-MM>/data.parquet and <path>/_manifest.json
+    """
+
+    def __init__(self, path=ARCHIVE_PATH, compression=ARCHIVE_COMPRESSION):
+        if pa is None:
+            raise ImportError("The observation archive requires pyarrow.")
+        self.path = path
+        self.compression = compression
+        self._lock = threading.Lock()
+        self.schema = pa.schema([
+            ('observation_timestamp', pa.timestamp('us')),
+            ('temperature', pa.float64()),
+            ('temperature_unit_code', pa.string()),
+            ('wind_speed', pa.float64()),
+            ('wind_speed_unit_code', pa.string()),
+            ('humidity', pa.float64()),
+        ])
+        self.partitioning = ds.partitioning(pa.schema([('station_key', pa.int32()), ('month', pa.string())]),
+                                            flavor='hive')
+        os.makedirs(path, exist_ok=True)
+
+    def _partition_path(self, station_key, month):
+        return os.path.join(self.path, f'station_key={station_key}', f'month={_month_key(month)}', 'data.parquet')
+
+    def manifest(self):
+        """
+        Returns the archived months, by 'YYYY-MM', with the rows exported and when.
+        """
+        try:
+            with open(os.path.join(self.path, MANIFEST)) as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _record(self, month, rows):
+        with self._lock:
+            manifest = self.manifest()
+            manifest[_month_key(month)] = {'rows': rows,
+                                           'archived_at': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+            self._replace(os.path.join(self.path, MANIFEST), lambda tmp_path: _write_json(tmp_path, manifest))
+
+    @staticmethod
+    def _replace(path, write):
+        # Readers skip names starting with '.', and os.replace swaps the file in atomically
+        tmp_path = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def is_archived(self, month):
+        return _month_key(month) in self.manifest()
+
+    def export_month(self, cursor, month, fetch_size=ARCHIVE_FETCH_SIZE):
+        """
+        Writes the observations of one month to the archive.
+
+        Rows are read `fetch_size` at a time and written one station at a time, so a named
+        (server-side) cursor keeps memory bounded for large months. A station already archived
+        for the month, e.g. before a backfill, is merged with the new rows, which win on equal
+        timestamps. The caller owns the transaction.
+
+        Args:
+            cursor: psycopg2 cursor; it executes a single statement.
+            month (datetime): Any instant of the month to export.
+            fetch_size (int): Rows fetched from Postgres at a time.
+
+        Returns:
+            int: Number of rows read from Postgres.
+        """
+        month = month_start(month)
+        cursor.execute(EXPORT_MONTH_QUERY, (month, add_months(month, 1)))
+        exported = stations = 0
+        station_key, rows = None, []
+        while True:
+            chunk = cursor.fetchmany(fetch_size)
+            for row in chunk:
+                if row[0] != station_key and rows:
+                    self._write_station(station_key, month, rows)
+                    stations += 1
+                    rows = []
+                station_key = row[0]
+                rows.append(row[1:])
+            exported += len(chunk)
+            if not chunk:
+                break
+        if rows:
+            self._write_station(station_key, month, rows)
+            stations += 1
+        self._record(month, exported)
+        logger.info(f"Archived {exported} observations of {stations} stations for {_month_key(month)}.")
+        return exported
+
+    def _write_station(self, station_key, month, rows):
+        table = pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(zip(*rows), self.schema)],
+                                     schema=self.schema)
+        path = self._partition_path(station_key, month)
+        if os.path.exists(path):
+            table = pa.concat_tables([table, pq.read_table(path, schema=self.schema)])
+            # np.unique keeps the first row of every timestamp, i.e. the new one, in timestamp order
+            timestamps = table.column('observation_timestamp').cast(pa.int64()).to_numpy()
+            table = table.take(np.unique(timestamps, return_index=True)[1])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._replace(path, lambda tmp_path: pq.write_table(table, tmp_path, compression=self.compression))
+
+    def dataset(self):
+        """
+        Returns the archive as a pyarrow dataset read through memory-mapped files.
+        """
+        return ds.dataset(self.path, schema=pa.unify_schemas([self.schema, self.partitioning.schema]),
+                          format='parquet', partitioning=self.partitioning,
+                          filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True))
+
+    @staticmethod
+    def _filter(station_keys=None, start=None, end=None):
+        conditions = []
+        if station_keys is not None:
+            conditions.append(pc.field('station_key').isin(list(station_keys)))
+        if start is not None:
+            conditions.append(pc.field('month') >= _month_key(start))
+            conditions.append(pc.field('observation_timestamp') >= pa.scalar(start, pa.timestamp('us')))
+        if end is not None:
+            # Months are compared on the partition key, timestamps on the row group statistics
+            conditions.append(pc.field('month') <= _month_key(end))
+            conditions.append(pc.field('observation_timestamp') < pa.scalar(end, pa.timestamp('us')))
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def scan(self, station_keys=None, start=None, end=None, columns=None):
+        """
+        Reads archived observations, only decoding the partitions and row groups the filters can match.
+
+        Args:
+            station_keys (iterable): Stations to read; None reads every station.
+            start (datetime): Earliest timestamp, inclusive.
+            end (datetime): Latest timestamp, exclusive.
+            columns (list): Columns to read, among COLUMNS and 'month'; None reads them all.
+
+        Returns:
+            pyarrow.Table: The matching observations.
+        """
+        return self.dataset().to_table(columns=columns, filter=self._filter(station_keys, start, end))
+
+    def count_rows(self, station_keys=None, start=None, end=None):
+        return self.dataset().count_rows(filter=self._filter(station_keys, start, end))
+
+    def monthly_summary(self, station_keys=None, start=None, end=None):
+        """
+        Aggregates archived observations by month, across the selected stations.
+
+        Args:
+            station_keys (iterable): Stations to aggregate; None aggregates every station.
+            start (datetime): Earliest timestamp, inclusive.
+            end (datetime): Latest timestamp, exclusive.
+
+        Returns:
+            pandas.DataFrame: One row per month with the columns of HISTORY_COLUMNS.
+        """
+        table = self.scan(station_keys, start, end, columns=['month', 'temperature', 'wind_speed', 'humidity'])
+        summary = table.group_by('month').aggregate([
+            ('month', 'count'), ('temperature', 'mean'), ('temperature', 'min'), ('temperature', 'max'),
+            ('wind_speed', 'max'), ('humidity', 'mean'),
+        ]).to_pandas()
+        summary = summary.rename(columns={
+            'month_count': 'observation_count', 'temperature_mean': 'temperature_avg', 'humidity_mean': 'humidity_avg',
+        })
+        summary['month'] = pd.to_datetime(summary['month'], format='%Y-%m')
+        return summary[list(HISTORY_COLUMNS)].sort_values('month', ignore_index=True)
+
+
+def prune_month(cursor, month):
+    """
+    Removes an archived month from Postgres: drops its partition of weather_observations and
+    deletes its hourly and daily rollups. The caller owns the transaction.
+
+    Args:
+        cursor: psycopg2 cursor.
+        month (datetime): Any instant of the month to prune.
+    """
+    month = month_start(month)
+    cursor.execute(sql.SQL(DROP_PARTITION_QUERY).format(partition=sql.Identifier(partition_name(month))))
+    delete_rollups(cursor, month, add_months(month, 1))
+    logger.info(f"Pruned {_month_key(month)} from Postgres.")
+
+
+def lock_partition(cursor, month):
+    """
+    Blocks writes to the partition of `month` until the end of the transaction.
+    """
+    cursor.execute(sql.SQL(LOCK_PARTITION_QUERY).format(partition=sql.Identifier(partition_name(month_start(month)))))
+
+
+def archive_holds_month(cursor, archive, month):
+    """
+    Returns whether the archive holds every row of a month's partition, so it can be dropped.
+
+    The partition is locked against writes first, so the check still holds when the caller
+    drops it later in the same transaction. The caller owns the transaction.
+
+    Args:
+        cursor: psycopg2 cursor.
+        archive (ObservationArchive): Archive the month should be in.
+        month (datetime): Any instant of the month.
+
+    Returns:
+        bool: True if the month was archived and the archive holds at least the partition's rows.
+    """
+    month = month_start(month)
+    if not archive.is_archived(month):
+        return False
+    lock_partition(cursor, month)
+    cursor.execute(sql.SQL(COUNT_PARTITION_ROWS_QUERY).format(partition=sql.Identifier(partition_name(month))))
+    rows = cursor.fetchone()[0]
+    stored = archive.count_rows(start=month, end=add_months(month, 1))
+    if stored < rows:
+        logger.warning(f"The archive holds {stored} of the {rows} rows of {_month_key(month)}.")
+    return stored >= rows
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_observation_archive(path=ARCHIVE_PATH):
+    """
+    Returns the process-wide observation archive stored under `path`.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    with _archives_lock:
+        if path not in _archives:
+            _archives[path] = ObservationArchive(path)
+        return _archives[path]
+
+
+def monthly_history(recent, archive, station_keys, start, end):
+    """
+    Completes the monthly history read from the Postgres rollups with the months only found in the archive.
+
+    Months still in Postgres come from `recent`, which reflects late and backfilled data; the
+    archive fills in the months pruned from Postgres, so callers see one history across both.
+
+    Args:
+        recent (pandas.DataFrame): Monthly history from `monthly_history_query`.
+        archive (ObservationArchive): Archive to read older months from, or None.
+        station_keys (list): Stations of the history.
+        start (datetime): Earliest timestamp, inclusive.
+        end (datetime): Latest timestamp, exclusive.
+
+    Returns:
+        pandas.DataFrame: One row per month with the columns of HISTORY_COLUMNS, in month order.
+    """
+    recent = recent[list(HISTORY_COLUMNS)].copy()
+    recent['month'] = pd.to_datetime(recent['month'])
+    for column in HISTORY_COLUMNS[1:]:
+        # NUMERIC columns arrive as Decimal
+        recent[column] = pd.to_numeric(recent[column]).astype(float)
+    if archive is None or not station_keys:
+        return recent.sort_values('month', ignore_index=True)
+    archived = archive.monthly_summary(station_keys, start, end)
+    archived = archived[~archived['month'].isin(recent['month'])]
+    parts = [part for part in (recent, archived) if len(part)]
+    if not parts:
+        return recent
+    return pd.concat(parts, ignore_index=True).sort_values('month', ignore_index=True)
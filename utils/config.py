@@ -1,5 +1,79 @@
+import os
+
 API_BASE_URL = 'https://api.weather.gov'
 STATIONS_ENDPOINT = f'{API_BASE_URL}/stations'
 START_DATE_OFFSET = 7
 NUMBER_OF_STATIONS = 3
-BATCH_SIZE = 500
\ No newline at end of file
+BATCH_SIZE = 500
+FETCH_CONCURRENCY = 8
+# Stations fetched and loaded by each mapped shard task, and how many shards run at the same time
+SHARD_SIZE = 50
+SHARD_CONCURRENCY = 4
+# Pacing, retries and circuit breaking of weather.gov requests (see utils.resilience)
+API_RATE_LIMIT = 10
+API_RATE_BURST = 10
+# (connect, read) timeouts in seconds
+API_TIMEOUT = (5, 30)
+API_MAX_RETRIES = 5
+API_BACKOFF_BASE = 0.5
+API_BACKOFF_MAX = 30
+API_CIRCUIT_FAILURE_THRESHOLD = 10
+API_CIRCUIT_RESET_TIMEOUT = 30
+# Maximum number of station catalogue pages read per run (None reads the whole catalogue)
+STATIONS_MAX_PAGES = None
+# On-disk HTTP cache of the station catalogue, revalidated with conditional requests (see utils.http_cache)
+HTTP_CACHE_PATH = os.getenv('HTTP_CACHE_PATH', '/tmp/weather_pipeline_http_cache')
+# Seconds a cached response is served without revalidation (0 revalidates on every run)
+HTTP_CACHE_MAX_AGE = 0
+HTTP_CACHE_MAX_SIZE = 256 * 2 ** 20
+INTERMEDIATE_STORE_BACKEND = 'local'
+INTERMEDIATE_STORE_PATH = os.getenv('INTERMEDIATE_STORE_PATH', '/tmp/weather_pipeline')
+INTERMEDIATE_CHUNK_SIZE = 10000
+# Observations transformed into one columnar batch at a time (see utils.transform)
+TRANSFORM_BATCH_SIZE = 10000
+# Overlap fetching, transforming and loading in each shard instead of running them one after another
+# (see utils.pipeline); pages and batches held between the stages are bounded by the queue sizes
+PIPELINED_INGESTION = False
+PIPELINE_PAGE_QUEUE_SIZE = 16
+PIPELINE_BATCH_QUEUE_SIZE = 2
+# One of 'executemany', 'execute_values' or 'copy' (see utils.loaders)
+LOAD_STRATEGY = 'copy'
+# One of 'full', 'incremental' or 'backfill' (see utils.watermarks)
+INGESTION_MODE = 'incremental'
+WATERMARK_OVERLAP_HOURS = 2
+# Monthly partitions of weather_observations created ahead of time, and how many months are kept
+PARTITION_PREMAKE_MONTHS = 2
+PARTITION_RETENTION_MONTHS = 24
+# Parquet archive of closed months (see utils.archive); requires pyarrow
+ARCHIVE_PATH = os.getenv('ARCHIVE_PATH', '/tmp/weather_archive')
+# Months are archived once they ended this many months ago
+ARCHIVE_AFTER_MONTHS = 3
+# Whether archived months are dropped from weather_observations and the rollups
+ARCHIVE_PRUNE = False
+ARCHIVE_COMPRESSION = 'zstd'
+ARCHIVE_FETCH_SIZE = 50000
+# Process-wide database connection pool (see utils.shared)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = 30
+DB_POOL_HEALTH_CHECK_INTERVAL = 60
+# Query result cache of the Streamlit app (see utils.query_cache)
+QUERY_CACHE_TTL = 3600
+QUERY_CACHE_MAX_ENTRIES = 1024
+# Seconds between checks of the data version; cache hits run no query in between
+DATA_VERSION_CHECK_INTERVAL = 30
+# Metrics of the DAG tasks and the app (see utils.metrics); while disabled they cost a flag check
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+# Directory the Prometheus textfile exports are written to (node_exporter textfile collector); None disables them
+METRICS_TEXTFILE_DIR = os.getenv('METRICS_TEXTFILE_DIR')
+# App queries taking at least this many seconds are logged with their parameters (None disables the log)
+SLOW_QUERY_SECONDS = 1.0
+# Stations per page of the app's all-stations overview
+OVERVIEW_PAGE_SIZE = 50
+# Points per chart of the app's time series view, and buckets aggregated in SQL per point before LTTB
+TIMESERIES_POINTS = 500
+TIMESERIES_OVERSAMPLE = 4
+# Size in degrees of the grid cells of the station spatial index (see utils.spatial)
+STATION_INDEX_CELL_DEGREES = 1.0
+# Stations listed by the app's nearby station search
+NEARBY_STATIONS = 10
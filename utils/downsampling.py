@@ -0,0 +1,106 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils.config import TIMESERIES_OVERSAMPLE
+
+_EPOCH = datetime(1970, 1, 1)
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def lttb(x, y, points):
+    """
+    Selects the points of a series to plot with Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept and the others are split into `points - 2` buckets of
+    consecutive points. From each bucket, the point forming the largest triangle with the point
+    selected from the previous bucket and the mean of the next bucket is kept, which preserves
+    the peaks and troughs a plain average would flatten.
+
+    Args:
+        x (array-like): Increasing x values, e.g. timestamps as numbers.
+        y (array-like): Values of the series, without NaNs.
+        points (int): Number of points to keep.
+
+    Returns:
+        numpy.ndarray: Increasing indexes of the selected points; every index when the series
+            has no more than `points` points.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    size = len(x)
+    if points >= size or points < 3:
+        return np.arange(size)
+
+    # Bucket k spans [edges[k], edges[k + 1]); the last point forms a bucket of its own
+    edges = np.append((np.arange(points - 1) * ((size - 2) / (points - 2))).astype(np.int64) + 1, size)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x, edges[:-1]) / counts
+    mean_y = np.add.reduceat(y, edges[:-1]) / counts
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Twice the area of the triangle (previous point, candidate, mean of the next bucket)
+        areas = np.abs((x[previous] - mean_x[bucket + 1]) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (mean_y[bucket + 1] - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def plan_resolution(start, end, points, oversample=TIMESERIES_OVERSAMPLE):
+    """
+    Chooses how a time window is aggregated in the database before downsampling.
+
+    Buckets are sized so that the window holds about `points * oversample` of them: enough
+    for LTTB to choose from, while the database returns a bounded number of rows whatever the
+    window length. Buckets of an hour or more are built from the hourly rollup and buckets of a
+    day or more from the daily rollup, rounded to whole hours or days. The window is widened to
+    whole buckets, so that nearby windows share their cache entries.
+
+    Args:
+        start (datetime): Start of the window.
+        end (datetime): End of the window.
+        points (int): Number of points of the chart.
+        oversample (int): Buckets aggregated per point of the chart.
+
+    Returns:
+        tuple: (source, bucket_seconds, start, end) with source one of 'raw', 'hourly' or
+            'daily' (see timeseries_query) and the window aligned to the buckets.
+    """
+    seconds = max(1, math.ceil((end - start).total_seconds() / (points * oversample)))
+    if seconds >= DAY:
+        source, seconds = 'daily', math.ceil(seconds / DAY) * DAY
+    elif seconds >= HOUR:
+        source, seconds = 'hourly', math.ceil(seconds / HOUR) * HOUR
+    else:
+        source = 'raw'
+    first = math.floor((start - _EPOCH).total_seconds() / seconds)
+    last = math.ceil((end - _EPOCH).total_seconds() / seconds)
+    return source, seconds, _EPOCH + timedelta(seconds=first * seconds), _EPOCH + timedelta(seconds=last * seconds)
+
+
+def downsample_series(df, columns, points):
+    """
+    Downsamples each column of a time-bucketed frame to at most `points` points with LTTB.
+
+    Args:
+        df (pandas.DataFrame): Rows ordered by a 'bucket' column of timestamps.
+        columns (iterable): Columns to downsample; missing values are left out first.
+        points (int): Maximum number of points per column.
+
+    Returns:
+        dict: pandas.Series of each column, indexed by bucket.
+    """
+    series = {}
+    for column in columns:
+        values = df[['bucket', column]].dropna()
+        timestamps = values['bucket'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        selected = lttb(timestamps, values[column].to_numpy(dtype=np.float64), points)
+        series[column] = values[column].iloc[selected].set_axis(values['bucket'].iloc[selected]).astype(float)
+    return series
@@ -0,0 +1,650 @@
+from datetime import datetime, timedelta
+from itertools import islice
+import time
+from airflow.exceptions import AirflowException
+import requests
+import logging
+from utils.api_client import create_session, fetch_concurrently, iter_features, iter_pages
+from utils.archive import archive_holds_month, get_observation_archive, lock_partition, prune_month
+from utils.config import API_RATE_LIMIT, SHARD_SIZE, STATIONS_ENDPOINT
+from utils.http_cache import get_http_cache
+from utils.intermediate_store import get_intermediate_store
+from utils.loaders import load_observation_batches
+from utils.metrics import COMMIT_SECONDS, ROWS, task_metrics, timed
+from utils.partitions import add_months, drop_partitions_before, ensure_partitions, list_partitions, month_start
+from utils.pipeline import run_pipeline
+from utils.query_cache import bump_data_version
+from utils.records import StationRecord, project_observation, project_station
+from utils.rollups import TouchedRanges, refresh_rollups
+from utils.shards import split_shards, summarize_shards
+from utils.shared import db_connection
+from utils.station_registry import get_station_registry
+from utils.transform import iter_observation_batches
+from utils.watermarks import INGESTION_MODES, load_watermarks, observation_windows, parse_utc
+
+
+logger = logging.getLogger(__name__)
+
+
+def _run_conf(kwargs):
+    """
+    Returns the conf the DAG run was triggered with, or an empty dict.
+    """
+    dag_run = kwargs.get('dag_run')
+    return (dag_run.conf or {}) if dag_run is not None else {}
+
+
+@task_metrics
+def manage_partitions(**kwargs):
+    """
+    Creates the monthly weather_observations partitions the run can write to and drops expired ones.
+
+    Partitions are created from the start of the lookback window (or of the backfill range) up to
+    `premake_months` months ahead, so inserts never hit a missing partition. Backfill runs do not
+    apply the retention policy, which would drop the partitions they load right after creating
+    them; other runs never drop the months they write to either. An expired partition is only
+    dropped once archive_history has archived its month and the archive holds all of its rows.
+
+    Args:
+        **kwargs: Airflow context variables, including:
+            - start_date_offset (int): Number of days to look back for observations.
+            - premake_months (int): Number of months to create ahead of the current one.
+            - retention_months (int): Number of past months to keep. None keeps every partition.
+    """
+    now = datetime.utcnow()
+    start_date = now - timedelta(days=kwargs.get('start_date_offset', 7))
+    end_date = now
+    conf = _run_conf(kwargs)
+    backfill = conf.get('mode') == 'backfill' and 'start' in conf
+    if backfill:
+        start_date = min(start_date, parse_utc(conf['start']))
+        if conf.get('end'):
+            end_date = max(end_date, parse_utc(conf['end']))
+    end_date = add_months(end_date, kwargs.get('premake_months', 1))
+
+    retention_months = kwargs.get('retention_months')
+    if backfill and retention_months is not None:
+        logger.info("Not applying the partition retention policy to a backfill run.")
+        retention_months = None
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            created = ensure_partitions(cursor, start_date, end_date)
+            dropped = []
+            if retention_months is not None:
+                archive = get_observation_archive()
+                cutoff = min(add_months(now, -retention_months), month_start(start_date))
+                dropped = drop_partitions_before(
+                    cursor, cutoff, droppable=lambda cursor, month: archive_holds_month(cursor, archive, month))
+        conn.commit()
+    logger.info(f"Created {len(created)} and dropped {len(dropped)} partitions.")
+
+
+def _written(records, writer):
+    """
+    Passes records through while writing each one to an intermediate store writer.
+    """
+    for record in records:
+        writer.write(record)
+        yield record
+
+
+@task_metrics
+def fetch_stations(**kwargs):
+    """
+    Fetches available weather stations from the API, upserts them into the stations table
+    and writes them to the intermediate store.
+
+    The station catalogue is read page by page following the API's `pagination.next` links
+    through the on-disk HTTP cache, so unchanged pages are answered with `304 Not Modified`,
+    projected onto StationRecords and streamed to run-scoped chunks; only the manifest of those
+    chunks is pushed to XCom.
+    
+    Args:
+        **kwargs: Airflow context variables, including:
+            - max_pages (int): Maximum number of catalogue pages to read. None reads every page.
+    
+    Raises:
+        AirflowException: If the API request fails.
+    """
+    logger.info("Fetching available weather stations...")
+    session = create_session(cache=get_http_cache())
+    writer = get_intermediate_store().open_writer(kwargs.get('run_id', 'manual'), 'stations')
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                stations = iter_features(session, STATIONS_ENDPOINT, max_pages=kwargs.get('max_pages'),
+                                         project=project_station)
+                station_registry = get_station_registry()
+                changes = station_registry.changes
+                station_registry.upsert(cursor, _written(stations, writer))
+                if station_registry.changes > changes:
+                    # The app rebuilds its station spatial index on the next data version
+                    bump_data_version(cursor)
+            conn.commit()
+        manifest = writer.close()
+        # Store the stations manifest in XCom for downstream tasks
+        kwargs['ti'].xcom_push(key='stations', value=manifest)
+        logger.info(f"Fetched {manifest['count']} stations (HTTP cache: {session.get_adapter(STATIONS_ENDPOINT).stats()}).")
+    except requests.Timeout:
+        logger.error("Request to fetch stations timed out.")
+        raise
+    except requests.ConnectionError:
+        logger.error("Connection error occurred while fetching stations.")
+        raise
+    except requests.RequestException as e:
+        logger.error(f"Error fetching stations: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def _observation_windows(station_ids, kwargs):
+    """
+    Resolves the observation window of each station for the run's ingestion mode.
+
+    Args:
+        station_ids (list): Station identifiers.
+        kwargs (dict): Airflow context variables of fetch_observations.
+
+    Returns:
+        dict: station_id -> (start_date, end_date) as naive UTC datetimes.
+
+    Raises:
+        AirflowException: If the ingestion mode is unknown or a backfill has no start.
+    """
+    conf = _run_conf(kwargs)
+    mode = conf.get('mode', kwargs.get('ingestion_mode', 'full'))
+    if mode not in INGESTION_MODES:
+        raise AirflowException(f"Unknown ingestion mode: {mode}")
+
+    if mode == 'backfill':
+        if 'start' not in conf:
+            raise AirflowException("Backfill runs need a 'start' in the DAG run conf.")
+        start_date = parse_utc(conf['start'])
+        end_date = parse_utc(conf['end']) if conf.get('end') else datetime.utcnow()
+        logger.info(f"Backfilling observations from {start_date} to {end_date}.")
+        return {station_id: (start_date, end_date) for station_id in station_ids}
+
+    end_date = datetime.utcnow()
+    watermarks = {}
+    if mode == 'incremental':
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                watermarks = load_watermarks(cursor, station_ids)
+        logger.info(f"Found high-watermarks for {len(watermarks)} of {len(station_ids)} stations.")
+
+    return observation_windows(
+        station_ids,
+        end_date,
+        timedelta(days=kwargs.get('start_date_offset', 7)),
+        watermarks=watermarks,
+        overlap=timedelta(hours=kwargs.get('watermark_overlap_hours', 0)),
+    )
+
+
+@task_metrics
+def plan_shards(**kwargs):
+    """
+    Selects the stations of the run and splits them into shards for the mapped ingest_shard task.
+
+    Args:
+        **kwargs: Airflow context variables, including:
+            - number_of_stations (int): Number of stations to fetch observations for.
+            - shard_size (int): Maximum number of stations per shard.
+
+    Returns:
+        list: One `[shard]` argument list per shard, expanded into the op_args of ingest_shard.
+    """
+    store = get_intermediate_store()
+    stations_manifest = kwargs['ti'].xcom_pull(key='stations', task_ids='fetch_stations')
+
+    # Limit to the specified number of stations
+    number_of_stations = kwargs.get('number_of_stations', 1)
+    station_ids = [StationRecord._make(station).station_id
+                   for station in islice(store.read(stations_manifest), number_of_stations)]
+    shards = split_shards(station_ids, kwargs.get('shard_size', SHARD_SIZE))
+    logger.info(f"Split {len(station_ids)} stations into {len(shards)} shards.")
+    # Pushed separately so report_shards can tell which shards did not complete
+    kwargs['ti'].xcom_push(key='shards', value=shards)
+    return [[shard] for shard in shards]
+
+
+def _failed_stations(failures, station_ids):
+    """
+    Logs the stations whose observations could not be fetched and returns them as
+    {'station_id', 'error'} dicts.
+
+    Raises:
+        AirflowException: If every station failed.
+    """
+    failed_stations = []
+    for station_id, error in failures:
+        if isinstance(error, requests.Timeout):
+            logger.error(f"Request to fetch observations for {station_id} timed out.")
+        elif isinstance(error, requests.ConnectionError):
+            logger.error(f"Connection error occurred while fetching observations for {station_id}.")
+        else:
+            logger.error(f"Error fetching observations for station {station_id}: {error}")
+        failed_stations.append({'station_id': station_id, 'error': str(error)})
+
+    if failed_stations:
+        logger.warning(f"Failed to fetch observations for {len(failed_stations)} of {len(station_ids)} stations.")
+        if len(failed_stations) == len(station_ids):
+            raise AirflowException("Failed to fetch observations for every selected station.")
+    return failed_stations
+
+
+def _observation_params(windows, station_id):
+    """
+    Returns the URL and query parameters requesting the observation window of a station.
+    """
+    start_date, end_date = windows[station_id]
+    return f'{STATIONS_ENDPOINT}/{station_id}/observations', {
+        'start': start_date.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'end': end_date.strftime('%Y-%m-%dT%H:%M:%SZ')
+    }
+
+
+# Function to fetch observations for specific stations
+@timed('fetch_observations')
+def fetch_observations(station_ids, dataset='observations', **kwargs):
+    """
+    Fetches weather observations for specific stations and writes them to the intermediate store.
+
+    Stations are fetched concurrently over a shared pooled session, which paces requests to
+    `rate_limit` per second and retries throttled, failed and timed out requests with backoff
+    (see utils.resilience). Every page of each station's observations is projected onto
+    ObservationRecords and streamed to run-scoped chunks of `dataset`. A station that fails is
+    logged and reported instead of aborting the run.
+
+    The requested window depends on the ingestion mode:
+        - 'full': the last `start_date_offset` days for every station.
+        - 'incremental': from each station's latest stored observation minus
+          `watermark_overlap_hours`, capped to the last `start_date_offset` days.
+        - 'backfill': the `start`/`end` range given in the DAG run conf, e.g.
+          {"mode": "backfill", "start": "2024-01-01T00:00:00Z", "end": "2024-02-01T00:00:00Z"}.
+    A `mode` in the DAG run conf overrides `ingestion_mode`.
+
+    Args:
+        station_ids (list): Identifiers of the stations to fetch.
+        dataset (str): Intermediate store dataset the observations are written to.
+        **kwargs: Airflow context variables, including:
+            - start_date_offset (int): Number of days to look back for observations.
+            - max_concurrency (int): Maximum number of stations fetched at the same time.
+            - rate_limit (float): Maximum number of API requests per second across all stations.
+            - ingestion_mode (str): One of 'full', 'incremental' or 'backfill'.
+            - watermark_overlap_hours (int): Overlap before the watermark in incremental mode.
+
+    Returns:
+        tuple: (manifest, failed_stations) where manifest lists the written chunks and
+            failed_stations holds a {'station_id', 'error'} dict per failed station.
+
+    Raises:
+        AirflowException: If the observations could not be fetched for any of the stations.
+    """
+    store = get_intermediate_store()
+    max_concurrency = kwargs.get('max_concurrency', 1)
+
+    windows = _observation_windows(station_ids, kwargs)
+    logger.info(f"Fetching observations for {len(station_ids)} stations "
+                f"with up to {max_concurrency} concurrent requests.")
+
+    session = create_session(pool_size=max_concurrency, rate_limit=kwargs.get('rate_limit', API_RATE_LIMIT))
+    writer = store.open_writer(kwargs.get('run_id', 'manual'), dataset)
+
+    def fetch_station_observations(station_id):
+        url, params = _observation_params(windows, station_id)
+        count = 0
+        for page in iter_pages(session, url, params=params, project=project_observation):
+            writer.write_all(page)
+            count += len(page)
+        ROWS.inc(count, outcome='fetched')
+        logger.info(f"Fetched {count} observations for station {station_id} from {params['start']} to {params['end']}.")
+        return count
+
+    try:
+        results, failures = fetch_concurrently(fetch_station_observations, station_ids, max_concurrency)
+        logger.info(f"API requests: {session.stats()}")
+    finally:
+        session.close()
+
+    failed_stations = _failed_stations(failures, station_ids)
+    return writer.close(), failed_stations
+
+
+@timed('insert_data')
+def insert_data(observations_manifest, **kwargs):
+    """
+    Inserts weather observation data into the PostgreSQL database.
+
+    Observations are streamed from the intermediate store chunks listed in the manifest
+    and transformed into columnar batches (see utils.transform) before being loaded.
+
+    Args:
+        observations_manifest (dict): Manifest returned by `fetch_observations`.
+        **kwargs: Airflow context variables, including:
+            - batch_size (int): Number of records to insert in each batch.
+            - transform_batch_size (int): Number of observations transformed at a time.
+            - load_strategy (str): How rows are sent to the database, one of 'executemany',
+              'execute_values' or 'copy' (see utils.loaders.load_observations).
+
+    Returns:
+        tuple: (loaded, touched_ranges) with the number of rows inserted and the time range
+            loaded for each station as built by `TouchedRanges.to_list`.
+
+    Raises:
+        Exception: If there is an error during database operations; the transaction is rolled back.
+    """
+    logger.info(f"Preparing to insert {observations_manifest['count']} observations.")
+    store = get_intermediate_store()
+
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            # Station keys are resolved from the in-process registry instead of per row
+            station_registry = get_station_registry()
+            station_registry.load(cursor)
+
+            touched_ranges = TouchedRanges()
+            batches = touched_ranges.track_batches(iter_observation_batches(
+                store.read(observations_manifest),
+                station_registry,
+                batch_size=kwargs.get('transform_batch_size', 10000),
+            ))
+            loaded = load_observation_batches(
+                cursor,
+                batches,
+                strategy=kwargs.get('load_strategy', 'executemany'),
+                batch_size=kwargs.get('batch_size', 500),
+            )
+
+            if loaded:
+                bump_data_version(cursor)
+            with COMMIT_SECONDS.time(stage='insert_data'):
+                conn.commit()
+    except Exception as e:
+        # Uncommitted work is rolled back when the connection goes back to the pool
+        logger.error(f"Database operation error: {e}")
+        raise
+    logger.info(f"Inserted {loaded} observations.")
+    return loaded, touched_ranges.to_list()
+
+
+def _commit_data_version():
+    """
+    Bumps the data version in a transaction of its own.
+    """
+    with db_connection() as conn, conn.cursor() as cursor:
+        bump_data_version(cursor)
+        conn.commit()
+
+
+@timed('stream_observations')
+def stream_observations(station_ids, **kwargs):
+    """
+    Fetches, transforms and loads the observations of stations as overlapping stages.
+
+    Producer threads fetch station pages as in `fetch_observations`, a transformer thread
+    builds columnar batches as in `insert_data` and the loader commits every batch as soon as
+    it is ready, so the network is not idle while Postgres writes. The data version is bumped
+    once, after the last batch, when rows were inserted. The stages are connected by
+    bounded queues (see utils.pipeline.run_pipeline), which keeps memory bounded whatever the
+    number of stations: producers wait while `page_queue_size` pages are pending.
+
+    Args:
+        station_ids (list): Identifiers of the stations to ingest.
+        **kwargs: Airflow context variables, as for fetch_observations and insert_data, and:
+            - page_queue_size (int): Pages held between the fetch and transform stages.
+            - batch_queue_size (int): Batches held between the transform and load stages.
+
+    Returns:
+        tuple: (fetched, loaded, failed_stations, touched_ranges, stats) where stats holds the
+            depth of each queue and the busy and idle seconds of each stage.
+
+    Raises:
+        AirflowException: If the observations could not be fetched for any of the stations.
+        Exception: If a batch cannot be loaded; batches committed before are kept.
+    """
+    max_concurrency = kwargs.get('max_concurrency', 1)
+    windows = _observation_windows(station_ids, kwargs)
+    logger.info(f"Streaming observations for {len(station_ids)} stations "
+                f"with up to {max_concurrency} concurrent requests.")
+
+    session = create_session(pool_size=max_concurrency, rate_limit=kwargs.get('rate_limit', API_RATE_LIMIT))
+
+    def fetch_station_pages(station_id, emit):
+        url, params = _observation_params(windows, station_id)
+        count = 0
+        for page in iter_pages(session, url, params=params, project=project_observation):
+            emit(page)
+            count += len(page)
+        ROWS.inc(count, outcome='fetched')
+        logger.info(f"Fetched {count} observations for station {station_id} from {params['start']} to {params['end']}.")
+        return count
+
+    touched_ranges = TouchedRanges()
+    loaded = 0
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            station_registry = get_station_registry()
+            station_registry.load(cursor)
+
+            def transform(records):
+                return touched_ranges.track_batches(iter_observation_batches(
+                    records, station_registry, batch_size=kwargs.get('transform_batch_size', 10000)))
+
+            def load(batch):
+                nonlocal loaded
+                count = load_observation_batches(cursor, [batch], strategy=kwargs.get('load_strategy', 'executemany'),
+                                                 batch_size=kwargs.get('batch_size', 500))
+                with COMMIT_SECONDS.time(stage='stream_observations'):
+                    conn.commit()
+                loaded += count
+
+            results, failures, stats = run_pipeline(
+                fetch_station_pages, station_ids, transform, load,
+                max_concurrency=max_concurrency,
+                page_queue_size=kwargs.get('page_queue_size'),
+                batch_queue_size=kwargs.get('batch_queue_size', 2),
+            )
+    except Exception:
+        # The batches committed before the failure changed the data too
+        if loaded:
+            try:
+                _commit_data_version()
+            except Exception as e:
+                logger.error(f"Could not bump the data version: {e}")
+        raise
+    finally:
+        session.close()
+    # Once per shard rather than per batch, so the app's query cache is not flushed over and
+    # over while the shard loads
+    if loaded:
+        _commit_data_version()
+
+    logger.info(f"Pipeline stages: {stats['stages']}, queues: {stats['queues']}")
+    failed_stations = _failed_stations(failures, station_ids)
+    fetched = sum(count for _, count in results)
+    logger.info(f"Inserted {loaded} of {fetched} fetched observations.")
+    return fetched, loaded, failed_stations, touched_ranges.to_list(), stats
+
+
+@task_metrics
+def ingest_shard(shard, **kwargs):
+    """
+    Fetches and loads the observations of one shard of stations; mapped once per shard.
+
+    Each shard writes its own intermediate store dataset, so a retried shard replaces only
+    what its previous attempt wrote, and loading is idempotent.
+
+    With `pipelined`, the shard is ingested by `stream_observations` instead, which overlaps
+    the stages; 'fetch_seconds' is then the wall time of the whole pipeline and 'load_seconds'
+    the time the loader was busy, and the summary also holds the pipeline statistics.
+
+    Args:
+        shard (dict): Shard planned by plan_shards, {'index': n, 'station_ids': [...]}.
+        **kwargs: Airflow context variables, passed on to fetch_observations and insert_data, and:
+            - pipelined (bool): Whether to overlap fetching, transforming and loading.
+
+    Returns:
+        dict: Summary of the shard: station, fetched and loaded counts, failed stations, the
+            seconds spent fetching and loading, and the touched ranges for update_rollups.
+    """
+    logger.info(f"Ingesting shard {shard['index']} of {len(shard['station_ids'])} stations.")
+    summary = {'index': shard['index'], 'stations': len(shard['station_ids'])}
+    started = time.perf_counter()
+    if kwargs.get('pipelined'):
+        fetched, loaded, failed_stations, touched_ranges, stats = stream_observations(shard['station_ids'], **kwargs)
+        return dict(summary, fetched=fetched, loaded=loaded, failed_stations=failed_stations,
+                    fetch_seconds=stats['seconds'], load_seconds=stats['stages']['load']['busy_seconds'],
+                    touched_ranges=touched_ranges, pipeline=stats)
+
+    manifest, failed_stations = fetch_observations(shard['station_ids'], dataset=f"observations-{shard['index']:04d}",
+                                                   **kwargs)
+    fetched_at = time.perf_counter()
+    loaded, touched_ranges = insert_data(manifest, **kwargs)
+    return dict(summary, fetched=manifest['count'], loaded=loaded, failed_stations=failed_stations,
+                fetch_seconds=round(fetched_at - started, 3), load_seconds=round(time.perf_counter() - fetched_at, 3),
+                touched_ranges=touched_ranges)
+
+
+def _shard_summaries(kwargs):
+    """
+    Returns the summaries of the ingest_shard instances that succeeded.
+    """
+    return [summary for summary in kwargs['ti'].xcom_pull(task_ids='ingest_shard') or [] if summary]
+
+
+@task_metrics
+def update_rollups(**kwargs):
+    """
+    Refreshes the hourly and daily rollup tables for the time buckets loaded by the shards.
+
+    Runs once every shard is done, whether it succeeded or not, so the buckets loaded by the
+    shards that succeeded are refreshed either way.
+
+    Args:
+        **kwargs: Airflow context variables.
+
+    Raises:
+        Exception: If the refresh fails; the transaction is rolled back.
+    """
+    touched_ranges = TouchedRanges()
+    for summary in _shard_summaries(kwargs):
+        touched_ranges.extend(summary['touched_ranges'])
+    logger.info(f"Refreshing rollups for {len(touched_ranges)} stations.")
+
+    if not touched_ranges:
+        return
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            refresh_rollups(cursor, touched_ranges.to_list())
+            # The app reads the rollups, so cached results are only current once they are refreshed
+            bump_data_version(cursor)
+        conn.commit()
+
+
+@task_metrics
+def report_shards(**kwargs):
+    """
+    Reports the row counts and timings of every shard of the run.
+
+    Args:
+        **kwargs: Airflow context variables.
+
+    Returns:
+        dict: The report built by `summarize_shards`, without the touched ranges.
+
+    Raises:
+        AirflowException: If the shards were never planned or a shard did not complete, so the
+            run is marked as failed.
+    """
+    shards = kwargs['ti'].xcom_pull(key='shards', task_ids='plan_shards')
+    if shards is None:
+        raise AirflowException("No shards were planned for the run.")
+    summaries = [{name: value for name, value in summary.items() if name != 'touched_ranges'}
+                 for summary in _shard_summaries(kwargs)]
+    report = summarize_shards(shards, summaries)
+
+    for summary in report['shards']:
+        logger.info(f"Shard {summary['index']}: {summary['stations']} stations, {summary['fetched']} fetched, "
+                    f"{summary['loaded']} loaded, {len(summary['failed_stations'])} failed stations, "
+                    f"fetch {summary['fetch_seconds']:.1f}s, load {summary['load_seconds']:.1f}s.")
+    totals = report['totals']
+    logger.info(f"{len(report['shards'])} of {len(shards)} shards completed: {totals['fetched']} observations "
+                f"fetched and {totals['loaded']} loaded for {totals['stations']} stations.")
+
+    # Failed stations are reported under the same key as before sharding
+    kwargs['ti'].xcom_push(key='failed_stations',
+                           value=[failure for summary in report['shards'] for failure in summary['failed_stations']])
+    if report['missing_shards']:
+        raise AirflowException(f"Shards {report['missing_shards']} did not complete.")
+    return report
+
+
+@task_metrics
+def cleanup_intermediate(**kwargs):
+    """
+    Deletes the intermediate store data of the run once every task reading it is done.
+
+    Runs whether the shards succeeded or not, so failed runs do not leave their station
+    catalogue and observations behind. A shard cleared afterwards fetches its observations
+    again, so it does not need them.
+
+    Args:
+        **kwargs: Airflow context variables.
+    """
+    run_id = kwargs.get('run_id', 'manual')
+    get_intermediate_store().delete_run(run_id)
+    logger.info(f"Deleted the intermediate data of run {run_id}.")
+
+
+@task_metrics
+def archive_history(**kwargs):
+    """
+    Exports closed months of weather_observations to the Parquet archive and optionally prunes them.
+
+    A month is archived once it ended `archive_after_months` months ago. Without pruning each
+    month is exported once. With pruning, the month's partition and rollups are dropped after
+    the archive was checked to hold at least the exported rows; if a backfill later recreates
+    the partition, the month is exported again and merged into the archive.
+
+    Args:
+        **kwargs: Airflow context variables, including:
+            - archive_after_months (int): Months after which a month is archived.
+            - prune (bool): Whether archived months are removed from Postgres.
+
+    Returns:
+        list: The archived months, as 'YYYY-MM'.
+
+    Raises:
+        AirflowException: If the archive holds fewer rows than were exported for a month to prune.
+    """
+    archive = get_observation_archive()
+    prune = kwargs.get('prune', False)
+    cutoff = add_months(month_start(datetime.utcnow()), -kwargs.get('archive_after_months', 3))
+    archived = []
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            months = sorted(month for month in list_partitions(cursor).values() if add_months(month, 1) <= cutoff)
+        for month in months:
+            if archive.is_archived(month) and not prune:
+                continue
+            with conn.cursor() as cursor:
+                if prune:
+                    lock_partition(cursor, month)
+            # A server-side cursor streams the month instead of holding it in memory
+            with conn.cursor(name=f'archive_{month:%Y%m}') as export_cursor:
+                exported = archive.export_month(export_cursor, month)
+            if prune:
+                stored = archive.count_rows(start=month, end=add_months(month, 1))
+                if stored < exported:
+                    conn.rollback()
+                    raise AirflowException(f"The archive holds {stored} of the {exported} rows exported for "
+                                           f"{month:%Y-%m}; not pruning it.")
+                with conn.cursor() as cursor:
+                    prune_month(cursor, month)
+                    bump_data_version(cursor)
+            conn.commit()
+            archived.append(f'{month:%Y-%m}')
+    logger.info(f"Archived {len(archived)} months{' and pruned them' if prune and archived else ''}.")
+    return archived
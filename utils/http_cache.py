@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from utils.config import HTTP_CACHE_MAX_AGE, HTTP_CACHE_MAX_SIZE, HTTP_CACHE_PATH
+
+
+logger = logging.getLogger(__name__)
+
+# Response headers kept with a cached body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class HTTPCache:
+    """
+    Persistent on-disk cache of successful GET responses, keyed by the full request URL.
+
+    Each entry is a body file with a JSON metadata file next to it holding the validators
+    (ETag, Last-Modified) the server sent and when the entry was last validated and used.
+    When the cache grows beyond `max_size` bytes, the least recently used entries are removed.
+
+    Layout: <path>/<sha256 of the URL>.body and <path>/<sha256 of the URL>.json
+    """
+
+    def __init__(self, path=HTTP_CACHE_PATH, max_age=HTTP_CACHE_MAX_AGE, max_size=HTTP_CACHE_MAX_SIZE,
+                 clock=time.time):
+        self.path = path
+        self.max_age = max_age
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _entry_path(self, url, suffix):
+        return os.path.join(self.path, hashlib.sha256(url.encode()).hexdigest() + suffix)
+
+    def lookup(self, url):
+        """
+        Returns the (metadata, body) cached for `url`, or None.
+        """
+        try:
+            with open(self._entry_path(url, '.json')) as meta_file:
+                meta = json.load(meta_file)
+            with open(self._entry_path(url, '.body'), 'rb') as body_file:
+                body = body_file.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or meta.get('size') != len(body):
+            return None
+        return meta, body
+
+    def is_fresh(self, meta):
+        """
+        Tells whether an entry can be served without asking the server, i.e. it was
+        validated less than `max_age` seconds ago.
+        """
+        return self._clock() - meta['validated_at'] < self.max_age
+
+    def store(self, url, headers, body):
+        """
+        Stores the body and validators of a 200 response, then evicts entries beyond `max_size`.
+        """
+        if len(body) > self.max_size:
+            return
+        now = self._clock()
+        meta = {
+            'url': url,
+            'headers': {name: headers[name] for name in STORED_HEADERS if name in headers},
+            'size': len(body),
+            'validated_at': now,
+            'used_at': now,
+        }
+        with self._lock:
+            self._write(self._entry_path(url, '.body'), body)
+            self._write(self._entry_path(url, '.json'), json.dumps(meta).encode())
+            self._evict()
+
+    def touch(self, url, meta, validated):
+        """
+        Records that an entry was served, and revalidated by a 304 response when `validated`.
+        """
+        now = self._clock()
+        meta['used_at'] = now
+        if validated:
+            meta['validated_at'] = now
+        with self._lock:
+            self._write(self._entry_path(url, '.json'), json.dumps(meta).encode())
+
+    def size(self):
+        return sum(meta['size'] for _, meta in self._entries())
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.path):
+                if name.endswith(('.body', '.json')):
+                    os.remove(os.path.join(self.path, name))
+
+    def _write(self, path, data):
+        # Written to a temporary file and renamed, so concurrent readers never see a partial entry
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as output:
+            output.write(data)
+        os.replace(temporary, path)
+
+    def _entries(self):
+        for name in os.listdir(self.path):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.path, name)) as meta_file:
+                    yield name[:-len('.json')], json.load(meta_file)
+            except (OSError, ValueError):
+                continue
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1]['used_at'])
+        total = sum(meta['size'] for _, meta in entries)
+        for key, meta in entries:
+            if total <= self.max_size:
+                break
+            for suffix in ('.json', '.body'):
+                try:
+                    os.remove(os.path.join(self.path, key + suffix))
+                except FileNotFoundError:
+                    pass
+            total -= meta['size']
+            logger.info(f"Evicted {meta['url']} from the HTTP cache.")
+
+
+class CachingAdapter(HTTPAdapter):
+    """
+    Transport adapter that serves GET requests through an HTTPCache.
+
+    Fresh entries are returned without a request. Stale entries are revalidated by sending
+    `If-None-Match`/`If-Modified-Since` with their validators; a `304 Not Modified` is then
+    answered from the cache. Responses served from the cache have status 200 and a
+    `from_cache` attribute set to True.
+    """
+
+    def __init__(self, cache, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+
+        url = request.url
+        cached = self.cache.lookup(url)
+        if cached is not None:
+            meta, body = cached
+            if self.cache.is_fresh(meta):
+                self.cache.touch(url, meta, validated=False)
+                self.hits += 1
+                return self._cached_response(request, meta, body)
+            validators = meta['headers']
+            if 'ETag' in validators:
+                request.headers['If-None-Match'] = validators['ETag']
+            if 'Last-Modified' in validators:
+                request.headers['If-Modified-Since'] = validators['Last-Modified']
+
+        response = super().send(request, **kwargs)
+        response.from_cache = False
+        if response.status_code == 304 and cached is not None:
+            response.close()
+            meta, body = cached
+            self.cache.touch(url, meta, validated=True)
+            self.revalidations += 1
+            return self._cached_response(request, meta, body)
+        self.misses += 1
+        if response.status_code == 200:
+            self.cache.store(url, response.headers, response.content)
+        return response
+
+    def _cached_response(self, request, meta, body):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = body
+        response.from_cache = True
+        return response
+
+    def stats(self):
+        return {'hits': self.hits, 'revalidations': self.revalidations, 'misses': self.misses}
+
+
+def get_http_cache(path=HTTP_CACHE_PATH):
+    """
+    Returns the on-disk HTTP cache stored under `path`.
+    """
+    return HTTPCache(path)
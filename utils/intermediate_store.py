@@ -0,0 +1,168 @@
+from abc import ABC, abstractmethod
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+
+from utils.config import INTERMEDIATE_CHUNK_SIZE, INTERMEDIATE_STORE_BACKEND, INTERMEDIATE_STORE_PATH
+
+
+logger = logging.getLogger(__name__)
+
+
+class IntermediateStore(ABC):
+    """
+    Base class for the stores that hold bulk task data between DAG tasks.
+
+    Tasks write records through a writer and hand the resulting manifest to downstream
+    tasks over XCom, so only chunk locations go through the Airflow metadata database.
+    The cleanup_intermediate task deletes the data of a run once its tasks are done.
+    """
+
+    backend = None
+
+    @abstractmethod
+    def open_writer(self, run_id, dataset, chunk_size=INTERMEDIATE_CHUNK_SIZE):
+        pass
+
+    @abstractmethod
+    def read(self, manifest):
+        pass
+
+    @abstractmethod
+    def delete_run(self, run_id):
+        pass
+
+
+class LocalFileStore(IntermediateStore):
+    """
+    Stores run-scoped datasets as gzip-compressed NDJSON chunks on the local filesystem.
+
+    Layout: <base_path>/<run_id>/<dataset>/part-<n>.ndjson.gz
+    """
+
+    backend = 'local'
+
+    def __init__(self, base_path=INTERMEDIATE_STORE_PATH):
+        self.base_path = base_path
+
+    def run_path(self, run_id):
+        return os.path.join(self.base_path, re.sub(r'[^A-Za-z0-9_.-]', '_', run_id))
+
+    def open_writer(self, run_id, dataset, chunk_size=INTERMEDIATE_CHUNK_SIZE):
+        """
+        Opens a writer for a dataset of a run, replacing what a previous attempt left behind.
+
+        Args:
+            run_id (str): Airflow run id the dataset belongs to.
+            dataset (str): Name of the dataset, e.g. 'stations' or 'observations'.
+            chunk_size (int): Number of records written to each chunk.
+
+        Returns:
+            ChunkWriter: Writer for the dataset.
+        """
+        directory = os.path.join(self.run_path(run_id), dataset)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        return ChunkWriter(self.backend, directory, dataset, chunk_size)
+
+    def read(self, manifest):
+        """
+        Streams the records of a dataset back, one chunk at a time.
+
+        Args:
+            manifest (dict): Manifest returned by `ChunkWriter.close`.
+
+        Yields:
+            The records in the order they were written.
+        """
+        for path in manifest['chunks']:
+            with gzip.open(path, 'rt', encoding='utf-8') as chunk:
+                for line in chunk:
+                    yield json.loads(line)
+
+    def delete_run(self, run_id):
+        """
+        Removes every dataset stored for a run.
+        """
+        shutil.rmtree(self.run_path(run_id), ignore_errors=True)
+
+
+class ChunkWriter:
+    """
+    Thread-safe writer that appends records to compressed NDJSON chunks of a dataset.
+
+    Each chunk is written to a temporary file and renamed once complete, so a manifest
+    never references a partially written chunk.
+    """
+
+    def __init__(self, backend, directory, dataset, chunk_size):
+        self.backend = backend
+        self.directory = directory
+        self.dataset = dataset
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.chunks = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._path = None
+        self._records_in_chunk = 0
+
+    def write(self, record):
+        with self._lock:
+            if self._file is None:
+                self._path = os.path.join(self.directory, f'part-{len(self.chunks):05d}.ndjson.gz')
+                self._file = gzip.open(f'{self._path}.tmp', 'wt', encoding='utf-8')
+            self._file.write(json.dumps(record, separators=(',', ':')))
+            self._file.write('\n')
+            self.count += 1
+            self._records_in_chunk += 1
+            if self._records_in_chunk >= self.chunk_size:
+                self._close_chunk()
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+
+    def _close_chunk(self):
+        self._file.close()
+        os.replace(f'{self._path}.tmp', self._path)
+        self.chunks.append(self._path)
+        self._file = None
+        self._records_in_chunk = 0
+
+    def close(self):
+        """
+        Finishes the last chunk and returns the manifest describing the dataset.
+
+        Returns:
+            dict: Manifest with the backend, dataset name, chunk paths and record count.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._close_chunk()
+        logger.info(f"Wrote {self.count} {self.dataset} records in {len(self.chunks)} chunks.")
+        return {'backend': self.backend, 'dataset': self.dataset, 'chunks': list(self.chunks), 'count': self.count}
+
+
+STORE_BACKENDS = {
+    LocalFileStore.backend: LocalFileStore,
+}
+
+
+def get_intermediate_store(backend=INTERMEDIATE_STORE_BACKEND):
+    """
+    Returns the configured intermediate store.
+
+    Args:
+        backend (str): Name of the backend in STORE_BACKENDS.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"Unknown intermediate store backend: {backend}")
+    return STORE_BACKENDS[backend]()
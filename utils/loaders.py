@@ -0,0 +1,162 @@
+import csv
+import io
+import logging
+from itertools import chain, islice
+
+from psycopg2.extras import execute_values
+
+from utils.metrics import ROWS
+from utils.sql_queries_dag import (
+    COPY_OBSERVATION_STAGING_QUERY,
+    CREATE_OBSERVATION_STAGING_QUERY,
+    INSERT_OBSERVATION_QUERY,
+    INSERT_OBSERVATION_VALUES_QUERY,
+    MERGE_OBSERVATION_STAGING_QUERY,
+)
+
+
+logger = logging.getLogger(__name__)
+
+LOAD_STRATEGIES = ('executemany', 'execute_values', 'copy')
+
+# Written for None by CsvRowStream; COPY_OBSERVATION_STAGING_QUERY reads it back as NULL
+CSV_NULL = '\\N'
+
+
+def _count_rows(cursor, sent):
+    """
+    Records how many of the rows just sent were inserted and how many ON CONFLICT skipped.
+
+    Returns:
+        int: Number of rows inserted, or `sent` when the cursor does not report it.
+    """
+    inserted = cursor.rowcount
+    if not isinstance(inserted, int) or inserted < 0:
+        return sent
+    ROWS.inc(inserted, outcome='inserted')
+    ROWS.inc(sent - inserted, outcome='skipped')
+    return inserted
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class CsvRowStream:
+    """
+    File-like object that renders rows as CSV on demand for `cursor.copy_expert`.
+
+    Rows are pulled from the iterator only as COPY reads, so the load never holds more
+    than one read buffer of CSV text in memory. None values are written as CSV_NULL, the
+    NULL string of COPY_OBSERVATION_STAGING_QUERY, so empty strings stay empty strings as
+    with the other strategies. A string equal to CSV_NULL would be loaded as NULL.
+    """
+
+    def __init__(self, rows):
+        self.count = 0
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+
+    def read(self, size=-1):
+        while size < 0 or self._buffer.tell() < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow([CSV_NULL if value is None else value for value in row])
+            self.count += 1
+
+        data = self._buffer.getvalue()
+        if 0 <= size < len(data):
+            data, rest = data[:size], data[size:]
+        else:
+            rest = ''
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(rest)
+        return data
+
+
+def _load_executemany(cursor, rows, batch_size):
+    count = 0
+    for batch in _batches(rows, batch_size):
+        cursor.executemany(INSERT_OBSERVATION_QUERY, batch)
+        inserted = _count_rows(cursor, len(batch))
+        count += inserted
+        logger.info(f"Inserted {inserted} of {len(batch)} records into the database.")
+    return count
+
+
+def _load_execute_values(cursor, rows, batch_size):
+    count = 0
+    for batch in _batches(rows, batch_size):
+        # One page per batch, so rowcount covers the whole batch
+        execute_values(cursor, INSERT_OBSERVATION_VALUES_QUERY, batch, page_size=batch_size)
+        inserted = _count_rows(cursor, len(batch))
+        count += inserted
+        logger.info(f"Inserted {inserted} of {len(batch)} records into the database.")
+    return count
+
+
+def _load_copy(cursor, rows, batch_size):
+    cursor.execute(CREATE_OBSERVATION_STAGING_QUERY)
+    stream = CsvRowStream(rows)
+    cursor.copy_expert(COPY_OBSERVATION_STAGING_QUERY, stream, size=max(8192, batch_size * 128))
+    cursor.execute(MERGE_OBSERVATION_STAGING_QUERY)
+    inserted = _count_rows(cursor, stream.count)
+    logger.info(f"Copied {stream.count} records into the staging table and merged {inserted} new ones.")
+    return inserted
+
+
+_LOADERS = {
+    'executemany': _load_executemany,
+    'execute_values': _load_execute_values,
+    'copy': _load_copy,
+}
+
+
+def load_observations(cursor, rows, strategy='executemany', batch_size=500):
+    """
+    Loads observation rows into weather_observations, skipping rows that already exist.
+
+    The caller owns the transaction; nothing is committed here.
+
+    Args:
+        cursor: psycopg2 cursor of the connection to load through.
+        rows (iterable): Tuples in the column order of INSERT_OBSERVATION_QUERY.
+        strategy (str): One of LOAD_STRATEGIES:
+            - 'executemany': one INSERT round-trip per row, sent in batches.
+            - 'execute_values': one multi-row INSERT per batch.
+            - 'copy': COPY FROM STDIN into a temporary staging table, then a single
+              INSERT ... SELECT ... ON CONFLICT merge.
+        batch_size (int): Number of rows per batch (or the COPY read size hint).
+
+    Returns:
+        int: Number of rows inserted; rows that already existed are not counted, so 0 means
+            the table did not change.
+
+    Raises:
+        ValueError: If the strategy is unknown.
+    """
+    if strategy not in _LOADERS:
+        raise ValueError(f"Unknown load strategy: {strategy}")
+    return _LOADERS[strategy](cursor, rows, batch_size)
+
+
+def load_observation_batches(cursor, batches, strategy='executemany', batch_size=500):
+    """
+    Loads columnar observation batches (see utils.transform) into weather_observations.
+
+    Each batch is converted to rows in one pass and streamed through `load_observations`
+    with the same strategies and batch size.
+
+    Returns:
+        int: Number of rows inserted, as for `load_observations`.
+    """
+    return load_observations(cursor, chain.from_iterable(batch.rows() for batch in batches),
+                             strategy=strategy, batch_size=batch_size)
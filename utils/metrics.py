@@ -0,0 +1,345 @@
+import bisect
+import functools
+import logging
+import os
+import re
+import threading
+import time
+
+from utils.config import METRICS_ENABLED, METRICS_TEXTFILE_DIR, SLOW_QUERY_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the histogram buckets, from a fast HTTP request to a long task
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class _NullTimer:
+    """
+    Timer handed out while metrics are disabled; entering and leaving it does nothing.
+    """
+
+    __slots__ = ()
+    seconds = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_labels', '_started', 'seconds')
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+        self.seconds = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self._started
+        self._histogram.observe(self.seconds, **self._labels)
+        return False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """
+    Monotonic count, e.g. of rows, by label values.
+    """
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self, constant_labels=()):
+        names = tuple(name for name, _ in constant_labels) + self.labelnames
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(names, tuple(value for _, value in constant_labels) + key), value
+
+
+class Histogram(_Metric):
+    """
+    Distribution of durations in seconds, by label values, with cumulative buckets as in Prometheus.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not self._registry.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Counts per bucket (the last one is +Inf), sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """
+        Returns a context manager observing the seconds spent in its block; its `seconds` holds
+        them afterwards. While metrics are disabled it is a shared no-op.
+        """
+        if not self._registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def samples(self, constant_labels=()):
+        constant_names = tuple(name for name, _ in constant_labels)
+        constant_values = tuple(value for _, value in constant_labels)
+        names = constant_names + self.labelnames
+        with self._lock:
+            values = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(names + ('le',), constant_values + key + (_format_value(float(bound)),))
+                yield f'{self.name}_bucket', labels, cumulative
+            labels = _format_labels(names, constant_values + key)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics, rendered in the Prometheus text exposition format.
+
+    While `enabled` is False every recording call returns after checking the flag, and timers
+    are a shared no-op, so instrumented code costs next to nothing.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}.")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def clear(self):
+        """
+        Drops every recorded value, keeping the metrics registered.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self, constant_labels=None):
+        """
+        Renders every metric with recorded values in the Prometheus text exposition format.
+
+        Args:
+            constant_labels (dict): Labels added to every sample, e.g. the task that recorded them.
+
+        Returns:
+            str: The exposition text.
+        """
+        constant_labels = tuple(sorted((constant_labels or {}).items()))
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            samples = list(metric.samples(constant_labels))
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in samples)
+        return '\n'.join(lines) + '\n' if lines else ''
+
+    def write_textfile(self, path, constant_labels=None):
+        """
+        Writes the metrics to `path` for the node_exporter textfile collector.
+
+        The file is written under a temporary name and renamed, so the collector never reads
+        a partial file.
+        """
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as textfile:
+            textfile.write(self.render(constant_labels))
+        os.replace(tmp_path, path)
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    'weather_stage_duration_seconds', 'Wall time of DAG tasks and of the stages inside them.', ('stage',))
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'weather_http_request_duration_seconds', 'Latency of each weather.gov request attempt.', ('endpoint', 'status'))
+ROWS = metrics.counter(
+    'weather_rows_total', 'Observation rows fetched, inserted, or skipped by ON CONFLICT as already stored.',
+    ('outcome',))
+COMMIT_SECONDS = metrics.histogram(
+    'weather_commit_duration_seconds', 'Duration of the commits of loaded batches.', ('stage',))
+QUERY_SECONDS = metrics.histogram(
+    'weather_app_query_duration_seconds', 'Latency of the app queries that reach the database.', ('query',))
+
+_STATION_PATH = re.compile(r'/stations/[^/?]+')
+
+
+def endpoint(url):
+    """
+    Returns the path of a weather.gov URL with the station identifier replaced, so that every
+    station shares one label value, e.g. /stations/{station_id}/observations.
+    """
+    path = url.split('://', 1)[-1]
+    path = path[path.find('/'):] if '/' in path else '/'
+    return _STATION_PATH.sub('/stations/{station_id}', path.split('?', 1)[0])
+
+
+def timed(stage):
+    """
+    Decorator recording the wall time of every call of the function under STAGE_SECONDS.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            with STAGE_SECONDS.time(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def task_metrics(func):
+    """
+    Decorator for Airflow task callables: times the task like `timed` and, when
+    METRICS_TEXTFILE_DIR is set, writes the metrics recorded by the task process to
+    weather_pipeline_<task_id>[_<map_index>].prom, labelled with the task and map index.
+    """
+    timed_func = timed(func.__name__)(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not metrics.enabled:
+            return func(*args, **kwargs)
+        try:
+            return timed_func(*args, **kwargs)
+        finally:
+            if METRICS_TEXTFILE_DIR:
+                export_task_metrics(kwargs.get('ti'), func.__name__)
+    return wrapper
+
+
+def export_task_metrics(ti, default_task_id):
+    task_id = getattr(ti, 'task_id', None) or default_task_id
+    map_index = getattr(ti, 'map_index', -1)
+    map_index = map_index if isinstance(map_index, int) else -1
+    name = f'weather_pipeline_{task_id}' + (f'_{map_index}' if map_index >= 0 else '')
+    try:
+        metrics.write_textfile(os.path.join(METRICS_TEXTFILE_DIR, f'{name}.prom'),
+                               {'task': task_id, 'map_index': map_index})
+    except OSError as e:
+        logger.warning(f"Could not write the metrics textfile {name}.prom: {e}")
+
+
+class timed_query:
+    """
+    Context manager timing an app query under QUERY_SECONDS and logging it when it takes
+    longer than `slow_seconds`.
+
+    The query is timed even while metrics are disabled, so slow queries are always logged;
+    next to a database round trip, reading the clock twice costs nothing.
+    """
+
+    __slots__ = ('name', 'params', 'slow_seconds', '_started')
+
+    def __init__(self, name, params=None, slow_seconds=SLOW_QUERY_SECONDS):
+        self.name = name
+        self.params = params
+        self.slow_seconds = slow_seconds
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._started
+        QUERY_SECONDS.observe(seconds, query=self.name)
+        if self.slow_seconds is not None and seconds >= self.slow_seconds:
+            logger.warning(f"Slow query {self.name} took {seconds:.3f}s (params={self.params!r}).")
+        return False
@@ -0,0 +1,117 @@
+import logging
+import re
+from datetime import datetime
+
+from psycopg2 import sql
+
+from utils.rollups import delete_rollups
+from utils.sql_queries_dag import CREATE_PARTITION_QUERY, DROP_PARTITION_QUERY, LIST_PARTITIONS_QUERY
+
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = 'weather_observations'
+_PARTITION_NAME = re.compile(rf'^{PARTITIONED_TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def month_start(value):
+    """
+    Returns the first instant of the month containing `value`.
+    """
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    """
+    Returns the first instant of the month `months` months after the month of `value`.
+    """
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """
+    Returns the name of the monthly partition holding `month`, e.g. weather_observations_y2024m01.
+    """
+    return f'{PARTITIONED_TABLE}_y{month.year:04d}m{month.month:02d}'
+
+
+def partition_months(start, end):
+    """
+    Returns the first day of every month between the months of `start` and `end`, inclusive.
+    """
+    months = []
+    month = month_start(start)
+    while month <= end:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def ensure_partitions(cursor, start, end):
+    """
+    Creates the monthly partitions covering [start, end] that do not exist yet.
+
+    The caller owns the transaction.
+
+    Args:
+        cursor: psycopg2 cursor.
+        start (datetime): Earliest timestamp that must be covered.
+        end (datetime): Latest timestamp that must be covered.
+
+    Returns:
+        list: Names of the partitions that were created.
+    """
+    existing = set(list_partitions(cursor))
+    created = []
+    for month in partition_months(start, end):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        cursor.execute(sql.SQL(CREATE_PARTITION_QUERY).format(partition=sql.Identifier(name)),
+                       (month, add_months(month, 1)))
+        created.append(name)
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+    return created
+
+
+def list_partitions(cursor):
+    """
+    Returns the monthly partitions of weather_observations by name, mapped to the month they hold.
+    """
+    cursor.execute(LIST_PARTITIONS_QUERY, (PARTITIONED_TABLE,))
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[name] = datetime(int(match.group(1)), int(match.group(2)), 1)
+    return partitions
+
+
+def drop_partitions_before(cursor, cutoff, droppable=None):
+    """
+    Drops the monthly partitions whose whole month lies before `cutoff`, with their rollup buckets.
+
+    Dropping a partition removes its rows without the table bloat and WAL volume of a DELETE.
+    The hourly and daily buckets of the month are deleted too, so the app does not report
+    observations that no longer exist. The caller owns the transaction.
+
+    Args:
+        cursor: psycopg2 cursor.
+        cutoff (datetime): Partitions ending on or before this instant are dropped.
+        droppable (callable): Called with the cursor and the month of each expired partition;
+            the partition is kept unless it returns True. None drops every expired partition.
+
+    Returns:
+        list: Names of the partitions that were dropped.
+    """
+    dropped = []
+    for name, month in sorted(list_partitions(cursor).items(), key=lambda item: item[1]):
+        if add_months(month, 1) <= cutoff and (droppable is None or droppable(cursor, month)):
+            cursor.execute(sql.SQL(DROP_PARTITION_QUERY).format(partition=sql.Identifier(name)))
+            delete_rollups(cursor, month, add_months(month, 1))
+            dropped.append(name)
+    if dropped:
+        logger.info(f"Dropped partitions: {', '.join(dropped)}")
+    return dropped
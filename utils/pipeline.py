@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+
+from utils.api_client import fetch_concurrently
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class PipelineAborted(Exception):
+    """
+    Raised in a stage blocked on a queue whose consumer or producer stopped on an error.
+    """
+
+
+class MeteredQueue:
+    """
+    Bounded queue between two pipeline stages.
+
+    A full queue blocks its producers, which keeps the memory held between the stages bounded.
+    The queue records its depth after each put and the seconds producers spent blocked on a
+    full queue (backpressure) and consumers spent waiting on an empty one (idle time).
+    """
+
+    def __init__(self, maxsize, poll_interval=0.1):
+        self._queue = queue.Queue(maxsize)
+        self._poll_interval = poll_interval
+        self._aborted = threading.Event()
+        self._lock = threading.Lock()
+        self.maxsize = maxsize
+        self._items = 0
+        self._max_depth = 0
+        self._depth_total = 0
+        self._put_wait = 0.0
+        self._get_wait = 0.0
+
+    def put(self, item):
+        started = time.perf_counter()
+        while True:
+            if self._aborted.is_set():
+                raise PipelineAborted()
+            try:
+                self._queue.put(item, timeout=self._poll_interval)
+                break
+            except queue.Full:
+                continue
+        waited = time.perf_counter() - started
+        depth = self._queue.qsize()
+        with self._lock:
+            self._put_wait += waited
+            if item is not _DONE:
+                self._items += 1
+                self._max_depth = max(self._max_depth, depth)
+                self._depth_total += depth
+
+    def get(self):
+        started = time.perf_counter()
+        while True:
+            if self._aborted.is_set():
+                raise PipelineAborted()
+            try:
+                item = self._queue.get(timeout=self._poll_interval)
+                break
+            except queue.Empty:
+                continue
+        with self._lock:
+            self._get_wait += time.perf_counter() - started
+        return item
+
+    def __iter__(self):
+        """
+        Yields items until the producer marks the end of its output.
+        """
+        while True:
+            item = self.get()
+            if item is _DONE:
+                return
+            yield item
+
+    def close(self):
+        self.put(_DONE)
+
+    def abort(self):
+        """
+        Unblocks every stage waiting on the queue with PipelineAborted.
+        """
+        self._aborted.set()
+
+    @property
+    def aborted(self):
+        return self._aborted.is_set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'items': self._items,
+                'maxsize': self.maxsize,
+                'max_depth': self._max_depth,
+                'mean_depth': round(self._depth_total / self._items, 2) if self._items else 0.0,
+                'producer_wait_seconds': round(self._put_wait, 3),
+                'consumer_wait_seconds': round(self._get_wait, 3),
+            }
+
+
+def run_pipeline(fetch, items, transform, load, max_concurrency=1, page_queue_size=None, batch_queue_size=2):
+    """
+    Runs fetch, transform and load as concurrent stages connected by bounded queues.
+
+    Up to `max_concurrency` producer threads call `fetch(item, emit)` for every item; `fetch`
+    passes each page it downloads to `emit` and returns a count. A transformer thread turns
+    the stream of records of those pages into batches with `transform(records)`, and the
+    calling thread passes every batch to `load(batch)` as soon as it is ready. As in
+    `fetch_concurrently`, an item whose fetch fails is reported instead of stopping the others.
+    An error in the transformer or the loader stops every stage and is raised.
+
+    Args:
+        fetch (callable): Called as `fetch(item, emit)` for each item.
+        items (iterable): Items to fetch, e.g. station identifiers.
+        transform (callable): Maps an iterable of records to an iterable of batches.
+        load (callable): Called with each batch, in the calling thread.
+        max_concurrency (int): Maximum number of items fetched at the same time.
+        page_queue_size (int): Pages held between fetch and transform; defaults to 2 per producer.
+        batch_queue_size (int): Batches held between transform and load.
+
+    Returns:
+        tuple: (results, failures, stats) where results and failures are as returned by
+            `fetch_concurrently` and stats holds the queue statistics and the busy and idle
+            seconds of each stage.
+    """
+    pages = MeteredQueue(page_queue_size or 2 * max(1, max_concurrency))
+    batches = MeteredQueue(batch_queue_size)
+    outcome = {}
+    busy = {'transform': 0.0, 'load': 0.0}
+
+    def fetch_item(item):
+        if pages.aborted:
+            raise PipelineAborted()
+        return fetch(item, pages.put)
+
+    def produce():
+        try:
+            outcome['fetch'] = fetch_concurrently(fetch_item, items, max_concurrency)
+            pages.close()
+        except PipelineAborted:
+            pass
+
+    def records():
+        for page in pages:
+            yield from page
+
+    def transform_stage():
+        try:
+            started = time.perf_counter()
+            for batch in transform(records()):
+                batches.put(batch)
+            busy['transform'] = time.perf_counter() - started
+            batches.close()
+        except PipelineAborted:
+            pass
+        except Exception as e:
+            outcome['transform_error'] = e
+            pages.abort()
+            batches.abort()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=produce, name='pipeline-fetch', daemon=True),
+               threading.Thread(target=transform_stage, name='pipeline-transform', daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        for batch in batches:
+            load_started = time.perf_counter()
+            load(batch)
+            busy['load'] += time.perf_counter() - load_started
+    except PipelineAborted:
+        pass
+    except Exception:
+        pages.abort()
+        batches.abort()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+    if 'transform_error' in outcome:
+        raise outcome['transform_error']
+
+    elapsed = time.perf_counter() - started
+    page_stats, batch_stats = pages.stats(), batches.stats()
+    # The transform loop's wall time includes waiting for pages and for room in the batch queue
+    transform_busy = busy['transform'] - page_stats['consumer_wait_seconds'] - batch_stats['producer_wait_seconds']
+    stats = {
+        'seconds': round(elapsed, 3),
+        'queues': {'pages': page_stats, 'batches': batch_stats},
+        'stages': {
+            'fetch': {'blocked_seconds': page_stats['producer_wait_seconds']},
+            'transform': {
+                'busy_seconds': round(max(0.0, transform_busy), 3),
+                'idle_seconds': page_stats['consumer_wait_seconds'],
+                'blocked_seconds': batch_stats['producer_wait_seconds'],
+            },
+            'load': {'busy_seconds': round(busy['load'], 3), 'idle_seconds': batch_stats['consumer_wait_seconds']},
+        },
+    }
+    results, failures = outcome['fetch']
+    return results, failures, stats
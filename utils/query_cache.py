@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from utils.config import DATA_VERSION_CHECK_INTERVAL, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL
+from utils.shared import db_connection
+from utils.sql_queries_app import data_version_query
+from utils.sql_queries_dag import BUMP_DATA_VERSION_QUERY
+
+
+logger = logging.getLogger(__name__)
+
+# Name of the data_versions row covering the observations and rollups read by the app
+DATA_VERSION_DATASET = 'weather_observations'
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache of query results, shared by every session of the app process.
+
+    Entries expire after `ttl` seconds and the least recently used ones are evicted beyond
+    `max_entries`. All entries are dropped when the data version returned by `load_version`
+    changes; the version is read at most once per `version_check_interval` seconds, so hits
+    in between run no query at all. The version is read without holding the cache lock, by
+    one thread at a time once a version is known, so a slow or unreachable database never
+    blocks the sessions served from the cache.
+    """
+
+    def __init__(self, load_version, max_entries=1024, ttl=3600.0, version_check_interval=30.0,
+                 clock=time.monotonic):
+        self._load_version = load_version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (value, data version, expiry), least recently used first
+        self._entries = OrderedDict()
+        self._version = None
+        self._version_checked_at = None
+        self._version_loading = False
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, key, load):
+        """
+        Returns the cached result for `key`, calling `load()` to compute it on a miss.
+
+        Exceptions raised by `load` or by reading the data version propagate and nothing is cached.
+        """
+        self._check_version()
+        with self._lock:
+            now = self._clock()
+            version = self._version
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == version and now < entry[2]:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        value = load()
+
+        with self._lock:
+            # A result loaded while the version changed is stored under the old version and
+            # therefore never served
+            self._entries[key] = (value, version, self._clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version_checked_at = None
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters.
+
+        Returns:
+            dict: Cumulative hits, misses, evictions and invalidations, the number of entries
+            and the current data version.
+        """
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'entries': len(self._entries),
+                'version': self._version,
+            }
+
+    def _check_version(self):
+        with self._lock:
+            now = self._clock()
+            if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+                return
+            # Another thread is reading the version; keep serving the current one meanwhile
+            if self._version_loading and self._version is not None:
+                return
+            self._version_loading = True
+        try:
+            version = self._load_version()
+        finally:
+            with self._lock:
+                self._version_loading = False
+        with self._lock:
+            self._version_checked_at = now
+            if version != self._version:
+                if self._entries:
+                    self._invalidations += 1
+                    logger.info(f"Data version changed from {self._version} to {version}, clearing {len(self._entries)} cached results.")
+                self._entries.clear()
+                self._version = version
+
+
+def load_data_version():
+    """
+    Reads the current version of the app's data from the data_versions table.
+
+    Returns:
+        int: The version, or 0 if the DAG never bumped it.
+    """
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(data_version_query(), (DATA_VERSION_DATASET,))
+        row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(cursor):
+    """
+    Increments the version of the app's data, invalidating cached results once committed.
+
+    Call it in the transaction that changes the data so the new version is only visible with it.
+    """
+    cursor.execute(BUMP_DATA_VERSION_QUERY, (DATA_VERSION_DATASET,))
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """
+    Returns the process-wide query cache, creating it on first use.
+    """
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryCache(
+                load_data_version,
+                max_entries=QUERY_CACHE_MAX_ENTRIES,
+                ttl=QUERY_CACHE_TTL,
+                version_check_interval=DATA_VERSION_CHECK_INTERVAL,
+            )
+        return _query_cache
@@ -0,0 +1,84 @@
+import json
+import sys
+from typing import NamedTuple, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """
+    Decodes a JSON document from bytes or str, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class StationRecord(NamedTuple):
+    """
+    The fields of a station feature stored in the stations table, in its column order.
+    """
+    station_id: str
+    station_name: Optional[str]
+    station_timezone: Optional[str]
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+class ObservationRecord(NamedTuple):
+    """
+    The fields of an observation feature loaded into weather_observations.
+    """
+    station_id: Optional[str]
+    timestamp: str
+    temperature: Optional[float]
+    temperature_unit_code: str
+    wind_speed: Optional[float]
+    wind_speed_unit_code: str
+    humidity: Optional[float]
+
+
+def project_station(feature):
+    """
+    Projects a station GeoJSON feature onto a StationRecord.
+    """
+    properties = feature['properties']
+    coordinates = (feature.get('geometry') or {}).get('coordinates') or [None, None]
+    return StationRecord(
+        properties['stationIdentifier'],
+        properties.get('name'),
+        properties.get('timeZone'),
+        coordinates[1],
+        coordinates[0],
+    )
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def project_observation(feature):
+    """
+    Projects an observation GeoJSON feature onto an ObservationRecord.
+
+    The station identifier is the last segment of the station URL. weather.gov reports
+    humidity as `relativeHumidity`; a plain `humidity` property is read as well. Station
+    identifiers and unit codes repeat on every observation, so they are interned and shared.
+    """
+    properties = feature['properties']
+    station_url = properties.get('station')
+    temperature = properties.get('temperature') or {}
+    wind_speed = properties.get('windSpeed') or {}
+    humidity = properties.get('relativeHumidity') or properties.get('humidity') or {}
+    return ObservationRecord(
+        _intern(station_url.rsplit('/', 1)[-1]) if station_url else None,
+        properties['timestamp'],
+        temperature.get('value'),
+        _intern(temperature.get('unitCode', '')),
+        wind_speed.get('value'),
+        _intern(wind_speed.get('unitCode', '')),
+        humidity.get('value'),
+    )
@@ -0,0 +1,264 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from utils.config import (API_BACKOFF_BASE, API_BACKOFF_MAX, API_CIRCUIT_FAILURE_THRESHOLD, API_CIRCUIT_RESET_TIMEOUT,
+                          API_MAX_RETRIES, API_RATE_BURST, API_RATE_LIMIT, API_TIMEOUT)
+from utils.metrics import HTTP_REQUEST_SECONDS, endpoint, metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Responses retried after a backoff; 429 also slows the rate limiter down
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class CircuitOpenError(requests.RequestException):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter with additive-increase/multiplicative-decrease of its rate.
+
+    `acquire` blocks until a token is available. Tokens accrue at `rate` per second up to `burst`.
+    `slow_down` halves the rate (down to `min_rate`) and can pause every caller, e.g. for the
+    `Retry-After` of a 429 response; `speed_up` raises it again by a fraction of `max_rate` on
+    every success, so the limiter settles close to the rate the server allows.
+    """
+
+    def __init__(self, rate, burst=1, min_rate=None, increase=0.05, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.burst = burst
+        self.increase = increase
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self._paused_until = None
+
+    def acquire(self):
+        """
+        Takes a token, waiting for one to accrue or for a pause to end first.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                if self._paused_until is not None and now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                    self._updated_at = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+    def slow_down(self, pause=None):
+        """
+        Halves the rate and, when `pause` is given, holds every caller back for `pause` seconds.
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if pause:
+                now = self._clock()
+                self._paused_until = max(self._paused_until or now, now + pause)
+                self._tokens = 0.0
+                self._updated_at = self._paused_until
+
+    def speed_up(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.increase)
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker over the requests sent to a server.
+
+    The circuit opens after `failure_threshold` consecutive failures; requests then fail fast
+    with CircuitOpenError. After `reset_timeout` seconds a single trial request is let through
+    (half-open): its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=10, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if self._trial_in_flight or self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def before_request(self):
+        """
+        Raises CircuitOpenError unless a request may be sent now.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if not self._trial_in_flight and self._clock() - self._opened_at >= self.reset_timeout:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(f"Circuit open after {self._failures} consecutive failures")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(f"Opening the circuit after {self._failures} consecutive failures.")
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
+
+
+def parse_retry_after(value, now=None):
+    """
+    Returns the delay in seconds of a `Retry-After` header, given in seconds or as an HTTP date,
+    or None when it is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+class ResilientSession(requests.Session):
+    """
+    requests session that paces, retries and guards every request it sends.
+
+    Each attempt takes a token from `rate_limiter`, is refused while `circuit_breaker` is open
+    and is sent with an explicit `timeout` unless the caller passes one. Timeouts, connection
+    errors and responses with a status in RETRY_STATUSES are retried up to `max_retries` times
+    after a full-jitter exponential backoff (`backoff_base * 2 ** attempt`, capped to
+    `backoff_max`), or after the server's `Retry-After` when that is longer. A 429 also slows
+    the rate limiter down for every thread sharing it. When the retries run out, the last
+    response is returned (so `raise_for_status` reports it) or the last exception is raised.
+    """
+
+    def __init__(self, rate_limiter=None, circuit_breaker=None, max_retries=API_MAX_RETRIES,
+                 backoff_base=API_BACKOFF_BASE, backoff_max=API_BACKOFF_MAX, timeout=API_TIMEOUT,
+                 sleep=time.sleep):
+        super().__init__()
+        self.rate_limiter = rate_limiter or TokenBucket(API_RATE_LIMIT, burst=API_RATE_BURST)
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(API_CIRCUIT_FAILURE_THRESHOLD,
+                                                                 API_CIRCUIT_RESET_TIMEOUT)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self._sleep = sleep
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'rate_limit_wait': 0.0}
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            self.circuit_breaker.before_request()
+            waited = self.rate_limiter.acquire()
+            self._count(requests=1, rate_limit_wait=waited)
+            started = time.perf_counter()
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                self._observe(url, 'error', started)
+                self.circuit_breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning(f"{method} {url} failed ({e}), retrying in {delay:.2f}s.")
+            except requests.RequestException:
+                self._observe(url, 'error', started)
+                self.circuit_breaker.record_failure()
+                raise
+            else:
+                self._observe(url, response.status_code, started)
+                if response.status_code not in RETRY_STATUSES:
+                    self.circuit_breaker.record_success()
+                    self.rate_limiter.speed_up()
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if response.status_code == 429:
+                    # Throttling means the server is up: it settles a half-open trial like a
+                    # success and only counts against the rate
+                    self._count(throttled=1)
+                    self.circuit_breaker.record_success()
+                    self.rate_limiter.slow_down(retry_after)
+                else:
+                    self.circuit_breaker.record_failure()
+                if attempt >= self.max_retries:
+                    return response
+                response.close()
+                delay = max(retry_after or 0.0, self.backoff(attempt))
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.2f}s.")
+            self._count(retries=1)
+            self._sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _observe(url, status, started):
+        if metrics.enabled:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint(url), status=status)
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def stats(self):
+        """
+        Returns the number of requests sent, retried and throttled, the seconds spent waiting
+        for the rate limiter, its current rate and the state of the circuit breaker.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['rate'] = self.rate_limiter.rate
+        stats['circuit'] = self.circuit_breaker.state
+        return stats
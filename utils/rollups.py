@@ -0,0 +1,106 @@
+import logging
+
+import numpy as np
+from psycopg2 import sql
+
+from utils.sql_queries_dag import DELETE_ROLLUPS_QUERY, REFRESH_DAILY_ROLLUP_QUERY, REFRESH_HOURLY_ROLLUP_QUERY
+from utils.watermarks import parse_utc
+
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLES = ('weather_observations_hourly', 'weather_observations_daily')
+
+
+class TouchedRanges:
+    """
+    Tracks the earliest and latest observation timestamp loaded for each station.
+
+    The rollup refresh only recomputes the buckets inside these ranges. Timestamps are kept as
+    the API's ISO 8601 strings, which share one UTC format and therefore compare in time order.
+    """
+
+    def __init__(self):
+        self._ranges = {}
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def add(self, station_key, timestamp):
+        current = self._ranges.get(station_key)
+        if current is None:
+            self._ranges[station_key] = [timestamp, timestamp]
+        elif timestamp < current[0]:
+            current[0] = timestamp
+        elif timestamp > current[1]:
+            current[1] = timestamp
+
+    def extend(self, ranges):
+        """
+        Adds [station_key, start, end] lists, e.g. the `to_list` of several shards.
+        """
+        for station_key, start, end in ranges:
+            self.add(station_key, start)
+            self.add(station_key, end)
+
+    def track_batches(self, batches):
+        """
+        Passes columnar observation batches through while recording the range of each station.
+        """
+        for batch in batches:
+            if len(batch):
+                # Sort by station then timestamp; each station's range is its first and last row
+                order = np.lexsort((batch.timestamp, batch.station_key))
+                station_keys = batch.station_key[order]
+                timestamps = batch.timestamp[order]
+                last = np.append(np.flatnonzero(station_keys[1:] != station_keys[:-1]), len(order) - 1)
+                first = np.append(0, last[:-1] + 1)
+                for station_key, start, end in zip(station_keys[first].tolist(), timestamps[first], timestamps[last]):
+                    self.add(station_key, start)
+                    self.add(station_key, end)
+            yield batch
+
+    def to_list(self):
+        """
+        Returns the ranges as JSON-serializable [station_key, start, end] lists for XCom.
+        """
+        return [[station_key, start, end] for station_key, (start, end) in sorted(self._ranges.items())]
+
+
+def refresh_rollups(cursor, touched_ranges):
+    """
+    Recomputes the hourly and daily rollup buckets overlapping the touched ranges, and the
+    bucket of each station's first observation after its range, whose wind speed change
+    depends on the observations loaded before it.
+
+    The caller owns the transaction.
+
+    Args:
+        cursor: psycopg2 cursor.
+        touched_ranges (list): [station_key, start, end] lists as built by `TouchedRanges.to_list`,
+            with ISO 8601 timestamps.
+
+    Returns:
+        tuple: Number of (hourly, daily) buckets written.
+    """
+    if not touched_ranges:
+        return 0, 0
+    station_keys = [station_key for station_key, _, _ in touched_ranges]
+    starts = [parse_utc(start) for _, start, _ in touched_ranges]
+    ends = [parse_utc(end) for _, _, end in touched_ranges]
+
+    cursor.execute(REFRESH_HOURLY_ROLLUP_QUERY, (station_keys, starts, ends))
+    hourly = cursor.rowcount
+    cursor.execute(REFRESH_DAILY_ROLLUP_QUERY, (station_keys, starts, ends))
+    daily = cursor.rowcount
+    logger.info(f"Refreshed {hourly} hourly and {daily} daily rollup buckets for {len(station_keys)} stations.")
+    return hourly, daily
+
+
+def delete_rollups(cursor, start, end):
+    """
+    Deletes the hourly and daily rollup buckets starting in [start, end), e.g. when the
+    observations they summarize are dropped. The caller owns the transaction.
+    """
+    for table in ROLLUP_TABLES:
+        cursor.execute(sql.SQL(DELETE_ROLLUPS_QUERY).format(table=sql.Identifier(table)), (start, end))
@@ -0,0 +1,47 @@
+def split_shards(station_ids, shard_size):
+    """
+    Splits station identifiers into consecutive shards of at most `shard_size` stations.
+
+    Args:
+        station_ids (list): Station identifiers.
+        shard_size (int): Maximum number of stations per shard.
+
+    Returns:
+        list: {'index': n, 'station_ids': [...]} dicts, JSON-serializable for XCom.
+    """
+    shard_size = max(1, shard_size)
+    return [
+        {'index': index, 'station_ids': station_ids[start:start + shard_size]}
+        for index, start in enumerate(range(0, len(station_ids), shard_size))
+    ]
+
+
+def summarize_shards(shards, summaries):
+    """
+    Combines the summaries returned by the shard tasks of a run.
+
+    Args:
+        shards (list): Shards planned for the run, as returned by `split_shards`.
+        summaries (iterable): Summaries of the shards that succeeded; each has the keys
+            'index', 'stations', 'fetched', 'loaded', 'failed_stations', 'fetch_seconds'
+            and 'load_seconds'.
+
+    Returns:
+        dict: The summaries ordered by shard index, the indexes of shards without a summary
+            ('missing_shards') and the totals of the counts and timings.
+    """
+    summaries = sorted(summaries, key=lambda summary: summary['index'])
+    completed = {summary['index'] for summary in summaries}
+    totals = {'stations': 0, 'fetched': 0, 'loaded': 0, 'failed_stations': 0, 'fetch_seconds': 0.0,
+              'load_seconds': 0.0}
+    for summary in summaries:
+        for name in totals:
+            value = summary[name]
+            totals[name] += len(value) if name == 'failed_stations' else value
+    for name in ('fetch_seconds', 'load_seconds'):
+        totals[name] = round(totals[name], 3)
+    return {
+        'shards': summaries,
+        'missing_shards': [shard['index'] for shard in shards if shard['index'] not in completed],
+        'totals': totals,
+    }
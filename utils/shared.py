@@ -1,5 +1,14 @@
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+
+from utils.config import DB_POOL_HEALTH_CHECK_INTERVAL, DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE, DB_POOL_TIMEOUT
 
 
 def get_db_connection():
@@ -9,4 +18,288 @@ def get_db_connection():
         user=os.getenv("DATABASE_USER"),
         password=os.getenv("DATABASE_PASSWORD")
     )
-    return conn
\ No newline at end of file
+    return conn
+
+
+class PoolTimeout(PoolError):
+    """
+    Raised when no pooled connection becomes available within the checkout timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    Connections are opened lazily up to `max_size`; when all of them are checked out, callers
+    wait in arrival order until one is returned. A connection idle for longer than `health_check_interval`
+    seconds is probed with `SELECT 1` before being handed out and replaced if it is broken.
+    Returned connections have any open transaction rolled back.
+    """
+
+    def __init__(self, connect=get_db_connection, min_size=1, max_size=10, timeout=30.0,
+                 health_check_interval=60.0):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.pid = os.getpid()
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect
+        self._lock = threading.Lock()
+        # (connection, monotonic time it was returned), most recently returned last
+        self._idle = deque()
+        # Callers blocked on an exhausted pool, in arrival order
+        self._waiters = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+        for _ in range(min_size):
+            self._idle.append((connect(), time.monotonic()))
+            self._size += 1
+
+    def getconn(self, timeout=None):
+        """
+        Checks a connection out of the pool.
+
+        When the pool is exhausted, callers are served in arrival order as connections come back.
+
+        Args:
+            timeout (float): Seconds to wait for a free connection. Defaults to the pool timeout.
+
+        Returns:
+            A psycopg2 connection, to be handed back with `putconn`.
+
+        Raises:
+            PoolTimeout: If no connection became available in time.
+            PoolError: If the pool is closed.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self._closed:
+                raise PoolError("Connection pool is closed.")
+            if self._idle and not self._waiters:
+                conn, returned_at = self._idle.pop()
+            elif self._size < self.max_size:
+                conn, returned_at = None, None
+                self._size += 1
+            else:
+                conn, returned_at = self._wait(timeout)
+            self._in_use += 1
+            self._checkouts += 1
+
+        # Connecting and probing happen outside the lock so they do not block other threads
+        try:
+            if conn is not None and not self._healthy(conn, returned_at):
+                self._close_quietly(conn)
+                with self._lock:
+                    self._discarded += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._release_slot()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Returns a connection to the pool, rolling back any transaction left open.
+
+        Args:
+            conn: Connection obtained from `getconn`.
+            discard (bool): Close the connection instead of keeping it, e.g. after a connection error.
+        """
+        if not discard and not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        discard = discard or bool(conn.closed)
+        with self._lock:
+            self._in_use -= 1
+            if discard:
+                self._discarded += 1
+            if discard or self._closed:
+                self._release_slot()
+            elif self._waiters:
+                self._waiters.popleft().hand_over(conn, time.monotonic())
+                conn = None
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+        if conn is not None:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager checking a connection out for the duration of the block.
+
+        The caller commits; uncommitted work is rolled back when the block exits, and a
+        connection that raised a connection-level error is discarded.
+        """
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def metrics(self):
+        """
+        Returns a snapshot of the pool usage counters.
+
+        Returns:
+            dict: size, in_use and idle connections, max_size, and the cumulative checkouts,
+            waits (checkouts that found the pool exhausted), wait_time and max_wait_time in
+            seconds, timeouts and discarded (broken) connections.
+        """
+        with self._lock:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+                'max_wait_time': self._max_wait_time,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+            }
+
+    def close(self):
+        """
+        Closes the idle connections; connections still checked out are closed when returned.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            while self._waiters:
+                self._waiters.popleft().hand_over(None, None, closed=True)
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _wait(self, timeout):
+        """
+        Queues the caller until a connection is handed over. Must be called holding the lock.
+        """
+        started = time.monotonic()
+        waiter = _Waiter(self._lock)
+        self._waiters.append(waiter)
+        self._waits += 1
+        try:
+            while not waiter.ready:
+                remaining = started + timeout - time.monotonic()
+                if remaining <= 0:
+                    self._waiters.remove(waiter)
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {timeout}s.")
+                waiter.condition.wait(remaining)
+        finally:
+            waited = time.monotonic() - started
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+        if waiter.closed:
+            raise PoolError("Connection pool is closed.")
+        return waiter.conn, waiter.returned_at
+
+    def _release_slot(self):
+        """
+        Frees the capacity of a closed connection, or hands it to the next waiter to open a new
+        one. Must be called holding the lock.
+        """
+        if self._waiters and not self._closed:
+            self._waiters.popleft().hand_over(None, None)
+        else:
+            self._size -= 1
+
+    def _healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+class _Waiter:
+    """
+    A caller queued on an exhausted pool, woken when a connection (or a free slot, as a None
+    connection) is handed over to it.
+    """
+
+    def __init__(self, lock):
+        self.condition = threading.Condition(lock)
+        self.ready = False
+        self.closed = False
+        self.conn = None
+        self.returned_at = None
+
+    def hand_over(self, conn, returned_at, closed=False):
+        self.conn = conn
+        self.returned_at = returned_at
+        self.closed = closed
+        self.ready = True
+        self.condition.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """
+    Returns the process-wide connection pool, creating it on first use.
+
+    A process forked after the pool was created gets its own pool instead of sharing the
+    parent's sockets.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ConnectionPool(
+                get_db_connection,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                timeout=DB_POOL_TIMEOUT,
+                health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL,
+            )
+        return _pool
+
+
+def db_connection(timeout=None):
+    """
+    Context manager checking a connection out of the process-wide pool, e.g.
+
+        with db_connection() as conn:
+            ...
+            conn.commit()
+    """
+    return get_connection_pool().connection(timeout)
@@ -0,0 +1,255 @@
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from utils.config import STATION_INDEX_CELL_DEGREES
+
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Up to this many stations, comparing every station with a bounding box is as fast as reading
+# the cells it covers (measured with benchmarks/bench_spatial.py)
+WITHIN_SCAN_MAX_STATIONS = 8192
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distances in kilometres from one point to each of the given points, in degrees.
+    """
+    return _haversine_km(math.radians(latitude), math.radians(longitude), np.radians(latitudes),
+                         np.radians(longitudes), np.cos(np.radians(latitudes)))
+
+
+def _haversine_km(latitude, longitude, latitudes, longitudes, cos_latitudes):
+    # Same as haversine_km, in radians, with the cosines of `latitudes` computed beforehand
+    a = np.sin((latitudes - latitude) / 2) ** 2 + math.cos(latitude) * cos_latitudes * np.sin((longitudes - longitude) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _concatenate_ranges(lowers, uppers):
+    # Concatenates the ranges [lower, upper) without a Python loop
+    lengths = uppers - lowers
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    return np.arange(total) + np.repeat(lowers - (np.cumsum(lengths) - lengths), lengths)
+
+
+def _wrap(longitudes):
+    # Longitudes in [-180, 180)
+    return (longitudes + 180) % 360 - 180
+
+
+def _inside(latitudes, longitudes, south, west, north, width):
+    # Mask of the points inside a bounding box `width` degrees wide east of `west`; the
+    # longitudes are wrapped, and compared rather than taken modulo 360 per point, which
+    # costs several times more than the comparisons
+    inside = (latitudes >= south) & (latitudes <= north)
+    if width < 360:
+        west = _wrap(west)
+        east = west + width
+        if east < 180:
+            inside &= (longitudes >= west) & (longitudes <= east)
+        else:
+            inside &= (longitudes >= west) | (longitudes <= east - 360)
+    return inside
+
+
+class StationIndex:
+    """
+    Grid index over station coordinates answering nearest-station and bounding-box lookups.
+
+    Stations are bucketed into `cell_degrees` x `cell_degrees` cells of latitude and longitude
+    and stored sorted by cell, row by row, with the position of the first station of every
+    cell, so the stations of a run of cells in one row are a contiguous slice found with two
+    lookups. A bounding box reads the slices of the rows it covers; a nearest-station lookup
+    reads growing squares of cells around the point until the k-th nearest station found is
+    closer than anything outside the square. Only the stations of those cells are compared, so
+    lookups do not depend on the catalogue size. A bounding box falls back to comparing every
+    station when that is as cheap: for small catalogues (WITHIN_SCAN_MAX_STATIONS) and for
+    boxes holding a large share of the stations. Longitudes wrap around the antimeridian. The
+    index is immutable; build a new one when the stations change.
+    """
+
+    def __init__(self, station_ids, station_names, latitudes, longitudes, cell_degrees=STATION_INDEX_CELL_DEGREES):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        # Stations without coordinates cannot be located
+        located = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        self.cell_degrees = cell_degrees
+        self.rows = math.ceil(180 / cell_degrees)
+        self.columns = math.ceil(360 / cell_degrees)
+        cells = self._cells(latitudes[located], longitudes[located])
+        order = np.argsort(cells, kind='stable')
+        self.cells = cells[order]
+        self.latitudes = latitudes[located][order]
+        self.longitudes = longitudes[located][order]
+        self.station_ids = np.asarray(station_ids, dtype=object)[located][order]
+        self.station_names = np.asarray(station_names, dtype=object)[located][order]
+        # The stations of cells a to b of a row are the positions _offsets[a] to _offsets[b + 1]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(self.cells, minlength=self.rows * self.columns))))
+        # Kept for the bounds checks of every bounding-box lookup
+        self._wrapped_longitudes = _wrap(self.longitudes)
+        # Kept for the distances computed by every nearest-station lookup
+        self._radians = (np.radians(self.latitudes), np.radians(self.longitudes))
+        self._cos_latitudes = np.cos(self._radians[0])
+        # Mean stations per non-empty cell, to size the first square of a nearest-station lookup
+        self._density = len(self) / max(1, len(np.unique(self.cells)))
+        logger.info(f"Indexed {len(self)} stations ({np.count_nonzero(~located)} without coordinates).")
+
+    @classmethod
+    def from_frame(cls, df, cell_degrees=STATION_INDEX_CELL_DEGREES):
+        """
+        Builds the index from a frame with the columns of `station_locations_query`.
+        """
+        return cls(df['station_id'], df['station_name'], pd.to_numeric(df['latitude']).astype(float),
+                   pd.to_numeric(df['longitude']).astype(float), cell_degrees)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def _row(self, latitude):
+        return min(self.rows - 1, max(0, math.floor((latitude + 90) / self.cell_degrees)))
+
+    def _column(self, longitude):
+        return math.floor(((longitude + 180) % 360) / self.cell_degrees) % self.columns
+
+    def _cells(self, latitudes, longitudes):
+        rows = np.clip(np.floor((latitudes + 90) / self.cell_degrees).astype(np.int64), 0, self.rows - 1)
+        columns = np.floor(((longitudes + 180) % 360) / self.cell_degrees).astype(np.int64) % self.columns
+        return rows * self.columns + columns
+
+    def _candidates(self, first_row, last_row, first_column, last_column):
+        # Positions of the stations in the cells of the rows and columns, both inclusive; the
+        # columns wrap around the antimeridian when first_column > last_column
+        if first_column <= last_column:
+            firsts, lasts = np.array([first_column]), np.array([last_column])
+        else:
+            firsts, lasts = np.array([first_column, 0]), np.array([self.columns - 1, last_column])
+        row_starts = np.arange(first_row, last_row + 1)[:, None] * self.columns
+        return _concatenate_ranges(self._offsets[(row_starts + firsts).ravel()],
+                                   self._offsets[(row_starts + lasts).ravel() + 1])
+
+    def _spans(self, first_row, last_row, column_ranges):
+        # (lower, upper) position ranges of the stations in the cells of the rows and column
+        # ranges, merged when they follow each other, e.g. for boxes spanning every column
+        spans = []
+        for row in range(first_row, last_row + 1):
+            row_start = row * self.columns
+            for first_column, last_column in column_ranges:
+                lower = self._offsets.item(row_start + first_column)
+                upper = self._offsets.item(row_start + last_column + 1)
+                if lower == upper:
+                    continue
+                if spans and spans[-1][1] == lower:
+                    spans[-1] = (spans[-1][0], upper)
+                else:
+                    spans.append((lower, upper))
+        return spans
+
+    def within(self, south, west, north, east):
+        """
+        Returns the positions of the stations inside a bounding box, in index order.
+
+        Args:
+            south (float): Minimum latitude.
+            west (float): Western longitude; greater than `east` for boxes crossing the antimeridian.
+            north (float): Maximum latitude.
+            east (float): Eastern longitude.
+
+        Returns:
+            numpy.ndarray: Positions of the matching stations, see `records`.
+        """
+        if south > north or not len(self):
+            return np.empty(0, dtype=np.int64)
+        width = east - west if east >= west else east - west + 360
+        if width >= 360 - self.cell_degrees:
+            column_ranges = [(0, self.columns - 1)]
+        else:
+            first_column, last_column = self._column(west), self._column(east)
+            if first_column <= last_column:
+                column_ranges = [(first_column, last_column)]
+            else:
+                column_ranges = [(first_column, self.columns - 1), (0, last_column)]
+        spans = self._spans(self._row(south), self._row(north), column_ranges)
+        candidates = sum(upper - lower for lower, upper in spans)
+        if not candidates:
+            return np.empty(0, dtype=np.int64)
+        if len(self) <= WITHIN_SCAN_MAX_STATIONS or 4 * candidates >= len(self):
+            # Comparing every station is as cheap as gathering the candidates
+            return np.flatnonzero(_inside(self.latitudes, self._wrapped_longitudes, south, west, north, width))
+        if len(spans) == 1:
+            lower, upper = spans[0]
+            return lower + np.flatnonzero(_inside(self.latitudes[lower:upper], self._wrapped_longitudes[lower:upper],
+                                                  south, west, north, width))
+        lowers, uppers = np.array(spans).T
+        positions = _concatenate_ranges(lowers, uppers)
+        return positions[_inside(self.latitudes[positions], self._wrapped_longitudes[positions], south, west, north, width)]
+
+    def nearest(self, latitude, longitude, k):
+        """
+        Returns the k stations nearest to a point, closest first.
+
+        Args:
+            latitude (float): Latitude of the point.
+            longitude (float): Longitude of the point.
+            k (int): Number of stations to return.
+
+        Returns:
+            tuple: (positions, distances) with the positions of the stations, see `records`,
+                and their great-circle distances in kilometres.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        row, column = self._row(latitude), self._column(longitude)
+        # Start from a square expected to hold about k stations, so most lookups read one or two squares
+        radius = max(1, math.ceil(math.sqrt(k / self._density)))
+        while True:
+            first_row, last_row = max(0, row - radius), min(self.rows - 1, row + radius)
+            whole_globe = first_row == 0 and last_row == self.rows - 1 and 2 * radius + 1 >= self.columns
+            if 2 * radius + 1 >= self.columns:
+                positions = self._candidates(first_row, last_row, 0, self.columns - 1)
+            else:
+                positions = self._candidates(first_row, last_row, (column - radius) % self.columns,
+                                             (column + radius) % self.columns)
+            if len(positions) >= k:
+                distances = _haversine_km(math.radians(latitude), math.radians(longitude), self._radians[0][positions],
+                                          self._radians[1][positions], self._cos_latitudes[positions])
+                nearest = np.argpartition(distances, k - 1)[:k]
+                nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+                farthest = distances[nearest[-1]]
+                if whole_globe or farthest <= self._covered_km(latitude, radius):
+                    return positions[nearest], distances[nearest]
+                # The k nearest are within `farthest`: grow the square just enough to cover it
+                while radius < max(self.rows, self.columns) and self._covered_km(latitude, radius) < farthest:
+                    radius += 1
+            elif whole_globe:
+                # Unreachable while k <= len(self), kept as a guard against an endless loop
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            else:
+                radius *= 2
+
+    def _covered_km(self, latitude, radius):
+        # Lower bound of the distance from the point to any station outside the square of
+        # cells within `radius` of its cell. Such a station is at least `margin` degrees away
+        # in latitude, or in longitude between two points no further from the equator than
+        # the square reaches, where sin(d / 2) >= cos(highest) * sin(margin / 2).
+        margin = math.radians(min(180.0, radius * self.cell_degrees))
+        highest = math.radians(min(90.0, abs(latitude) + (radius + 1) * self.cell_degrees))
+        longitude_bound = 2 * math.asin(max(0.0, math.cos(highest)) * math.sin(margin / 2))
+        return EARTH_RADIUS_KM * min(margin, longitude_bound)
+
+    def records(self, positions, distances=None):
+        """
+        Returns the stations at `positions` as a frame, with their distances when given.
+        """
+        df = pd.DataFrame({'station_id': self.station_ids[positions], 'station_name': self.station_names[positions],
+                           'latitude': self.latitudes[positions], 'longitude': self.longitudes[positions]})
+        if distances is not None:
+            df['distance_km'] = distances
+        return df
@@ -1,28 +1,147 @@
 def average_temperature_query():
     return """
-    SELECT 
-    AVG(temperature) AS average_temperature
-    FROM weather_observations
-    WHERE station_name = %s
-          AND observation_timestamp >= date_trunc('week', CURRENT_DATE) - INTERVAL '1 week'
-          AND observation_timestamp < date_trunc('week', CURRENT_DATE);
+    SELECT
+    SUM(r.temperature_avg * r.temperature_count) / NULLIF(SUM(r.temperature_count), 0) AS average_temperature
+    FROM weather_observations_daily r
+    JOIN stations s ON s.station_key = r.station_key
+    WHERE s.station_name = %s
+          AND r.bucket_start >= date_trunc('week', CURRENT_DATE) - INTERVAL '1 week'
+          AND r.bucket_start < date_trunc('week', CURRENT_DATE);
     """
 
 def max_wind_speed_change_query():
     return """
-    WITH wind_changes AS (
-        SELECT 
-            LAG(wind_speed) OVER (ORDER BY observation_timestamp) AS previous_wind_speed,
-            wind_speed,
-            observation_timestamp
-        FROM weather_observations
-        WHERE station_name = %s
-              AND observation_timestamp >= NOW() - INTERVAL '7 days'
-    )
-    SELECT MAX(ABS(wind_speed - previous_wind_speed)) AS max_change
-    FROM wind_changes
-    WHERE previous_wind_speed IS NOT NULL;
+    SELECT MAX(r.max_wind_speed_change) AS max_change
+    FROM weather_observations_hourly r
+    JOIN stations s ON s.station_key = r.station_key
+    WHERE s.station_name = %s
+          AND r.bucket_start >= date_trunc('hour', NOW() - INTERVAL '7 days')
+          AND r.bucket_start <= NOW();
     """
 
 def get_station_names_query():
-    return """SELECT DISTINCT station_name FROM weather_observations;"""
\ No newline at end of file
+    return """
+    SELECT DISTINCT s.station_name
+    FROM stations s
+    WHERE EXISTS (SELECT 1 FROM weather_observations_daily r WHERE r.station_key = s.station_key)
+    ORDER BY s.station_name;
+    """
+
+def station_locations_query():
+    return """
+    SELECT s.station_id, s.station_name, s.latitude, s.longitude
+    FROM stations s
+    WHERE s.latitude IS NOT NULL AND s.longitude IS NOT NULL;
+    """
+
+def data_version_query():
+    return """
+    SELECT version FROM data_versions WHERE dataset = %s;
+    """
+
+# Columns the stations overview can be ordered by
+OVERVIEW_SORT_COLUMNS = ('station_name', 'average_temperature', 'max_change')
+
+def stations_overview_query(order_by='station_name', descending=False):
+    """
+    Average temperature and maximum wind speed change of every station in one statement.
+
+    Covers the same windows as average_temperature_query and max_wind_speed_change_query, with
+    each rollup grouped by station name in a single pass instead of one query per station. The
+    wind speed changes were computed with LAG() over each station's observations when the
+    rollups were refreshed. Parameters are a LIKE pattern on the station name, the page size
+    and the offset; every row also carries the number of stations matching the pattern.
+    """
+    if order_by not in OVERVIEW_SORT_COLUMNS:
+        raise ValueError(f"Cannot order the stations overview by {order_by!r}.")
+    direction = 'DESC' if descending else 'ASC'
+    return f"""
+    WITH temperature AS (
+        SELECT s.station_name,
+        SUM(r.temperature_avg * r.temperature_count) / NULLIF(SUM(r.temperature_count), 0) AS average_temperature
+        FROM weather_observations_daily r
+        JOIN stations s ON s.station_key = r.station_key
+        WHERE r.bucket_start >= date_trunc('week', CURRENT_DATE) - INTERVAL '1 week'
+              AND r.bucket_start < date_trunc('week', CURRENT_DATE)
+        GROUP BY s.station_name
+    ), wind AS (
+        SELECT s.station_name, MAX(r.max_wind_speed_change) AS max_change
+        FROM weather_observations_hourly r
+        JOIN stations s ON s.station_key = r.station_key
+        WHERE r.bucket_start >= date_trunc('hour', NOW() - INTERVAL '7 days')
+              AND r.bucket_start <= NOW()
+        GROUP BY s.station_name
+    ), names AS (
+        SELECT DISTINCT s.station_name
+        FROM stations s
+        WHERE EXISTS (SELECT 1 FROM weather_observations_daily r WHERE r.station_key = s.station_key)
+    )
+    SELECT n.station_name, t.average_temperature, w.max_change, COUNT(*) OVER () AS station_count
+    FROM names n
+    LEFT JOIN temperature t ON t.station_name = n.station_name
+    LEFT JOIN wind w ON w.station_name = n.station_name
+    WHERE n.station_name ILIKE %s
+    ORDER BY {order_by} {direction} NULLS LAST, n.station_name
+    LIMIT %s OFFSET %s;
+    """
+
+def monthly_history_query():
+    """
+    Monthly statistics of a station from the daily rollups, for months still held in Postgres.
+    Parameters are the station name and the [start, end) range of the months.
+    """
+    return """
+    SELECT date_trunc('month', r.bucket_start) AS month,
+    SUM(r.observation_count) AS observation_count,
+    SUM(r.temperature_avg * r.temperature_count) / NULLIF(SUM(r.temperature_count), 0) AS temperature_avg,
+    MIN(r.temperature_min) AS temperature_min,
+    MAX(r.temperature_max) AS temperature_max,
+    MAX(r.wind_speed_max) AS wind_speed_max,
+    SUM(r.humidity_avg * r.humidity_count) / NULLIF(SUM(r.humidity_count), 0) AS humidity_avg
+    FROM weather_observations_daily r
+    JOIN stations s ON s.station_key = r.station_key
+    WHERE s.station_name = %s
+          AND r.bucket_start >= %s
+          AND r.bucket_start < %s
+    GROUP BY 1
+    ORDER BY 1;
+    """
+
+def station_keys_query():
+    return """
+    SELECT station_key FROM stations WHERE station_name = %s;
+    """
+
+# Where each time series resolution is aggregated from: raw observations, or the rollups once
+# the buckets span at least an hour or a day
+_TIMESERIES_SOURCES = {
+    'raw': ('weather_observations', 'observation_timestamp', 'AVG(r.temperature)', 'AVG(r.wind_speed)',
+            'AVG(r.humidity)'),
+    'hourly': ('weather_observations_hourly', 'bucket_start') + tuple(
+        f'SUM(r.{metric}_avg * r.{metric}_count) / NULLIF(SUM(r.{metric}_count), 0)'
+        for metric in ('temperature', 'wind_speed', 'humidity')),
+}
+_TIMESERIES_SOURCES['daily'] = ('weather_observations_daily',) + _TIMESERIES_SOURCES['hourly'][1:]
+
+def timeseries_query(source):
+    """
+    Average temperature, wind speed and humidity of a station per time bucket.
+
+    Buckets are `bucket` seconds wide, aligned on multiples of `bucket` since the epoch, and
+    aggregated in the database from `source` ('raw', 'hourly' or 'daily'), so only one row per
+    bucket is returned. Parameters are named: station, start, end and bucket.
+    """
+    table, timestamp, temperature, wind_speed, humidity = _TIMESERIES_SOURCES[source]
+    return f"""
+    SELECT to_timestamp(floor(extract(epoch FROM r.{timestamp}) / %(bucket)s) * %(bucket)s) AT TIME ZONE 'UTC' AS bucket,
+    ({temperature})::float8 AS temperature,
+    ({wind_speed})::float8 AS wind_speed,
+    ({humidity})::float8 AS humidity
+    FROM {table} r
+    JOIN stations s ON s.station_key = r.station_key
+    WHERE s.station_name = %(station)s
+          AND r.{timestamp} >= %(start)s
+          AND r.{timestamp} < %(end)s
+    GROUP BY 1
+    ORDER BY 1;
+    """
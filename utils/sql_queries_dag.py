@@ -1,6 +1,201 @@
 INSERT_OBSERVATION_QUERY = """
-INSERT INTO weather_observations (station_id, station_name, station_timezone, latitude, longitude,
-                           observation_timestamp, temperature, temperature_unit_code, wind_speed, wind_speed_unit_code, humidity)
-VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-ON CONFLICT (station_id, observation_timestamp) DO NOTHING;
-"""
\ No newline at end of file
+INSERT INTO weather_observations (station_key, observation_timestamp, temperature, temperature_unit_code,
+                           wind_speed, wind_speed_unit_code, humidity)
+VALUES (%s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (station_key, observation_timestamp) DO NOTHING;
+"""
+
+
+INSERT_OBSERVATION_VALUES_QUERY = """
+INSERT INTO weather_observations (station_key, observation_timestamp, temperature, temperature_unit_code,
+                           wind_speed, wind_speed_unit_code, humidity)
+VALUES %s
+ON CONFLICT (station_key, observation_timestamp) DO NOTHING;
+"""
+
+CREATE_OBSERVATION_STAGING_QUERY = """
+DROP TABLE IF EXISTS pg_temp.weather_observations_staging;
+CREATE TEMP TABLE weather_observations_staging ON COMMIT DROP AS
+SELECT station_key, observation_timestamp, temperature, temperature_unit_code,
+       wind_speed, wind_speed_unit_code, humidity
+FROM weather_observations
+WITH NO DATA;
+"""
+
+# NULL is written as \N (utils.loaders.CSV_NULL), so unquoted empty fields stay empty strings
+COPY_OBSERVATION_STAGING_QUERY = """
+COPY weather_observations_staging (station_key, observation_timestamp, temperature, temperature_unit_code,
+                           wind_speed, wind_speed_unit_code, humidity)
+FROM STDIN WITH (FORMAT csv, NULL '\\N')
+"""
+
+MERGE_OBSERVATION_STAGING_QUERY = """
+INSERT INTO weather_observations (station_key, observation_timestamp, temperature, temperature_unit_code,
+                           wind_speed, wind_speed_unit_code, humidity)
+SELECT station_key, observation_timestamp, temperature, temperature_unit_code,
+       wind_speed, wind_speed_unit_code, humidity
+FROM weather_observations_staging
+ON CONFLICT (station_key, observation_timestamp) DO NOTHING;
+"""
+
+
+UPSERT_STATIONS_QUERY = """
+INSERT INTO stations (station_id, station_name, station_timezone, latitude, longitude)
+VALUES %s
+ON CONFLICT (station_id) DO UPDATE
+SET station_name = EXCLUDED.station_name,
+    station_timezone = EXCLUDED.station_timezone,
+    latitude = EXCLUDED.latitude,
+    longitude = EXCLUDED.longitude,
+    updated_at = NOW()
+WHERE (stations.station_name, stations.station_timezone, stations.latitude, stations.longitude)
+      IS DISTINCT FROM (EXCLUDED.station_name, EXCLUDED.station_timezone, EXCLUDED.latitude, EXCLUDED.longitude)
+RETURNING station_id, station_key;
+"""
+
+SELECT_STATION_KEYS_QUERY = """
+SELECT station_id, station_key FROM stations;
+"""
+
+SELECT_STATION_KEYS_BY_ID_QUERY = """
+SELECT station_id, station_key FROM stations WHERE station_id = ANY(%s);
+"""
+
+SELECT_STATION_WATERMARKS_QUERY = """
+SELECT s.station_id, latest.observation_timestamp
+FROM stations s
+CROSS JOIN LATERAL (
+    SELECT MAX(o.observation_timestamp) AS observation_timestamp
+    FROM weather_observations o
+    WHERE o.station_key = s.station_key
+) latest
+WHERE s.station_id = ANY(%s);
+"""
+
+CREATE_PARTITION_QUERY = """
+CREATE TABLE IF NOT EXISTS {partition} PARTITION OF weather_observations
+FOR VALUES FROM (%s) TO (%s);
+"""
+
+DROP_PARTITION_QUERY = """
+DROP TABLE IF EXISTS {partition};
+"""
+
+LIST_PARTITIONS_QUERY = """
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = %s
+  AND parent.relnamespace = current_schema()::regnamespace;
+"""
+
+# Recomputes the rollup buckets overlapping each (station_key, range_start, range_end) touched by a run.
+# Reading starts at the station's last observation before the first bucket, however old, so the first
+# observation of the bucket gets the wind speed change from its predecessor. The buckets up to the
+# station's first observation after the range are recomputed too: when a backfill fills a gap, that
+# observation's predecessor, and so its wind speed change, is in the range.
+_REFRESH_ROLLUP_QUERY = """
+WITH touched AS (
+    SELECT t.station_key,
+           date_trunc('{unit}', t.range_start) AS bucket_from,
+           date_trunc('{unit}', GREATEST(t.range_end, next_observation.observation_timestamp))
+               + INTERVAL '1 {unit}' AS bucket_to,
+           COALESCE(previous_observation.observation_timestamp, date_trunc('{unit}', t.range_start)) AS read_from
+    FROM unnest(%s::integer[], %s::timestamp[], %s::timestamp[]) AS t(station_key, range_start, range_end)
+    LEFT JOIN LATERAL (
+        SELECT o.observation_timestamp
+        FROM weather_observations o
+        WHERE o.station_key = t.station_key
+          AND o.observation_timestamp < date_trunc('{unit}', t.range_start)
+        ORDER BY o.observation_timestamp DESC
+        LIMIT 1
+    ) previous_observation ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT o.observation_timestamp
+        FROM weather_observations o
+        WHERE o.station_key = t.station_key
+          AND o.observation_timestamp > t.range_end
+        ORDER BY o.observation_timestamp
+        LIMIT 1
+    ) next_observation ON TRUE
+),
+observations AS (
+    SELECT o.station_key,
+           o.observation_timestamp,
+           o.temperature,
+           o.wind_speed,
+           o.humidity,
+           touched.bucket_from,
+           LAG(o.wind_speed) OVER (PARTITION BY o.station_key ORDER BY o.observation_timestamp) AS previous_wind_speed
+    FROM touched
+    JOIN weather_observations o
+      ON o.station_key = touched.station_key
+     AND o.observation_timestamp >= touched.read_from
+     AND o.observation_timestamp < touched.bucket_to
+)
+INSERT INTO {table} (station_key, bucket_start, observation_count,
+                     temperature_min, temperature_max, temperature_avg, temperature_count,
+                     wind_speed_min, wind_speed_max, wind_speed_avg, wind_speed_count,
+                     humidity_min, humidity_max, humidity_avg, humidity_count,
+                     max_wind_speed_change)
+SELECT station_key,
+       date_trunc('{unit}', observation_timestamp),
+       COUNT(*),
+       MIN(temperature), MAX(temperature), AVG(temperature), COUNT(temperature),
+       MIN(wind_speed), MAX(wind_speed), AVG(wind_speed), COUNT(wind_speed),
+       MIN(humidity), MAX(humidity), AVG(humidity), COUNT(humidity),
+       MAX(ABS(wind_speed - previous_wind_speed))
+FROM observations
+WHERE observation_timestamp >= bucket_from
+GROUP BY station_key, date_trunc('{unit}', observation_timestamp)
+ON CONFLICT (station_key, bucket_start) DO UPDATE
+SET observation_count = EXCLUDED.observation_count,
+    temperature_min = EXCLUDED.temperature_min,
+    temperature_max = EXCLUDED.temperature_max,
+    temperature_avg = EXCLUDED.temperature_avg,
+    temperature_count = EXCLUDED.temperature_count,
+    wind_speed_min = EXCLUDED.wind_speed_min,
+    wind_speed_max = EXCLUDED.wind_speed_max,
+    wind_speed_avg = EXCLUDED.wind_speed_avg,
+    wind_speed_count = EXCLUDED.wind_speed_count,
+    humidity_min = EXCLUDED.humidity_min,
+    humidity_max = EXCLUDED.humidity_max,
+    humidity_avg = EXCLUDED.humidity_avg,
+    humidity_count = EXCLUDED.humidity_count,
+    max_wind_speed_change = EXCLUDED.max_wind_speed_change;
+"""
+
+REFRESH_HOURLY_ROLLUP_QUERY = _REFRESH_ROLLUP_QUERY.format(table='weather_observations_hourly', unit='hour')
+
+REFRESH_DAILY_ROLLUP_QUERY = _REFRESH_ROLLUP_QUERY.format(table='weather_observations_daily', unit='day')
+
+BUMP_DATA_VERSION_QUERY = """
+INSERT INTO data_versions (dataset, version)
+VALUES (%s, 1)
+ON CONFLICT (dataset) DO UPDATE
+SET version = data_versions.version + 1,
+    updated_at = NOW();
+"""
+
+# Rows of one month, one station after the other, as written to the Parquet archive
+EXPORT_MONTH_QUERY = """
+SELECT station_key, observation_timestamp, temperature::float8, temperature_unit_code,
+       wind_speed::float8, wind_speed_unit_code, humidity::float8
+FROM weather_observations
+WHERE observation_timestamp >= %s AND observation_timestamp < %s
+ORDER BY station_key, observation_timestamp;
+"""
+
+# Blocks writes to a partition until the transaction ends, so nothing lands in it between its export and its drop
+LOCK_PARTITION_QUERY = """
+LOCK TABLE {partition} IN SHARE MODE;
+"""
+
+COUNT_PARTITION_ROWS_QUERY = """
+SELECT count(*) FROM {partition};
+"""
+
+DELETE_ROLLUPS_QUERY = """
+DELETE FROM {table} WHERE bucket_start >= %s AND bucket_start < %s;
+"""
@@ -0,0 +1,109 @@
+import logging
+import threading
+from itertools import islice
+
+from psycopg2.extras import execute_values
+
+from utils.sql_queries_dag import SELECT_STATION_KEYS_BY_ID_QUERY, SELECT_STATION_KEYS_QUERY, UPSERT_STATIONS_QUERY
+
+
+logger = logging.getLogger(__name__)
+
+
+class StationRegistry:
+    """
+    In-process cache of the stations dimension, mapping station_id to station_key.
+
+    The loader resolves keys through the registry instead of querying the stations
+    table for every observation row.
+    """
+
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+        # Stations inserted or changed by `upsert`, so callers can tell whether the table changed
+        self.changes = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, station_id):
+        return station_id in self._keys
+
+    def get(self, station_id, default=None):
+        return self._keys.get(station_id, default)
+
+    def upsert(self, cursor, stations, page_size=1000):
+        """
+        Inserts new stations and updates changed ones, caching the keys the database returns.
+
+        Unchanged stations are not rewritten; their keys are loaded on demand by `resolve`.
+        The caller owns the transaction.
+
+        Args:
+            cursor: psycopg2 cursor.
+            stations (iterable): StationRecords, or rows in their field order.
+            page_size (int): Number of stations sent per statement.
+
+        Returns:
+            int: Number of stations sent to the database.
+        """
+        stations = iter(stations)
+        count = 0
+        while True:
+            # Deduplicate within a page, ON CONFLICT DO UPDATE cannot touch a row twice
+            page = {row[0]: tuple(row) for row in islice(stations, page_size)}
+            if not page:
+                break
+            returned = execute_values(cursor, UPSERT_STATIONS_QUERY, list(page.values()), page_size=page_size, fetch=True)
+            self._update(returned)
+            self.changes += len(returned)
+            count += len(page)
+        logger.info(f"Upserted {count} stations, {len(self)} station keys cached.")
+        return count
+
+    def load(self, cursor):
+        """
+        Replaces the cache with every station key in the stations table.
+        """
+        cursor.execute(SELECT_STATION_KEYS_QUERY)
+        keys = dict(cursor.fetchall())
+        with self._lock:
+            self._keys = keys
+        logger.info(f"Loaded {len(keys)} station keys.")
+
+    def resolve(self, cursor, station_ids):
+        """
+        Returns the keys of the given stations, querying only the ones not cached yet.
+
+        Args:
+            cursor: psycopg2 cursor.
+            station_ids (iterable): Station identifiers.
+
+        Returns:
+            dict: station_id -> station_key for the stations that exist.
+        """
+        station_ids = set(station_ids)
+        missing = [station_id for station_id in station_ids if station_id not in self._keys]
+        if missing:
+            cursor.execute(SELECT_STATION_KEYS_BY_ID_QUERY, (missing,))
+            self._update(cursor.fetchall())
+        return {station_id: self._keys[station_id] for station_id in station_ids if station_id in self._keys}
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+
+    def _update(self, rows):
+        with self._lock:
+            self._keys.update(rows)
+
+
+_registry = StationRegistry()
+
+
+def get_station_registry():
+    """
+    Returns the process-wide station registry.
+    """
+    return _registry
@@ -0,0 +1,171 @@
+import logging
+from itertools import islice
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Station key of observations whose station is missing or unknown
+_NO_STATION = -1
+
+
+class ObservationBatch:
+    """
+    Columnar batch of weather_observations rows.
+
+    Measurements are float64 arrays rounded to two decimals with NaN for missing values;
+    timestamps and unit codes are object arrays of strings.
+    """
+
+    COLUMNS = ('station_key', 'timestamp', 'temperature', 'temperature_unit_code',
+               'wind_speed', 'wind_speed_unit_code', 'humidity')
+
+    def __init__(self, station_key, timestamp, temperature, temperature_unit_code,
+                 wind_speed, wind_speed_unit_code, humidity):
+        self.station_key = station_key
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.temperature_unit_code = temperature_unit_code
+        self.wind_speed = wind_speed
+        self.wind_speed_unit_code = wind_speed_unit_code
+        self.humidity = humidity
+
+    def __len__(self):
+        return len(self.station_key)
+
+    def columns(self):
+        return [getattr(self, column) for column in self.COLUMNS]
+
+    def take(self, mask):
+        """
+        Returns the rows selected by a boolean mask or index array as a new batch.
+        """
+        return ObservationBatch(*(column[mask] for column in self.columns()))
+
+    def rows(self):
+        """
+        Returns the batch as tuples in the column order of INSERT_OBSERVATION_QUERY, with
+        Python scalars and None for missing measurements.
+        """
+        return list(zip(
+            self.station_key.tolist(),
+            self.timestamp.tolist(),
+            _nullable(self.temperature),
+            self.temperature_unit_code.tolist(),
+            _nullable(self.wind_speed),
+            self.wind_speed_unit_code.tolist(),
+            _nullable(self.humidity),
+        ))
+
+
+def _nullable(values):
+    result = values.astype(object)
+    result[np.isnan(values)] = None
+    return result.tolist()
+
+
+def _round2(values):
+    """
+    Rounds to two decimals exactly like Python's round().
+
+    np.round scales by 100 first, which can push values near a half cent to the wrong side;
+    those few values are rounded one by one instead.
+    """
+    scaled = values * 100
+    rounded = np.round(scaled) / 100
+    near_half = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    for index in near_half.tolist():
+        rounded[index] = round(float(values[index]), 2)
+    return rounded
+
+
+def _join_station_keys(station_ids, station_keys):
+    """
+    Resolves the station key of every row, looking each distinct station up only once.
+    """
+    ids, inverse = np.unique(station_ids, return_inverse=True)
+    keys = np.full(len(ids), _NO_STATION, dtype=np.int64)
+    for index, station_id in enumerate(ids.tolist()):
+        if not station_id:
+            logger.warning(f"'station' not found in {np.count_nonzero(inverse == index)} observations, skipping them.")
+            continue
+        station_key = station_keys.get(station_id)
+        if station_key is None:
+            logger.warning(f"No station info found for station_id {station_id}, skipping its observations...")
+            continue
+        keys[index] = station_key
+    return keys[inverse.reshape(-1)]
+
+
+def _read_batch(records, size, station_keys):
+    """
+    Reads up to `size` records straight into preallocated columns, so each record can be
+    released as soon as its fields are copied.
+
+    Returns:
+        tuple: (number of records read, ObservationBatch of those with a known station).
+    """
+    station_id = np.empty(size, dtype=object)
+    timestamp = np.empty(size, dtype=object)
+    temperature_unit_code = np.empty(size, dtype=object)
+    wind_speed_unit_code = np.empty(size, dtype=object)
+    # Temperature, wind speed and humidity, with NaN for missing values
+    measurements = np.empty((3, size), dtype=np.float64)
+    count = 0
+    for station, observed_at, temperature, temperature_unit, wind_speed, wind_speed_unit, humidity in records:
+        station_id[count] = station or ''
+        timestamp[count] = observed_at
+        temperature_unit_code[count] = temperature_unit
+        wind_speed_unit_code[count] = wind_speed_unit
+        measurements[0, count] = np.nan if temperature is None else temperature
+        measurements[1, count] = np.nan if wind_speed is None else wind_speed
+        measurements[2, count] = np.nan if humidity is None else humidity
+        count += 1
+    batch = ObservationBatch(
+        _join_station_keys(station_id[:count], station_keys),
+        timestamp[:count],
+        _round2(measurements[0, :count]),
+        temperature_unit_code[:count],
+        _round2(measurements[1, :count]),
+        wind_speed_unit_code[:count],
+        _round2(measurements[2, :count]),
+    )
+    return count, batch.take(batch.station_key != _NO_STATION)
+
+
+def transform_observations(records, station_keys):
+    """
+    Turns observation records into a columnar batch of weather_observations rows.
+
+    Observations without a station, or whose station is unknown, are logged once per
+    station and dropped.
+
+    Args:
+        records (list): ObservationRecords, or sequences in their field order as read back
+            from the intermediate store.
+        station_keys: Maps station identifiers to station keys, e.g. a StationRegistry.
+
+    Returns:
+        ObservationBatch: The rows of the observations with a known station.
+    """
+    return _read_batch(records, len(records), station_keys)[1]
+
+
+def iter_observation_batches(records, station_keys, batch_size=10000):
+    """
+    Transforms a stream of observation records in batches of up to `batch_size` records.
+
+    The records of a batch are not collected in a list first: only the columns being
+    filled and the record being read are held at once.
+
+    Yields:
+        ObservationBatch: The transformed rows of each non-empty batch.
+    """
+    records = iter(records)
+    while True:
+        count, batch = _read_batch(islice(records, batch_size), batch_size, station_keys)
+        if not count:
+            return
+        if len(batch):
+            yield batch
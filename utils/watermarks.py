@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from utils.sql_queries_dag import SELECT_STATION_WATERMARKS_QUERY
+
+
+INGESTION_MODES = ('full', 'incremental', 'backfill')
+
+
+def parse_utc(value):
+    """
+    Parses an ISO 8601 timestamp (e.g. '2024-01-01T00:00:00Z') into a naive UTC datetime,
+    the representation observation_timestamp uses.
+    """
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def load_watermarks(cursor, station_ids):
+    """
+    Returns the latest stored observation timestamp of each station.
+
+    Args:
+        cursor: psycopg2 cursor.
+        station_ids (list): Station identifiers.
+
+    Returns:
+        dict: station_id -> latest observation_timestamp, for stations with observations.
+    """
+    cursor.execute(SELECT_STATION_WATERMARKS_QUERY, (list(station_ids),))
+    return {station_id: watermark for station_id, watermark in cursor.fetchall() if watermark is not None}
+
+
+def observation_windows(station_ids, end_date, lookback, watermarks=None, overlap=timedelta(0)):
+    """
+    Computes the [start, end] window of observations to request for each station.
+
+    Without a watermark a station gets the full lookback window. With one, the window starts
+    `overlap` before the watermark so late corrections are picked up, but never earlier than
+    the lookback window.
+
+    Args:
+        station_ids (iterable): Station identifiers.
+        end_date (datetime): End of every window.
+        lookback (timedelta): Length of the full window.
+        watermarks (dict): station_id -> latest stored observation timestamp.
+        overlap (timedelta): How far before the watermark to start.
+
+    Returns:
+        dict: station_id -> (start_date, end_date).
+    """
+    watermarks = watermarks or {}
+    earliest = end_date - lookback
+    windows = {}
+    for station_id in station_ids:
+        start_date = earliest
+        watermark = watermarks.get(station_id)
+        if watermark is not None:
+            start_date = min(max(earliest, watermark - overlap), end_date)
+        windows[station_id] = (start_date, end_date)
+    return windows
@@ -1,6 +1,13 @@
 import streamlit as st
 import pandas as pd
-from utils.shared import get_db_connection
+from datetime import date, datetime, timedelta
+from utils.archive import HISTORY_COLUMNS, get_observation_archive, monthly_history
+from utils.config import METRICS_TEXTFILE_DIR, NEARBY_STATIONS, OVERVIEW_PAGE_SIZE, TIMESERIES_POINTS
+from utils.downsampling import downsample_series, plan_resolution
+from utils.metrics import metrics, timed_query
+from utils.query_cache import get_query_cache
+from utils.shared import db_connection, get_connection_pool
+from utils.spatial import StationIndex
 from utils.sql_queries_app import *
 import logging
 import os
@@ -20,6 +27,27 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def read_cached_query(query, params=None, name='query'):
+    """
+    Runs a query through the process-wide query cache.
+
+    Results are shared by every session and reused until they expire or the DAG loads new data.
+    Queries that reach the database are timed under `name` (see utils.metrics).
+
+    Args:
+        query (str): SQL query.
+        params (tuple): Query parameters.
+        name (str): Name of the query in the metrics and the slow query log.
+
+    Returns:
+        pandas.DataFrame: The query result. It is shared, so callers must not modify it.
+    """
+    def load():
+        with db_connection() as conn, timed_query(name, params):
+            return pd.read_sql_query(query, conn, params=params)
+    return get_query_cache().get((query, params), load)
+
+
 def get_average_temperature(station_name):
     """
     Fetch the average temperature for the last week from the database.
@@ -31,18 +59,14 @@ def get_average_temperature(station_name):
         float: Average temperature in Celsius.
     """
     logger.info(f"Fetching average temperature for station: {station_name}")
-    conn = get_db_connection()
     try:
-        query = average_temperature_query()
-        df = pd.read_sql_query(query, conn, params=(station_name,))
+        df = read_cached_query(average_temperature_query(), (station_name,), name='average_temperature')
         logger.info(f"Average temperature for {station_name}: {df['average_temperature'].iloc[0]} °C")
         return df['average_temperature'].iloc[0]
     except Exception as e:
         logger.error(f"Error fetching average temperature for {station_name}: {e}")
         st.error(f"Could not fetch average temperature for {station_name}.")
         return None
-    finally:
-        conn.close()
 
 
 def get_max_wind_speed_change(station_name):
@@ -56,18 +80,14 @@ def get_max_wind_speed_change(station_name):
         float: Maximum wind speed change in km/h.
     """
     logger.info(f"Fetching max wind speed change for station: {station_name}")
-    conn = get_db_connection()
     try:
-        query = max_wind_speed_change_query()
-        df = pd.read_sql_query(query, conn, params=(station_name,))
+        df = read_cached_query(max_wind_speed_change_query(), (station_name,), name='max_wind_speed_change')
         logger.info(f"Max wind speed change for {station_name}: {df['max_change'].iloc[0]} km/h")
         return df['max_change'].iloc[0]
     except Exception as e:
         logger.error(f"Error fetching max wind speed change for {station_name}: {e}")
         st.error(f"Could not fetch max wind speed change for {station_name}.")
         return None
-    finally:
-        conn.close()
 
 
 def get_station_names():
@@ -78,10 +98,8 @@ def get_station_names():
         list: A list of station names.
     """
     logger.info("Fetching distinct weather station names from the database")
-    conn = get_db_connection()
     try:
-        query = get_station_names_query()
-        df = pd.read_sql_query(query, conn)
+        df = read_cached_query(get_station_names_query(), name='station_names')
         station_names = df['station_name'].tolist()
         logger.info(f"Fetched station names: {station_names}")
         return station_names
@@ -89,8 +107,272 @@ def get_station_names():
         logger.error(f"Error fetching station names: {e}")
         st.error("Could not fetch station names.")
         return []
-    finally:
-        conn.close()
+
+
+def name_pattern(text):
+    """
+    Turns the text typed in the station filter into a case-insensitive LIKE pattern matching
+    names that contain it, with LIKE wildcards in the text matched literally.
+    """
+    escaped = text.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def get_stations_overview(name_filter='', order_by='station_name', descending=False, page=1,
+                          page_size=OVERVIEW_PAGE_SIZE):
+    """
+    Fetch one page of the average temperature and maximum wind speed change of every station.
+
+    Filtering, ordering and pagination run in the database, so a page costs a single query
+    however many stations there are.
+
+    Args:
+        name_filter (str): Text the station names must contain.
+        order_by (str): One of OVERVIEW_SORT_COLUMNS.
+        descending (bool): Whether to order from the highest value.
+        page (int): Page number, starting at 1.
+        page_size (int): Stations per page.
+
+    Returns:
+        tuple: (DataFrame with the columns station_name, average_temperature and max_change,
+            number of stations matching the filter).
+    """
+    logger.info(f"Fetching stations overview page {page} (filter={name_filter!r}, order_by={order_by})")
+    try:
+        query = stations_overview_query(order_by, descending)
+        df = read_cached_query(query, (name_pattern(name_filter), page_size, (page - 1) * page_size),
+                               name='stations_overview')
+        total = int(df['station_count'].iloc[0]) if len(df) else 0
+        return df.drop(columns='station_count'), total
+    except Exception as e:
+        logger.error(f"Error fetching stations overview: {e}")
+        st.error("Could not fetch the stations overview.")
+        return pd.DataFrame(columns=['station_name', 'average_temperature', 'max_change']), 0
+
+
+def get_archive():
+    """
+    Returns the Parquet archive of closed months, or None when pyarrow is not installed.
+    """
+    try:
+        return get_observation_archive()
+    except ImportError as e:
+        logger.warning(f"Archived history unavailable: {e}")
+        return None
+
+
+def get_station_history(station_name, start, end):
+    """
+    Fetch the monthly statistics of a station over a long range.
+
+    Months still held in Postgres are read from the daily rollups and older months from the
+    Parquet archive, so the history spans both without the caller knowing where a month lives.
+
+    Args:
+        station_name (str): The name of the weather station.
+        start (datetime): First month of the history.
+        end (datetime): End of the history, exclusive.
+
+    Returns:
+        pandas.DataFrame: One row per month with the columns of HISTORY_COLUMNS.
+    """
+    logger.info(f"Fetching history for station {station_name} from {start} to {end}")
+
+    def load():
+        with db_connection() as conn:
+            with timed_query('monthly_history', (station_name, start, end)):
+                recent = pd.read_sql_query(monthly_history_query(), conn, params=(station_name, start, end))
+            station_keys = pd.read_sql_query(station_keys_query(), conn, params=(station_name,))['station_key'].tolist()
+        with timed_query('archive_history', (station_keys, start, end)):
+            return monthly_history(recent, get_archive(), station_keys, start, end)
+    try:
+        return get_query_cache().get(('history', station_name, start, end), load)
+    except Exception as e:
+        logger.error(f"Error fetching history for {station_name}: {e}")
+        st.error(f"Could not fetch the history of {station_name}.")
+        return pd.DataFrame(columns=list(HISTORY_COLUMNS))
+
+
+TIMESERIES_COLUMNS = ('temperature', 'wind_speed', 'humidity')
+
+
+def get_station_timeseries(station_name, start, end, points=TIMESERIES_POINTS):
+    """
+    Fetch the temperature, wind speed and humidity of a station over a time window, downsampled for charting.
+
+    The database aggregates the window into time buckets, from the raw observations or the
+    hourly or daily rollups depending on the window length, and LTTB keeps `points` of those
+    buckets per series. Charts hold the same number of points whatever the window, and the
+    downsampled series are cached per station, aligned window and resolution.
+
+    Args:
+        station_name (str): The name of the weather station.
+        start (datetime): Start of the window, in UTC.
+        end (datetime): End of the window, in UTC.
+        points (int): Maximum number of points per series.
+
+    Returns:
+        dict: pandas.Series of each column of TIMESERIES_COLUMNS, indexed by bucket.
+    """
+    source, bucket, start, end = plan_resolution(start, end, points)
+    logger.info(f"Fetching time series for station {station_name} from {start} to {end} ({source}, {bucket}s buckets)")
+
+    def load():
+        params = {'station': station_name, 'start': start, 'end': end, 'bucket': bucket}
+        with db_connection() as conn, timed_query('timeseries', params):
+            df = pd.read_sql_query(timeseries_query(source), conn, params=params)
+        return downsample_series(df, TIMESERIES_COLUMNS, points)
+    try:
+        return get_query_cache().get(('timeseries', station_name, start, end, points), load)
+    except Exception as e:
+        logger.error(f"Error fetching time series for {station_name}: {e}")
+        st.error(f"Could not fetch the time series of {station_name}.")
+        return {column: pd.Series(dtype=float) for column in TIMESERIES_COLUMNS}
+
+
+def get_station_index():
+    """
+    Returns the spatial index of the station catalogue.
+
+    The index is built once from the stations table and shared through the query cache, so it
+    is rebuilt after the DAG bumps the data version, e.g. when it loads new or moved stations.
+
+    Returns:
+        StationIndex: The index, or None when the stations could not be read.
+    """
+    def load():
+        with db_connection() as conn, timed_query('station_locations'):
+            df = pd.read_sql_query(station_locations_query(), conn)
+        return StationIndex.from_frame(df)
+    try:
+        return get_query_cache().get(('station_index',), load)
+    except Exception as e:
+        logger.error(f"Error building the station index: {e}")
+        st.error("Could not load the station locations.")
+        return None
+
+
+def find_nearby_stations(latitude, longitude, k=NEARBY_STATIONS):
+    """
+    Find the stations nearest to a point.
+
+    Args:
+        latitude (float): Latitude of the point.
+        longitude (float): Longitude of the point.
+        k (int): Number of stations to return.
+
+    Returns:
+        pandas.DataFrame: station_id, station_name, latitude, longitude and distance_km of
+            each station, closest first.
+    """
+    index = get_station_index()
+    if index is None:
+        return pd.DataFrame(columns=['station_id', 'station_name', 'latitude', 'longitude', 'distance_km'])
+    return index.records(*index.nearest(latitude, longitude, k))
+
+
+def find_stations_in_area(south, west, north, east):
+    """
+    Find the stations inside a bounding box.
+
+    Args:
+        south (float): Minimum latitude.
+        west (float): Western longitude; greater than `east` for areas crossing the antimeridian.
+        north (float): Maximum latitude.
+        east (float): Eastern longitude.
+
+    Returns:
+        pandas.DataFrame: station_id, station_name, latitude and longitude of each station, by name.
+    """
+    index = get_station_index()
+    if index is None:
+        return pd.DataFrame(columns=['station_id', 'station_name', 'latitude', 'longitude'])
+    return index.records(index.within(south, west, north, east)).sort_values('station_name', ignore_index=True)
+
+
+def show_station(station_names):
+    # Seleccionar una station_id
+    selected_station = st.selectbox("Select a station ID:", station_names)
+
+    if selected_station:
+        # Display the average temperature
+        avg_temp = get_average_temperature(selected_station)
+        if avg_temp is not None:
+            st.write(f"Average observed temperature for the last week: **{avg_temp:.2f} °C**")
+
+        # Display the maximum wind speed change
+        max_wind_change = get_max_wind_speed_change(selected_station)
+        if max_wind_change is not None:
+            st.write(f"Maximum wind speed change between consecutive observations: **{max_wind_change:.2f} km/h**")
+
+
+def show_overview():
+    labels = {'station_name': 'Station', 'average_temperature': 'Average temperature (°C)',
+              'max_change': 'Max wind speed change (km/h)'}
+    filter_column, order_column, direction_column = st.columns([2, 2, 1])
+    name_filter = filter_column.text_input("Filter stations by name:")
+    order_by = order_column.selectbox("Order by:", OVERVIEW_SORT_COLUMNS, format_func=labels.get)
+    descending = direction_column.checkbox("Descending")
+    page = st.number_input("Page:", min_value=1, value=1, step=1)
+
+    df, total = get_stations_overview(name_filter, order_by, descending, page)
+    pages = max(1, -(-total // OVERVIEW_PAGE_SIZE))
+    # The table can also be sorted by clicking its headers, within the page
+    st.dataframe(df.rename(columns=labels), hide_index=True, use_container_width=True)
+    st.caption(f"Page {page} of {pages}, {total} stations")
+
+
+def show_history(station_names):
+    selected_station = st.selectbox("Select a station ID:", station_names, key='history_station')
+    today = date.today()
+    start, end = st.slider("Months:", min_value=date(today.year - 10, 1, 1), max_value=today,
+                           value=(date(today.year - 2, today.month, 1), today), format="YYYY-MM")
+    if selected_station:
+        # Whole months, so that every month is aggregated the same way from either store
+        end_month = datetime(end.year + end.month // 12, end.month % 12 + 1, 1)
+        df = get_station_history(selected_station, datetime(start.year, start.month, 1), end_month)
+        if len(df):
+            st.line_chart(df.set_index('month')[['temperature_min', 'temperature_avg', 'temperature_max']])
+        st.dataframe(df, hide_index=True, use_container_width=True)
+
+
+def show_charts(station_names):
+    windows = {"1 day": 1, "7 days": 7, "30 days": 30, "90 days": 90, "1 year": 365}
+    labels = {'temperature': 'Temperature (°C)', 'wind_speed': 'Wind speed (km/h)', 'humidity': 'Humidity (%)'}
+    station_column, window_column = st.columns([3, 1])
+    selected_station = station_column.selectbox("Select a station ID:", station_names, key='charts_station')
+    window = window_column.selectbox("Window:", list(windows), index=1)
+    if selected_station:
+        end = datetime.utcnow()
+        series = get_station_timeseries(selected_station, end - timedelta(days=windows[window]), end)
+        for column in TIMESERIES_COLUMNS:
+            st.subheader(labels[column])
+            if len(series[column]):
+                st.line_chart(series[column].rename(labels[column]))
+            else:
+                st.write("No observations in this window.")
+
+
+def show_nearby():
+    mode = st.radio("Search:", ["Near a point", "In an area"], horizontal=True)
+    if mode == "Near a point":
+        latitude_column, longitude_column, count_column = st.columns(3)
+        latitude = latitude_column.number_input("Latitude:", min_value=-90.0, max_value=90.0, value=40.7128, format="%.4f")
+        longitude = longitude_column.number_input("Longitude:", min_value=-180.0, max_value=180.0, value=-74.0060,
+                                                  format="%.4f")
+        k = count_column.number_input("Stations:", min_value=1, max_value=100, value=NEARBY_STATIONS, step=1)
+        df = find_nearby_stations(latitude, longitude, k)
+    else:
+        south_column, west_column, north_column, east_column = st.columns(4)
+        south = south_column.number_input("South:", min_value=-90.0, max_value=90.0, value=40.0)
+        west = west_column.number_input("West:", min_value=-180.0, max_value=180.0, value=-75.0)
+        north = north_column.number_input("North:", min_value=-90.0, max_value=90.0, value=41.5)
+        east = east_column.number_input("East:", min_value=-180.0, max_value=180.0, value=-73.0)
+        df = find_stations_in_area(south, west, north, east)
+    if len(df):
+        st.map(df, latitude='latitude', longitude='longitude')
+    st.dataframe(df, hide_index=True, use_container_width=True)
+    st.caption(f"{len(df)} stations")
 
 
 station_names = []
@@ -122,16 +404,20 @@ if __name__ == '__main__':
     # Título de la aplicación
     st.title("Weather Data Metrics")
 
-    # Seleccionar una station_id
-    selected_station = st.selectbox("Select a station ID:", station_names)
+    view = st.radio("View:", ["Single station", "All stations", "Nearby", "Charts", "History"], horizontal=True)
+    if view == "All stations":
+        show_overview()
+    elif view == "Nearby":
+        show_nearby()
+    elif view == "Charts":
+        show_charts(station_names)
+    elif view == "History":
+        show_history(station_names)
+    else:
+        show_station(station_names)
 
-    if selected_station:
-        # Display the average temperature
-        avg_temp = get_average_temperature(selected_station)
-        if avg_temp is not None:
-            st.write(f"Average observed temperature for the last week: **{avg_temp:.2f} °C**")
-
-        # Display the maximum wind speed change
-        max_wind_change = get_max_wind_speed_change(selected_station)
-        if max_wind_change is not None:
-            st.write(f"Maximum wind speed change between consecutive observations: **{max_wind_change:.2f} km/h**")
\ No newline at end of file
+    # Pool and cache usage per render, to size DB_POOL_MAX_SIZE and QUERY_CACHE_MAX_ENTRIES
+    logger.info(f"Connection pool metrics: {get_connection_pool().metrics()}")
+    logger.info(f"Query cache stats: {get_query_cache().stats()}")
+    if metrics.enabled and METRICS_TEXTFILE_DIR:
+        metrics.write_textfile(os.path.join(METRICS_TEXTFILE_DIR, 'weather_app.prom'))
\ No newline at end of file